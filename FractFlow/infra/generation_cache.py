@@ -0,0 +1,204 @@
+"""
+Content-addressed cache of generated media files.
+
+Regenerating an article or a video calls the image and video backends again
+for every scene, even when the prompt has not changed. GenerationCache keys
+the outputs of a generation by everything that determines them (backend,
+model or workflow, prompt, parameters and the content hashes of input files)
+and, on a repeat request, copies the cached files to the requested save path
+instead of calling the backend. Entries are always independent copies, never
+hard links, so a later write to a producer's output file or to a save path
+cannot change what the cache returns.
+
+Entries live under GENERATION_CACHE_DIR (default ~/.cache/fractflow/generations),
+one directory per key, and are shared by every tool server process. The least
+recently used entries are evicted once the cache exceeds GENERATION_CACHE_MAX_MB.
+Set GENERATION_CACHE=0 to disable it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_CACHE_DIR = os.getenv('GENERATION_CACHE_DIR', os.path.join('~', '.cache', 'fractflow', 'generations'))
+DEFAULT_MAX_MB = int(os.getenv('GENERATION_CACHE_MAX_MB', '2048'))
+CACHE_ENABLED = os.getenv('GENERATION_CACHE', '1').lower() not in ('0', 'false', 'no')
+
+_META_FILE = 'meta.json'
+
+
+def file_hash(path: str) -> str:
+    """Content hash of a file, read in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def place_file(source: str, destination: str) -> str:
+    """
+    Put a copy of source at destination, replacing any existing file.
+
+    The file is copied rather than hard-linked, so source and destination
+    never share data, and appears atomically under its final name.
+    """
+    os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+    temp_path = f"{destination}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return destination
+
+
+class CachedOutput:
+    """One file of a cache entry, with the metadata the producing tool stored for it."""
+
+    def __init__(self, path: str, info: Dict[str, Any]):
+        self.path = path  # file inside the cache
+        self.info = info  # e.g. output name and index, used to rebuild the output filename
+
+
+class GenerationCache:
+    """
+    On-disk LRU cache of generation outputs.
+
+    Usage:
+        key = cache.key("openai-images", "gpt-image-1", prompt, {"quality": "low"})
+        outputs = cache.lookup(key)
+        if outputs is None:
+            ... generate save_path ...
+            cache.store(key, [(save_path, {})])
+        else:
+            place_file(outputs[0].path, save_path)
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_mb: int = DEFAULT_MAX_MB,
+                 enabled: bool = CACHE_ENABLED):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_mb * 1024 * 1024
+        self.enabled = enabled and self.max_bytes > 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(backend: str, model: str, prompt: str = '', params: Optional[Dict[str, Any]] = None,
+            input_files: Sequence[str] = ()) -> str:
+        """
+        Cache key of a generation request.
+
+        Args:
+            backend: Generation service, e.g. "openai-images" or "comfyui"
+            model: Model or workflow name
+            prompt: Text prompt
+            params: Any other parameters that change the output (must be JSON serializable)
+            input_files: Paths of input images; their contents, not their paths, enter the key
+        """
+        payload = json.dumps({
+            'backend': backend,
+            'model': model,
+            'prompt': prompt,
+            'params': params or {},
+            'inputs': [file_hash(path) for path in input_files],
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key: str) -> Optional[List[CachedOutput]]:
+        """Return the cached outputs for a key, or None on a miss. A hit marks the entry as recently used."""
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, _META_FILE)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            outputs = [CachedOutput(os.path.join(entry_dir, item['file']), item.get('info', {}))
+                       for item in meta['files']]
+            if not all(os.path.exists(output.path) for output in outputs):
+                raise FileNotFoundError(entry_dir)
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return outputs
+
+    def store(self, key: str, files: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Add the outputs of a generation to the cache.
+
+        Args:
+            key: Key from key()
+            files: (produced file path, info) pairs; info is returned with the file on lookup
+        """
+        if not self.enabled or not files:
+            return
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(os.path.join(entry_dir, _META_FILE)):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Build the entry under a temporary name so concurrent readers never see a partial entry
+        temp_dir = f"{entry_dir}.{uuid.uuid4().hex[:8]}.tmp"
+        os.makedirs(temp_dir)
+        try:
+            items = []
+            for index, (path, info) in enumerate(files):
+                name = f"{index}{os.path.splitext(path)[1]}"
+                place_file(path, os.path.join(temp_dir, name))
+                items.append({'file': name, 'info': info})
+            with open(os.path.join(temp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'files': items, 'created': time.time()}, f, ensure_ascii=False)
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                meta_path = os.path.join(entry.path, _META_FILE)
+                if not entry.is_dir() or not os.path.exists(meta_path):
+                    continue
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((os.stat(meta_path).st_mtime, size, entry.path))
+                total += size
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_cache: Optional[GenerationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """Get the process-wide generation cache configured from the environment."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GenerationCache()
+        return _cache
@@ -0,0 +1,205 @@
+"""
+Image preparation utilities for VLM tools.
+
+Loads, resizes and encodes images into base64 data URLs for vision model
+requests. Encoded payloads are kept in an LRU cache keyed by the image content
+hash and the encoding options, so a frame analysed by several tools in the same
+process is only decoded, resized and encoded once.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from PIL import Image
+
+# Output format: "auto" picks PNG for images with transparency or a palette and
+# JPEG otherwise; "png", "jpeg" and "webp" force a format.
+DEFAULT_IMAGE_FORMAT = os.getenv('VLM_IMAGE_FORMAT', 'auto')
+DEFAULT_IMAGE_QUALITY = int(os.getenv('VLM_IMAGE_QUALITY', '85'))
+DEFAULT_CACHE_SIZE = int(os.getenv('VLM_IMAGE_CACHE_SIZE', '64'))
+
+_MIME_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+ImageSource = Union[str, bytes, Image.Image]
+
+
+class PreparedImage:
+    """A resized and encoded image ready to be put in an image_url message field."""
+
+    def __init__(self, base64_data: str, image_format: str, width: int, height: int, encoded_size: int):
+        self.base64_data = base64_data
+        self.image_format = image_format
+        self.width = width  # original width (of the region, if one was cropped)
+        self.height = height  # original height (of the region, if one was cropped)
+        self.encoded_size = encoded_size  # bytes before base64
+
+    @property
+    def mime_type(self) -> str:
+        return _MIME_TYPES[self.image_format]
+
+    @property
+    def data_url(self) -> str:
+        return f'data:{self.mime_type};base64,{self.base64_data}'
+
+    @property
+    def meta_info(self) -> Dict[str, Any]:
+        return {'width': self.width, 'height': self.height, 'format': self.image_format}
+
+
+class ImageEncodingCache:
+    """Thread-safe LRU cache of PreparedImage objects."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, PreparedImage]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[PreparedImage]:
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prepared
+
+    def put(self, key: Tuple, prepared: PreparedImage) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = prepared
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide cache shared by every tool in the MCP server process
+image_cache = ImageEncodingCache()
+
+
+def normalize_path(path: str) -> str:
+    """
+    Normalize a file path by expanding ~ to user's home directory
+    and resolving relative paths.
+    """
+    expanded_path = os.path.expanduser(path)
+    if not os.path.isabs(expanded_path):
+        expanded_path = os.path.abspath(expanded_path)
+    return expanded_path
+
+
+def _read_source(source: ImageSource) -> Tuple[str, Optional[bytes], Optional[Image.Image]]:
+    """Return (content hash, encoded bytes or None, PIL image or None) for a source."""
+    if isinstance(source, Image.Image):
+        digest = hashlib.blake2b(source.tobytes(), digest_size=16)
+        digest.update(f'{source.mode}{source.size}'.encode())
+        return digest.hexdigest(), None, source
+
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        with open(normalize_path(source), 'rb') as f:
+            data = f.read()
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), data, None
+
+
+def _choose_format(image: Image.Image, image_format: str) -> str:
+    image_format = image_format.lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format != 'auto':
+        if image_format not in _MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        return image_format
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return 'png' if has_alpha or image.mode in ('1', 'P') else 'jpeg'
+
+
+def _encode(image: Image.Image, size_limit: Tuple[int, int], image_format: str, quality: int,
+            owned: bool, region: Optional[Tuple[int, int, int, int]] = None) -> PreparedImage:
+    if region is not None:
+        # crop() returns a new image, so the caller's image is left untouched
+        image = image.crop(region)
+    elif not owned:
+        # Never resize the caller's image in place
+        image = image.copy()
+    # Read the original size before draft(), which shrinks .size
+    width, height = image.size
+    if region is None and owned and image.format == 'JPEG':
+        # JPEG files can be decoded directly at a reduced scale, which is much
+        # cheaper than decoding at full resolution and resampling afterwards.
+        image.draft('RGB', size_limit)
+    image.thumbnail(size_limit, reducing_gap=2.0)
+
+    output_format = _choose_format(image, image_format)
+    if output_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            rgba = image.convert('RGBA')
+            background = Image.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        else:
+            image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    if output_format == 'png':
+        image.save(buffer, format='PNG', compress_level=1)
+    else:
+        image.save(buffer, format=output_format.upper(), quality=quality)
+    encoded = buffer.getvalue()
+    return PreparedImage(base64.b64encode(encoded).decode('utf-8'), output_format, width, height, len(encoded))
+
+
+def prepare_image(source: ImageSource,
+                  size_limit: Tuple[int, int] = (512, 512),
+                  image_format: Optional[str] = None,
+                  quality: Optional[int] = None,
+                  cache: Optional[ImageEncodingCache] = image_cache,
+                  region: Optional[Tuple[int, int, int, int]] = None) -> PreparedImage:
+    """
+    Load, resize and encode an image for a VLM request, reusing cached results.
+
+    Args:
+        source: Image file path, encoded image bytes, or a PIL image
+        size_limit: Maximum (width, height); aspect ratio is preserved
+        image_format: 'auto', 'png', 'jpeg' or 'webp' (defaults to VLM_IMAGE_FORMAT)
+        quality: JPEG/WebP quality (defaults to VLM_IMAGE_QUALITY)
+        cache: Cache to use, or None to disable caching
+        region: Optional (x1, y1, x2, y2) box in pixels; only this part of the
+            image is encoded, so detection crops need not be written to disk
+
+    Returns:
+        PreparedImage with the base64 payload, data URL and original size
+    """
+    image_format = image_format or DEFAULT_IMAGE_FORMAT
+    if quality is None:
+        quality = DEFAULT_IMAGE_QUALITY
+
+    content_hash, data, image = _read_source(source)
+    region = tuple(int(v) for v in region) if region is not None else None
+    key = (content_hash, tuple(size_limit), image_format, quality, region)
+    if cache is not None:
+        prepared = cache.get(key)
+        if prepared is not None:
+            return prepared
+
+    owned = image is None
+    if owned:
+        image = Image.open(io.BytesIO(data))
+    prepared = _encode(image, tuple(size_limit), image_format, quality, owned, region)
+
+    if cache is not None:
+        cache.put(key, prepared)
+    return prepared
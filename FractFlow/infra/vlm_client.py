@@ -0,0 +1,148 @@
+"""
+Shared VLM client for tool servers.
+
+VLM tools used to build a new OpenAI client inside every call, which meant a
+new connection pool and TLS handshake per request and a blocking call on the
+MCP server's event loop. get_vlm_client() returns one client per
+(base_url, api_key) for the whole process, with keep-alive connections,
+timeouts and a cap on concurrent requests.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+QWEN_BASE_URL = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+
+DEFAULT_TIMEOUT = float(os.getenv('VLM_TIMEOUT', '120'))
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv('VLM_CONNECT_TIMEOUT', '10'))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('VLM_MAX_CONCURRENCY', '8'))
+DEFAULT_MAX_RETRIES = int(os.getenv('VLM_MAX_RETRIES', '2'))
+
+
+class VLMClient:
+    """
+    Pooled chat-completions client with bounded concurrency.
+
+    Use chat() from async tools and chat_sync() from plain scripts. The async
+    HTTP pool is tied to the event loop it was created on, so it is rebuilt
+    transparently if the client is used from a new loop.
+    """
+
+    def __init__(self,
+                 api_key: Optional[str],
+                 base_url: str = QWEN_BASE_URL,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=DEFAULT_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_concurrency,
+            keepalive_expiry=60.0
+        )
+        self.max_retries = max_retries
+
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+        self._closing: Set[asyncio.Task] = set()
+        self._sync_client: Optional[OpenAI] = None
+        self._sync_semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    def _get_async_client(self) -> Tuple[AsyncOpenAI, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._close_async_client()
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=self.max_retries,
+                http_client=httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            )
+            self._async_loop = loop
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client, self._async_semaphore
+
+    def _close_async_client(self) -> None:
+        """Close the client of a previous event loop so its connection pool is released."""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        if client is None:
+            return
+        if loop is not None and loop.is_running():
+            # The old loop still runs in another thread: close the client there
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+            return
+        # The old loop has stopped, so its connections can only be torn down from here
+        task = asyncio.get_running_loop().create_task(self._close_quietly(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_quietly(client: AsyncOpenAI) -> None:
+        try:
+            await client.close()
+        except Exception:
+            # Transports of a closed loop cannot be shut down cleanly; their
+            # sockets are closed when they are garbage collected
+            pass
+
+    def _get_sync_client(self) -> OpenAI:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=self.max_retries,
+                    http_client=httpx.Client(timeout=self.timeout, limits=self.limits)
+                )
+            return self._sync_client
+
+    async def chat(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> str:
+        """Run a chat completion without blocking the event loop and return the message content."""
+        client, semaphore = self._get_async_client()
+        async with semaphore:
+            completion = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return completion.choices[0].message.content
+
+    def chat_sync(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> str:
+        """Blocking variant of chat() for synchronous callers."""
+        client = self._get_sync_client()
+        with self._sync_semaphore:
+            completion = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return completion.choices[0].message.content
+
+
+_clients: Dict[Tuple[str, Optional[str]], VLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_vlm_client(api_key: Optional[str] = None, base_url: str = QWEN_BASE_URL) -> VLMClient:
+    """
+    Get the process-wide client for a VLM endpoint.
+
+    Args:
+        api_key: API key, defaults to the QWEN_API_KEY environment variable
+        base_url: OpenAI-compatible endpoint, defaults to DashScope
+
+    Returns:
+        VLMClient shared by every caller using the same endpoint and key
+    """
+    if api_key is None:
+        api_key = os.getenv('QWEN_API_KEY')
+    key = (base_url, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = VLMClient(api_key=api_key, base_url=base_url)
+            _clients[key] = client
+        return client
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from FractFlow.infra.generation_cache import GenerationCache, place_file
+
+
+class TestGenerationCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = GenerationCache(directory=os.path.join(self.temp_dir, "cache"), enabled=True)
+        self.save_path = os.path.join(self.temp_dir, "out", "image.png")
+        os.makedirs(os.path.dirname(self.save_path))
+        self.key = self.cache.key("comfyui", "workflow", "a lighthouse", {"seed": 1})
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, path, data):
+        # In-place write, as a tool overwriting its save_path would do
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_rewriting_stored_output_leaves_entry_unchanged(self):
+        self.write(self.save_path, b"seed 1")
+        self.cache.store(self.key, [(self.save_path, {})])
+
+        self.write(self.save_path, b"seed 2")
+
+        outputs = self.cache.lookup(self.key)
+        self.assertIsNotNone(outputs)
+        self.assertEqual(self.read(outputs[0].path), b"seed 1")
+
+    def test_rewriting_placed_hit_leaves_entry_unchanged(self):
+        self.write(self.save_path, b"seed 1")
+        self.cache.store(self.key, [(self.save_path, {})])
+        other_path = os.path.join(self.temp_dir, "out", "copy.png")
+        place_file(self.cache.lookup(self.key)[0].path, other_path)
+        self.assertEqual(self.read(other_path), b"seed 1")
+
+        self.write(other_path, b"seed 2")
+
+        self.assertEqual(self.read(self.cache.lookup(self.key)[0].path), b"seed 1")
+
+    def test_place_file_replaces_destination_atomically(self):
+        source = os.path.join(self.temp_dir, "source.png")
+        self.write(source, b"new")
+        self.write(self.save_path, b"old")
+
+        place_file(source, self.save_path)
+
+        self.assertEqual(self.read(self.save_path), b"new")
+        self.assertNotEqual(os.stat(source).st_ino, os.stat(self.save_path).st_ino)
+        self.assertEqual(os.listdir(os.path.dirname(self.save_path)), ["image.png"])
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = GenerationCache(directory=os.path.join(self.temp_dir, "off"), enabled=False)
+        self.write(self.save_path, b"seed 1")
+        cache.store(self.key, [(self.save_path, {})])
+        self.assertIsNone(cache.lookup(self.key))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "off")))
+
+
+if __name__ == '__main__':
+    unittest.main()
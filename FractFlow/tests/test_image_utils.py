@@ -0,0 +1,30 @@
+import io
+import unittest
+
+from PIL import Image
+
+from FractFlow.infra.image_utils import DEFAULT_IMAGE_QUALITY, ImageEncodingCache, prepare_image
+
+
+class TestPrepareImage(unittest.TestCase):
+    def setUp(self):
+        self.image = Image.effect_noise((64, 64), 64).convert('RGB')
+        buffer = io.BytesIO()
+        self.image.save(buffer, format='PNG')
+        self.data = buffer.getvalue()
+
+    def test_explicit_zero_quality_is_honoured(self):
+        lowest = prepare_image(self.data, image_format='jpeg', quality=0, cache=None)
+        default = prepare_image(self.data, image_format='jpeg', cache=None)
+        self.assertNotEqual(DEFAULT_IMAGE_QUALITY, 0)
+        self.assertLess(lowest.encoded_size, default.encoded_size)
+
+    def test_quality_is_part_of_the_cache_key(self):
+        cache = ImageEncodingCache(max_entries=4)
+        lowest = prepare_image(self.data, image_format='jpeg', quality=0, cache=cache)
+        default = prepare_image(self.data, image_format='jpeg', cache=cache)
+        self.assertIsNot(lowest, default)
+
+
+if __name__ == '__main__':
+    unittest.main()
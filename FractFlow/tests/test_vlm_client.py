@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import unittest
+
+from FractFlow.infra.vlm_client import VLMClient
+
+
+class TestVLMClientLoops(unittest.TestCase):
+    def setUp(self):
+        self.client = VLMClient(api_key="test-key", base_url="http://127.0.0.1:9/v1")
+
+    def get_async_client(self):
+        async def get():
+            client, _ = self.client._get_async_client()
+            # Let a pending close of the previous client run
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return client
+        return get
+
+    def test_same_loop_reuses_client(self):
+        async def run():
+            first, _ = self.client._get_async_client()
+            second, _ = self.client._get_async_client()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIs(first, second)
+
+    def test_new_loop_closes_client_of_stopped_loop(self):
+        old = asyncio.run(self.get_async_client()())
+        self.assertFalse(old.is_closed())
+
+        new = asyncio.run(self.get_async_client()())
+
+        self.assertIsNot(old, new)
+        self.assertTrue(old.is_closed())
+        self.assertFalse(new.is_closed())
+
+    def test_new_loop_closes_client_on_running_loop(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            old = asyncio.run_coroutine_threadsafe(self.get_async_client()(), loop).result(5)
+
+            asyncio.run(self.get_async_client()())
+
+            # The close was scheduled on the old loop; wait for it to run there
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(5)
+            self.assertTrue(old.is_closed())
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,9 +9,12 @@ License: MIT License
 
 import asyncio
 import os
+import re
 import sys
+import inspect
 import logging
 import argparse
+import importlib.util
 from typing import List, Tuple, Dict, Any, Optional
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
@@ -22,6 +25,11 @@ from .agent import Agent
 from .infra.config import ConfigManager
 from .infra.logging_utils import setup_logging, get_logger
 
+logger = get_logger(__name__)
+
+# Tool functions loaded for direct routes, keyed by (script path, function name)
+_direct_functions: Dict[Tuple[str, str], Any] = {}
+
 class ToolTemplate:
     """
     Base template class for creating FractFlow tools with multiple running modes.
@@ -74,6 +82,25 @@ class ToolTemplate:
                     custom_system_prompt=cls.SYSTEM_PROMPT
                 )
     
+    ===== SCENARIO 4: Direct Routes =====
+    Skip the LLMs for queries that always map to the same tool call:
+    
+        class MyTool(ToolTemplate):
+            SYSTEM_PROMPT = "You are a helpful assistant for..."
+            TOOL_DESCRIPTION = "This tool helps users with..."
+            TOOLS = [("path/to/my_tool.py", "my_tool_name")]
+            DIRECT_ROUTES = [
+                (r"^Image:\s*(?P<image_path>.+)$", "path/to/my_tool.py", "analyze_image")
+            ]
+    
+    A query that fully matches a route pattern calls the named function of the
+    tool script in-process, with the pattern's named groups as keyword
+    arguments. The orchestrator and tool-call models are never invoked, so a
+    deterministic request costs one tool call instead of several model round
+    trips. Override format_direct_result() to reshape the raw tool output.
+    Queries that match no route, and direct calls that fail, go through the
+    agent as usual. Set FRACTFLOW_DIRECT_ROUTES=0 to disable direct routes.
+    
     ===== REQUIRED ATTRIBUTES =====
     SYSTEM_PROMPT (str): The system prompt for the agent
     TOOL_DESCRIPTION (str): Description for the main MCP tool function
@@ -81,9 +108,11 @@ class ToolTemplate:
     ===== OPTIONAL ATTRIBUTES =====
     TOOLS (List[Tuple[str, str]]): List of (tool_path, tool_name) tuples
     MCP_SERVER_NAME (str): Custom MCP server name (defaults to class name)
+    DIRECT_ROUTES (List[Tuple[str, str, str]]): List of (query_pattern, tool_path, function_name) tuples
     
     ===== OPTIONAL OVERRIDES =====
     create_config() -> ConfigManager: Custom configuration creation
+    format_direct_result() -> str: Formatting of direct route results
     
     ===== CRITICAL: SYSTEM_PROMPT & TOOL_DESCRIPTION ALIGNMENT =====
     
@@ -147,6 +176,7 @@ class ToolTemplate:
     # ===== OPTIONAL: User can define these =====
     TOOLS: List[Tuple[str, str]] = []
     MCP_SERVER_NAME: Optional[str] = None
+    DIRECT_ROUTES: List[Tuple[str, str, str]] = []
     
     # ===== INTERNAL: Template implementation =====
     # Class-level MCP server instance
@@ -213,20 +243,20 @@ class ToolTemplate:
         Args:
             agent: Agent instance to add tools to
         """
-        project_root = cls._get_project_root()
-        
         for tool_path, tool_name in cls.TOOLS:
-            # Handle relative paths - now relative to project root
-            if not os.path.isabs(tool_path):
-                full_path = os.path.join(project_root, tool_path)
-            else:
-                full_path = tool_path
-                
+            full_path = cls._resolve_tool_path(tool_path)
             if not os.path.exists(full_path):
                 raise ValueError(f"Tool path does not exist: {full_path}")
                 
             agent.add_tool(full_path, tool_name)
     
+    @classmethod
+    def _resolve_tool_path(cls, tool_path: str) -> str:
+        """Resolve a tool path, relative paths being relative to the project root"""
+        if os.path.isabs(tool_path):
+            return tool_path
+        return os.path.join(cls._get_project_root(), tool_path)
+    
     @classmethod
     def _get_project_root(cls):
         """
@@ -309,24 +339,97 @@ class ToolTemplate:
         
         # Validate tool paths exist
         project_root = cls._get_project_root()
-        for tool_path, tool_name in cls.TOOLS:
-            # Handle relative paths - now relative to project root
-            if not os.path.isabs(tool_path):
-                full_path = os.path.join(project_root, tool_path)
-            else:
-                full_path = tool_path
-                
+        tool_paths = [tool_path for tool_path, _ in cls.TOOLS]
+        tool_paths += [tool_path for _, tool_path, _ in cls.DIRECT_ROUTES]
+        for tool_path in tool_paths:
+            full_path = cls._resolve_tool_path(tool_path)
             if not os.path.exists(full_path):
                 raise ValueError(
                     f"Tool path does not exist: {full_path}\n"
-                    f"Check the TOOLS configuration in {cls.__name__}.\n"
+                    f"Check the TOOLS and DIRECT_ROUTES configuration in {cls.__name__}.\n"
                     f"Tool paths should be relative to the project root or absolute paths.\n"
                     f"Project root detected: {project_root}"
                 )
     
+        for pattern, _, _ in cls.DIRECT_ROUTES:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid DIRECT_ROUTES pattern in {cls.__name__}: {pattern!r} ({e})")
+    
+    @classmethod
+    def format_direct_result(cls, query: str, function_name: str, result: Any) -> Optional[str]:
+        """
+        Format the output of a direct route before returning it.
+        
+        **SCENARIO 4 USER OVERRIDE POINT**
+        The default returns the tool output unchanged. Override this to produce
+        the same output format the agent would, without an LLM call, or return
+        None to hand the query to the agent instead (e.g. for unusable output).
+        
+        Args:
+            query: The original query
+            function_name: Name of the tool function that was called
+            result: Return value of the tool function
+            
+        Returns:
+            Optional[str]: Final result for the caller, or None to fall back to the agent
+        """
+        return result if isinstance(result, str) else str(result)
+    
+    @classmethod
+    def _load_direct_function(cls, tool_path: str, function_name: str):
+        """Import a tool script once per process and return one of its functions"""
+        full_path = os.path.abspath(cls._resolve_tool_path(tool_path))
+        key = (full_path, function_name)
+        if key not in _direct_functions:
+            # Tool scripts import their sibling modules, as when run as `python script.py`
+            tool_dir = os.path.dirname(full_path)
+            if tool_dir not in sys.path:
+                sys.path.append(tool_dir)
+            module_name = f"_fractflow_direct_{os.path.splitext(os.path.basename(full_path))[0]}"
+            spec = importlib.util.spec_from_file_location(module_name, full_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _direct_functions[key] = getattr(module, function_name)
+        return _direct_functions[key]
+    
+    @classmethod
+    async def _try_direct(cls, query: str) -> Optional[str]:
+        """
+        Answer a query through a matching direct route.
+        
+        Returns:
+            The formatted result, or None if no route matched, the call failed
+            or the formatter declined the result
+        """
+        if not cls.DIRECT_ROUTES or os.getenv('FRACTFLOW_DIRECT_ROUTES', '1') == '0':
+            return None
+        
+        for pattern, tool_path, function_name in cls.DIRECT_ROUTES:
+            match = re.fullmatch(pattern, query.strip(), flags=re.DOTALL)
+            if match is None:
+                continue
+            try:
+                function = cls._load_direct_function(tool_path, function_name)
+                arguments = {name: value.strip() for name, value in match.groupdict().items() if value is not None}
+                if inspect.iscoroutinefunction(function):
+                    result = await function(**arguments)
+                else:
+                    result = await asyncio.to_thread(function, **arguments)
+                return cls.format_direct_result(query, function_name, result)
+            except Exception as e:
+                logger.warning(f"Direct route {function_name} failed, falling back to the agent: {e}")
+                return None
+        return None
+    
     @classmethod
     async def _mcp_tool_function(cls, query: str) -> str:
         """The main MCP tool function that processes queries"""
+        result = await cls._try_direct(query)
+        if result is not None:
+            return result
+        
         agent = await cls.create_agent()
         try:
             result = await agent.process_query(query)
@@ -349,7 +452,9 @@ class ToolTemplate:
                     break
                 
                 print("\nProcessing...\n")
-                result = await agent.process_query(user_input)
+                result = await cls._try_direct(user_input)
+                if result is None:
+                    result = await agent.process_query(user_input)
                 print(f"Agent: {result}")
         finally:
             await agent.shutdown()
@@ -361,6 +466,11 @@ class ToolTemplate:
         print(f"Processing query: {query}")
         print("\nProcessing...\n")
         
+        result = await cls._try_direct(query)
+        if result is not None:
+            print(f"Result: {result}")
+            return result
+        
         agent = await cls.create_agent('agent')
         
         try:
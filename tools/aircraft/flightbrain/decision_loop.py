@@ -0,0 +1,223 @@
+"""
+Continuous landing decision loop for FlightBrain.
+
+Frames arrive from a directory watcher or a local socket. Each frame gets a
+structured safety verdict (cached for near-identical frames), and the loop
+only escalates to the LLM agent when the verdict level changes. While the
+situation is stable, decisions come from the rule table in flight_rules.py.
+
+If frames arrive faster than decisions can be made, stale frames are dropped
+and only the newest one is processed, so decisions always refer to the most
+recent view.
+"""
+
+import asyncio
+import fnmatch
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class FrameQueue:
+    """Queue of frame paths that hands out only the newest pending frame"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame_path: str):
+        self.received += 1
+        self._queue.put_nowait(frame_path)
+
+    async def frames(self) -> AsyncIterator[str]:
+        while True:
+            frame_path = await self._queue.get()
+            while not self._queue.empty():
+                frame_path = self._queue.get_nowait()
+                self.dropped += 1
+            yield frame_path
+
+
+async def watch_directory(queue: FrameQueue, directory: str, pattern: str = "*.png",
+                          poll_interval: float = 0.05, include_existing: bool = False):
+    """
+    Put new image files from a directory on the queue.
+
+    A file is only queued once its size is unchanged between two polls, so
+    frames still being written are not read.
+
+    Args:
+        queue: Queue to feed
+        directory: Directory the camera writes frames to
+        pattern: Filename pattern of frames
+        poll_interval: Seconds between directory scans
+        include_existing: Also queue the files present at startup
+    """
+    seen = set()
+    pending: Dict[str, int] = {}
+    first_scan = True
+    while True:
+        try:
+            entries = [entry for entry in os.scandir(directory)
+                       if entry.is_file() and fnmatch.fnmatch(entry.name, pattern)]
+        except FileNotFoundError:
+            entries = []
+
+        ready = []
+        for entry in entries:
+            if entry.path in seen:
+                continue
+            stat = entry.stat()
+            if first_scan and not include_existing:
+                seen.add(entry.path)
+            elif pending.get(entry.path) == stat.st_size:
+                seen.add(entry.path)
+                pending.pop(entry.path)
+                ready.append((stat.st_mtime_ns, entry.path))
+            else:
+                pending[entry.path] = stat.st_size
+
+        for _, path in sorted(ready):
+            queue.put(path)
+        first_scan = False
+        await asyncio.sleep(poll_interval)
+
+
+async def serve_socket(queue: FrameQueue, host: str = "127.0.0.1", port: int = 8765):
+    """
+    Accept frame paths over a local TCP socket, one path per line.
+
+    Example client: printf '/path/frame_0001.png\\n' | nc 127.0.0.1 8765
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame_path = line.decode("utf-8").strip()
+                if frame_path:
+                    queue.put(frame_path)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+class LoopStats:
+    """Throughput of the decision loop and how decisions were made"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.decisions = 0
+        self.rule_decisions = 0   # served by flight_rules, no LLM call
+        self.llm_decisions = 0    # escalated to the agent
+        self.cached_verdicts = 0  # verdicts reused without a VLM request
+        self.dropped_frames = 0
+
+    def record(self, escalated: bool, cached: bool):
+        self.decisions += 1
+        if escalated:
+            self.llm_decisions += 1
+        else:
+            self.rule_decisions += 1
+        if cached:
+            self.cached_verdicts += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def decisions_per_second(self) -> float:
+        return self.decisions / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def rule_share(self) -> float:
+        return self.rule_decisions / self.decisions if self.decisions else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "decisions": self.decisions,
+            "decisions_per_second": round(self.decisions_per_second, 2),
+            "rule_decisions": self.rule_decisions,
+            "llm_decisions": self.llm_decisions,
+            "rule_share": round(self.rule_share, 3),
+            "cached_verdicts": self.cached_verdicts,
+            "dropped_frames": self.dropped_frames,
+            "elapsed": round(self.elapsed, 2),
+        }
+
+    def summary(self) -> str:
+        return (f"{self.decisions} decisions in {self.elapsed:.1f}s "
+                f"({self.decisions_per_second:.2f}/s), "
+                f"{self.rule_share:.0%} without LLM "
+                f"({self.llm_decisions} escalated, {self.cached_verdicts} cached verdicts, "
+                f"{self.dropped_frames} stale frames dropped)")
+
+
+class DecisionLoop:
+    """
+    Decide on every frame, calling the LLM only when the safety level changes.
+
+    Args:
+        assess: async frame_path -> SafetyVerdict
+        decide: verdict -> (command, params), e.g. flight_rules.decide_flight_action
+        execute: async (command, params) -> result text, runs a flight tool
+        escalate: async (frame_path, verdict) -> result text, runs the LLM agent
+        report_every: Print the stats every this many decisions (0 to disable)
+    """
+
+    def __init__(self,
+                 assess: Callable[[str], Awaitable[Any]],
+                 decide: Callable[[Any], Tuple[str, Dict[str, Any]]],
+                 execute: Callable[[str, Dict[str, Any]], Awaitable[str]],
+                 escalate: Callable[[str, Any], Awaitable[str]],
+                 report_every: int = 10):
+        self.assess = assess
+        self.decide = decide
+        self.execute = execute
+        self.escalate = escalate
+        self.report_every = report_every
+        self.last_level: Optional[str] = None
+        self.stats = LoopStats()
+
+    async def step(self, frame_path: str) -> Tuple[str, str]:
+        """
+        Decide on one frame.
+
+        Returns:
+            (source, result): source is "rules" or "llm"
+        """
+        verdict = await self.assess(frame_path)
+        # 首帧、结论变化或结论不明确（包括关键词推测出的结论）时交给LLM，其余帧走规则表
+        escalated = (verdict.level != self.last_level or verdict.level == "unknown"
+                     or not verdict.structured)
+        if escalated:
+            result = await self.escalate(frame_path, verdict)
+        else:
+            command, params = self.decide(verdict)
+            result = await self.execute(command, params)
+        self.last_level = verdict.level
+        self.stats.record(escalated, verdict.cached)
+        return ("llm" if escalated else "rules"), result
+
+    async def run(self, queue: FrameQueue, max_frames: Optional[int] = None) -> LoopStats:
+        """Process frames from the queue until max_frames decisions (or forever)"""
+        self.stats = LoopStats()
+        async for frame_path in queue.frames():
+            try:
+                source, result = await self.step(frame_path)
+                print(f"[{source}] {os.path.basename(frame_path)}: {result}")
+            except Exception as e:
+                print(f"Error processing frame {frame_path}: {e}")
+            self.stats.dropped_frames = queue.dropped
+
+            if self.report_every and self.stats.decisions % self.report_every == 0 and self.stats.decisions:
+                print(f"Decision loop: {self.stats.summary()}")
+            if max_frames is not None and self.stats.decisions >= max_frames:
+                break
+        return self.stats
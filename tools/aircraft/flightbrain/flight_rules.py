@@ -0,0 +1,67 @@
+"""
+Rule-based flight decisions from a landing safety assessment.
+
+Shared by FlightBrain_Agent and the landing pipeline so a deterministic
+decision can be made without another LLM round trip.
+"""
+
+from typing import Any, Dict, Tuple, Union
+
+# Commands for the levels of a structured SafetyVerdict (safety_check/safety_verdict.py)
+LEVEL_ACTIONS = {
+    "safe": ("land", {}),
+    "caution": ("descend", {"distance": 2.0}),
+    "unsafe": ("hover", {"duration": 5.0}),
+}
+# Command for a verdict whose level was only guessed from keywords: hold position until reviewed
+UNREVIEWED_ACTION = ("hover", {"duration": 5.0})
+
+# "不适合降落" contains "适合降落", so these are checked before the positive verdicts
+_NEGATIVE_VERDICTS = ["不适合降落", "不太适合降落", "不宜降落", "无法降落"]
+
+
+def decide_flight_action(safety_result: Union[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Map a safety assessment to a flight command and its parameters.
+
+    A SafetyVerdict is only acted on when its level came from the report's
+    评估结果 section (verdict.structured). A level guessed from keywords can be
+    wrong ("不太适合降落" contains "适合降落"), so such verdicts hover instead.
+
+    Args:
+        safety_result: A SafetyVerdict, or safety analysis text (e.g. Safety_VLM / Safety_Agent output)
+
+    Returns:
+        (command, params), e.g. ("descend", {"distance": 2.0})
+    """
+    if not isinstance(safety_result, str):
+        if not safety_result.structured:
+            return UNREVIEWED_ACTION[0], dict(UNREVIEWED_ACTION[1])
+        # Structured verdict: decide on its level, fall back to the report text if unknown
+        action = LEVEL_ACTIONS.get(safety_result.level)
+        if action is not None:
+            return action[0], dict(action[1])
+        safety_result = safety_result.report
+
+    safety_lower = safety_result.lower()
+
+    # "not safe" is checked before "safe to land", so the negative verdicts must be tested first
+    if any(word in safety_result for word in _NEGATIVE_VERDICTS) or "not safe" in safety_lower:
+        return "hover", {"duration": 5.0}
+    elif "适合降落" in safety_result or "safe to land" in safety_lower:
+        return "land", {}
+    elif "谨慎降落" in safety_result or "caution" in safety_lower:
+        return "descend", {"distance": 2.0}
+    elif "障碍物" in safety_result or "obstacle" in safety_lower:
+        return "ascend", {"distance": 5.0}
+    elif "向前" in safety_result or "forward" in safety_lower:
+        return "move_forward", {"distance": 3.0}
+    elif "向后" in safety_result or "backward" in safety_lower:
+        return "move_backward", {"distance": 3.0}
+    elif "向左" in safety_result or "left" in safety_lower:
+        return "move_left", {"distance": 3.0}
+    elif "向右" in safety_result or "right" in safety_lower:
+        return "move_right", {"distance": 3.0}
+    else:
+        # 默认悬停
+        return "hover", {"duration": 3.0}
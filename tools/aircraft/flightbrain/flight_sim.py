@@ -0,0 +1,181 @@
+"""
+Fleet flight simulation core for FlightBrain.
+
+All aircraft state lives in NumPy arrays with one row per aircraft, so a
+single process can step hundreds of simulated approaches at once. Kinematics
+are integrated at a fixed rate: commands only set targets, and step() moves
+every aircraft towards its target within its speed limits.
+
+Frame convention (matches the original flightbrain tools at yaw 0):
+    x: forward / north, y: right / east, z: up (altitude above ground)
+    yaw: degrees, positive is clockwise seen from above
+"""
+
+from typing import Any, Dict, Union
+import numpy as np
+
+Index = Union[int, slice, np.ndarray, list]
+
+
+class FlightSimulator:
+    """Vectorized kinematic simulator for a fleet of eVTOL aircraft"""
+
+    def __init__(
+        self,
+        num_aircraft: int = 1,
+        rate_hz: float = 20.0,
+        max_speed: float = 5.0,
+        max_climb_rate: float = 3.0,
+        max_yaw_rate: float = 45.0,
+        initial_altitude: float = 100.0,
+    ):
+        """
+        Args:
+            num_aircraft: Number of simulated aircraft
+            rate_hz: Fixed integration rate in steps per second
+            max_speed: Horizontal speed limit in m/s
+            max_climb_rate: Vertical speed limit in m/s
+            max_yaw_rate: Yaw rate limit in degrees per second
+            initial_altitude: Starting altitude of every aircraft in meters
+        """
+        self.num_aircraft = num_aircraft
+        self.dt = 1.0 / rate_hz
+        self.max_speed = max_speed
+        self.max_climb_rate = max_climb_rate
+        self.max_yaw_rate = max_yaw_rate
+        self.time = 0.0
+
+        self.position = np.zeros((num_aircraft, 3))
+        self.position[:, 2] = initial_altitude
+        self.velocity = np.zeros((num_aircraft, 3))
+        self.attitude = np.zeros((num_aircraft, 3))  # pitch, roll, yaw in degrees
+        self.target = self.position.copy()
+        self.yaw_remaining = np.zeros(num_aircraft)
+        self.status = np.full(num_aircraft, "hovering", dtype=object)
+        self.safety_status = np.full(num_aircraft, "unknown", dtype=object)
+
+    @property
+    def yaw(self) -> np.ndarray:
+        return self.attitude[:, 2]
+
+    def _heading(self, ids: Index) -> np.ndarray:
+        """Heading in radians once any pending rotation has completed"""
+        return np.radians(self.attitude[ids, 2] + self.yaw_remaining[ids])
+
+    def body_to_world(self, ids: Index, forward, right) -> np.ndarray:
+        """Convert body-frame (forward, right) displacements to world (x, y)"""
+        heading = self._heading(ids)
+        forward = np.asarray(forward, dtype=float)
+        right = np.asarray(right, dtype=float)
+        cos_h, sin_h = np.cos(heading), np.sin(heading)
+        dx = forward * cos_h - right * sin_h
+        dy = forward * sin_h + right * cos_h
+        return np.stack(np.broadcast_arrays(dx, dy), axis=-1)
+
+    # ===== Commands: set targets, the motion happens in step() =====
+
+    def command_move(self, ids: Index, forward=0.0, right=0.0, up=0.0, status: str = None):
+        """Queue a body-frame displacement relative to the current target"""
+        self.target[ids, :2] += self.body_to_world(ids, forward, right)
+        self.target[ids, 2] = np.maximum(self.target[ids, 2] + np.asarray(up, dtype=float), 0.0)
+        if status is not None:
+            self.status[ids] = status
+
+    def command_rotate(self, ids: Index, angle, status: str = None):
+        """Queue a yaw change in degrees (positive is clockwise)"""
+        self.yaw_remaining[ids] += np.asarray(angle, dtype=float)
+        if status is not None:
+            self.status[ids] = status
+
+    def command_hover(self, ids: Index, status: str = "hovering"):
+        """Cancel pending motion and hold the current position"""
+        self.target[ids] = self.position[ids]
+        self.yaw_remaining[ids] = 0.0
+        self.velocity[ids] = 0.0
+        self.status[ids] = status
+
+    def command_land(self, ids: Index):
+        """Descend vertically to the ground"""
+        self.target[ids, 2] = 0.0
+        self.status[ids] = "landing"
+
+    # ===== Integration =====
+
+    def step(self, steps: int = 1):
+        """Advance the whole fleet by a number of fixed time steps"""
+        dt = self.dt
+        max_yaw = self.max_yaw_rate * dt
+        max_horizontal = self.max_speed * dt
+        max_vertical = self.max_climb_rate * dt
+
+        for _ in range(steps):
+            yaw_step = np.clip(self.yaw_remaining, -max_yaw, max_yaw)
+            self.attitude[:, 2] = (self.attitude[:, 2] + yaw_step) % 360
+            self.yaw_remaining -= yaw_step
+
+            delta = self.target - self.position
+            distance = np.linalg.norm(delta[:, :2], axis=1)
+            scale = np.minimum(1.0, max_horizontal / np.maximum(distance, 1e-9))
+            move = np.empty_like(delta)
+            move[:, :2] = delta[:, :2] * scale[:, None]
+            move[:, 2] = np.clip(delta[:, 2], -max_vertical, max_vertical)
+
+            self.velocity = move / dt
+            self.position += move
+            self.position[:, 2] = np.maximum(self.position[:, 2], 0.0)
+            self.time += dt
+
+        landed = (self.status == "landing") & (self.position[:, 2] <= 1e-9)
+        self.status[landed] = "landed"
+        self.velocity[landed] = 0.0
+
+    def is_idle(self, tolerance: float = 1e-6) -> np.ndarray:
+        """Boolean array: aircraft that have reached their target and heading"""
+        reached = np.all(np.abs(self.target - self.position) <= tolerance, axis=1)
+        return reached & (np.abs(self.yaw_remaining) <= tolerance)
+
+    def advance(self, duration: float) -> int:
+        """Advance simulation time by duration seconds; returns steps taken"""
+        steps = max(0, int(round(duration / self.dt)))
+        self.step(steps)
+        return steps
+
+    def time_to_idle(self) -> np.ndarray:
+        """Seconds each aircraft needs to reach its target and heading at its speed limits"""
+        delta = self.target - self.position
+        horizontal = np.linalg.norm(delta[:, :2], axis=1) / self.max_speed
+        vertical = np.abs(delta[:, 2]) / self.max_climb_rate
+        yaw = np.abs(self.yaw_remaining) / self.max_yaw_rate
+        return np.maximum(np.maximum(horizontal, vertical), yaw)
+
+    def run_until_idle(self, max_time: float = None) -> float:
+        """
+        Step until every aircraft is idle or max_time elapses; returns simulated seconds
+
+        By default max_time is sized from the pending motion (plus a few steps of
+        slack), so every commanded manoeuvre completes however long it is.
+        """
+        if max_time is None:
+            max_time = float(self.time_to_idle().max(initial=0.0)) + 2 * self.dt
+        start = self.time
+        while not self.is_idle().all() and self.time - start < max_time:
+            self.step()
+        self.velocity[self.is_idle()] = 0.0
+        return self.time - start
+
+    # ===== Reporting =====
+
+    def state_dict(self, index: int) -> Dict[str, Any]:
+        """State of one aircraft in the dict layout used by flightbrain tools"""
+        x, y, z = (float(v) for v in self.position[index])
+        vx, vy, vz = (float(v) for v in self.velocity[index])
+        pitch, roll, yaw = (float(v) for v in self.attitude[index])
+        return {
+            "position": {"x": x, "y": y, "z": z},
+            "velocity": {"x": vx, "y": vy, "z": vz},
+            "attitude": {"pitch": pitch, "roll": roll, "yaw": yaw},
+            "status": self.status[index],
+            "altitude": z,
+            "sim_time": self.time,
+            "safety_status": self.safety_status[index],
+        }
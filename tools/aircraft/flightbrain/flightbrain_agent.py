@@ -1,17 +1,27 @@
 # python flightbrain_agent.py --query "Image:/home/bld/dyx/FractFlow-Aircraft/tools/aircraft/sam/tmp/test_boundary.png"
+# python flightbrain_agent.py --watch-dir ./sam/tmp/camera          # 连续决策：监视目录中的新帧
+# python flightbrain_agent.py --socket-port 8765                    # 连续决策：从本地socket接收帧路径
 
 import os
 import sys
 import re
+import asyncio
+import argparse
 
 # Add the project root directory to the Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '../..'))
 sys.path.append(project_root)
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, '..', 'safety_check'))
 
 # Import the FractFlow ToolTemplate
 from FractFlow.tool_template import ToolTemplate
+from FractFlow.infra.logging_utils import setup_logging
+from FractFlow.mcpcore import get_client_pool
 import json
+from flight_rules import decide_flight_action
+from decision_loop import DecisionLoop, FrameQueue, watch_directory, serve_socket
 
 class FlightBrain_Agent(ToolTemplate):
     """Intelligent Flight Brain Agent that integrates flight control, visual analysis, and safety assessment"""
@@ -34,6 +44,7 @@ class FlightBrain_Agent(ToolTemplate):
 - descend: 下降（打印"The aircraft is descending X meters"）
 - rotate: 旋转（打印"The aircraft is rotating X degrees"）
 - land: 降落（打印"The aircraft has landed"）
+- execute_plan: 一次调用按顺序执行多个上述操作（整体校验，任一步无效则全部不执行），适合已确定的多步进近
 
 # 决策逻辑
 根据图像分析结果：
@@ -102,30 +113,74 @@ class FlightBrain_Agent(ToolTemplate):
         match = re.search(image_pattern, query)
         return match.group(1) if match else None
 
-    def _analyze_and_decide(self, safety_result: str, image_path: str = None):
-        """基于安全结果和图像分析做出飞行决策"""
-        # 简单的决策逻辑，可以根据需要扩展
-        safety_lower = safety_result.lower()
-        
-        if "适合降落" in safety_result or "safe to land" in safety_lower:
-            return "land", {}
-        elif "不适合降落" in safety_result or "not safe" in safety_lower:
-            return "hover", {"duration": 5.0}
-        elif "谨慎降落" in safety_result or "caution" in safety_lower:
-            return "descend", {"distance": 2.0}
-        elif "障碍物" in safety_result or "obstacle" in safety_lower:
-            return "ascend", {"distance": 5.0}
-        elif "向前" in safety_result or "forward" in safety_lower:
-            return "move_forward", {"distance": 3.0}
-        elif "向后" in safety_result or "backward" in safety_lower:
-            return "move_backward", {"distance": 3.0}
-        elif "向左" in safety_result or "left" in safety_lower:
-            return "move_left", {"distance": 3.0}
-        elif "向右" in safety_result or "right" in safety_lower:
-            return "move_right", {"distance": 3.0}
+    @classmethod
+    def _analyze_and_decide(cls, safety_result, image_path: str = None):
+        """基于安全结果（SafetyVerdict或文本）做出飞行决策"""
+        return decide_flight_action(safety_result)
+
+    @classmethod
+    async def _run_decision_loop(cls, watch_dir=None, socket_port=None, pattern="*.png", max_frames=None):
+        """
+        连续决策模式：逐帧评估降落安全，安全结论不变时按规则表直接执行飞行指令，
+        只有结论变化（或不明确）时才调用LLM agent。
+        """
+        # 与Safety_Agent使用同一套评估标准，报告格式可以被稳定解析
+        from safety_vlm import assess_landing_safety_file
+        from landing_guidelines import LANDING_GUIDELINES
+
+        agent = await cls.create_agent('agent')
+        client_pool = get_client_pool()
+
+        async def assess(frame_path):
+            return await assess_landing_safety_file(frame_path, LANDING_GUIDELINES)
+
+        async def execute(command, params):
+            content = await client_pool.call(command, params)
+            return "".join(getattr(item, "text", str(item)) for item in content)
+
+        async def escalate(frame_path, verdict):
+            reasons = "；".join(verdict.reasons)
+            return await agent.process_query(
+                f"Image:{frame_path}\n安全评估: {verdict.level}（风险: {verdict.risk}）{reasons}"
+            )
+
+        loop = DecisionLoop(assess, cls._analyze_and_decide, execute, escalate)
+        queue = FrameQueue()
+        if watch_dir:
+            print(f"Watching {watch_dir} for new frames ({pattern})")
+            producer = asyncio.create_task(watch_directory(queue, watch_dir, pattern))
         else:
-            # 默认悬停
-            return "hover", {"duration": 3.0}
+            print(f"Listening for frame paths on 127.0.0.1:{socket_port}")
+            producer = asyncio.create_task(serve_socket(queue, port=socket_port))
+
+        try:
+            await loop.run(queue, max_frames=max_frames)
+        finally:
+            producer.cancel()
+            print(f"Decision loop finished: {loop.stats.summary()}")
+            print(json.dumps(loop.stats.to_dict(), ensure_ascii=False))
+            await agent.shutdown()
+
+    @classmethod
+    def main(cls):
+        """在ToolTemplate的三种模式之外增加连续决策模式"""
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument('--watch-dir', type=str, help='Decision loop: watch this directory for new frames')
+        parser.add_argument('--socket-port', type=int, help='Decision loop: receive frame paths on this local port')
+        parser.add_argument('--pattern', type=str, default='*.png', help='Frame filename pattern for --watch-dir')
+        parser.add_argument('--max-frames', type=int, help='Stop the decision loop after this many decisions')
+        parser.add_argument('--log-level', '-l', default='INFO')
+        args, _ = parser.parse_known_args()
+
+        if args.watch_dir is None and args.socket_port is None:
+            return super().main()
+
+        cls._validate_configuration()
+        setup_logging(level=args.log_level)
+        try:
+            asyncio.run(cls._run_decision_loop(args.watch_dir, args.socket_port, args.pattern, args.max_frames))
+        except KeyboardInterrupt:
+            pass
 
 if __name__ == "__main__":
     FlightBrain_Agent.main() 
\ No newline at end of file
@@ -1,14 +1,22 @@
 import os
+import sys
+import copy
+import math
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 from mcp.server.fastmcp import FastMCP
-from openai import OpenAI
 from dotenv import load_dotenv
-from PIL import Image
-import base64
-import io
 import json
+import numpy as np
+
+from FractFlow.infra.image_utils import prepare_image
+from FractFlow.infra.vlm_client import get_vlm_client
+from flight_sim import FlightSimulator
+
+# safety_check is a sibling tool directory, not a package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'safety_check'))
+from safety_verdict import LEVEL_UNKNOWN, parse_safety_verdict, region_hash, verdict_cache
 
 # Load environment variables
 load_dotenv()
@@ -17,30 +25,144 @@ load_dotenv()
 mcp = FastMCP("flightbrain")
 
 class AircraftState:
-    """Represents the current state of the aircraft"""
-    def __init__(self):
-        self.position = {"x": 0.0, "y": 0.0, "z": 100.0}  # meters
-        self.velocity = {"x": 0.0, "y": 0.0, "z": 0.0}    # m/s
-        self.attitude = {"pitch": 0.0, "roll": 0.0, "yaw": 0.0}  # degrees
-        self.status = "hovering"
-        self.altitude = 100.0  # meters
+    """Represents the current state of one aircraft in the flight simulator"""
+    def __init__(self, simulator: FlightSimulator, index: int = 0):
+        self.simulator = simulator
+        self.index = index
+        self.last_update = datetime.now()
+
+    @property
+    def altitude(self) -> float:
+        return float(self.simulator.position[self.index, 2])
+
+    @property
+    def status(self) -> str:
+        return self.simulator.status[self.index]
+
+    @property
+    def safety_status(self) -> str:
+        return self.simulator.safety_status[self.index]
+
+    @safety_status.setter
+    def safety_status(self, value: str):
+        self.simulator.safety_status[self.index] = value
+
+    def move(self, forward: float = 0.0, right: float = 0.0, up: float = 0.0, status: str = None):
+        """Move in the body frame (forward/right follow the current yaw) and fly until arrival"""
+        self.simulator.command_move(self.index, forward=forward, right=right, up=up, status=status)
+        self._complete()
+
+    def rotate(self, angle: float, status: str):
+        """Yaw by angle degrees (positive is clockwise) while holding position"""
+        self.simulator.command_rotate(self.index, angle, status=status)
+        self._complete()
+
+    def hover(self, duration: float = 0.0):
+        """Hold the current position, optionally for duration seconds of simulated time"""
+        self.simulator.command_hover(self.index)
+        if duration > 0:
+            self.simulator.advance(duration)
         self.last_update = datetime.now()
-        self.safety_status = "unknown"  # Can be: unknown, safe, caution, unsafe
+
+    def land(self):
+        """Descend vertically to the ground"""
+        self.simulator.command_land(self.index)
+        self._complete()
+
+    def copy(self) -> "AircraftState":
+        """Independent copy of this aircraft and its simulator, e.g. to validate a plan"""
+        clone = AircraftState(copy.deepcopy(self.simulator), self.index)
+        clone.last_update = self.last_update
+        return clone
+
+    def _complete(self):
+        self.simulator.run_until_idle()
+        self.last_update = datetime.now()
+        if not self.simulator.is_idle()[self.index]:
+            remaining = self.simulator.target[self.index] - self.simulator.position[self.index]
+            raise RuntimeError(f"Manoeuvre did not complete, {float(np.linalg.norm(remaining)):.2f} m from target")
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert state to dictionary"""
+        state = self.simulator.state_dict(self.index)
+        state["last_update"] = self.last_update.isoformat()
+        return state
+
+# Global flight simulator; the MCP tools control aircraft 0
+simulator = FlightSimulator(num_aircraft=1)
+aircraft = AircraftState(simulator, 0)
+
+# ===== Tool responses =====
+# Responses are fed back into the LLM context on every iteration, so by default
+# they are compact: no indentation, fixed precision and only the state fields
+# that changed since the last report. FLIGHTBRAIN_RESPONSE_MODE=full restores
+# the complete pretty-printed state.
+RESPONSE_MODE = os.getenv("FLIGHTBRAIN_RESPONSE_MODE", "compact")
+STATE_PRECISION = int(os.getenv("FLIGHTBRAIN_STATE_PRECISION", "2"))
+
+STATE_SCHEMA = """    Compact state schema ("state" field, meters / m/s / degrees / seconds):
+        x, y, z: position (x forward/north, y right/east, z altitude)
+        vx, vy, vz: velocity
+        pitch, roll, yaw: attitude, yaw clockwise in [0, 360)
+        status: flight status, t: simulation time
+        safety: safety status (unknown / safe / caution / unsafe)
+    Flight tools return only the fields that changed since the previous report.
+"""
+
+class StateReporter:
+    """Tracks the last reported state so responses can carry only the diff"""
+    def __init__(self, precision: int = STATE_PRECISION):
+        self.precision = precision
+        self.last_reported = None
+
+    def _round(self, value: float) -> float:
+        # "+ 0.0" turns -0.0 (tiny negative values after rounding) into 0.0
+        return round(value, self.precision) + 0.0
+
+    def flatten(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten aircraft.to_dict() into the compact schema"""
+        r = self._round
         return {
-            "position": self.position,
-            "velocity": self.velocity,
-            "attitude": self.attitude,
-            "status": self.status,
-            "altitude": self.altitude,
-            "last_update": self.last_update.isoformat(),
-            "safety_status": self.safety_status
+            "x": r(state["position"]["x"]),
+            "y": r(state["position"]["y"]),
+            "z": r(state["position"]["z"]),
+            "vx": r(state["velocity"]["x"]),
+            "vy": r(state["velocity"]["y"]),
+            "vz": r(state["velocity"]["z"]),
+            "pitch": r(state["attitude"]["pitch"]),
+            "roll": r(state["attitude"]["roll"]),
+            "yaw": r(state["attitude"]["yaw"]),
+            "status": state["status"],
+            "safety": state["safety_status"],
+            "t": r(state["sim_time"]),
         }
 
-# Global aircraft state
-aircraft = AircraftState()
+    def report(self, state: Dict[str, Any], full: bool = False) -> Dict[str, Any]:
+        """Return the full compact state or only the fields changed since the last report"""
+        current = self.flatten(state)
+        if full or self.last_reported is None:
+            diff = current
+        else:
+            diff = {k: v for k, v in current.items() if self.last_reported.get(k) != v}
+        self.last_reported = current
+        return diff
+
+state_reporter = StateReporter()
+
+def state_response(status: str, message: str = None, full_state: bool = False, extra: Dict[str, Any] = None) -> str:
+    """Serialize a tool result together with the aircraft state"""
+    result = {"status": status}
+    if message is not None:
+        result["message"] = message
+    if extra:
+        result.update(extra)
+
+    if RESPONSE_MODE == "full":
+        result["aircraft_state"] = aircraft.to_dict()
+        return json.dumps(result, indent=2)
+
+    result["state"] = state_reporter.report(aircraft.to_dict(), full=full_state)
+    return json.dumps(result, separators=(",", ":"), ensure_ascii=False)
 
 def normalize_path(path: str) -> str:
     """Normalize a file path by expanding ~ to user's home directory and resolving relative paths."""
@@ -49,21 +171,6 @@ def normalize_path(path: str) -> str:
         expanded_path = os.path.abspath(expanded_path)
     return expanded_path
 
-def encode_image(image: Image.Image, size: tuple[int, int] = (512, 512)) -> str:
-    """Encode and resize image to base64 string."""
-    image.thumbnail(size)
-    buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-def load_image(image_path: str, size_limit: tuple[int, int] = (512, 512)) -> tuple[str, dict]:
-    """Load and prepare image for model input."""
-    meta_info = {}
-    image = Image.open(image_path)
-    meta_info['width'], meta_info['height'] = image.size
-    base64_image = encode_image(image, size_limit)
-    return base64_image, meta_info
-
 @mcp.tool()
 async def hover(duration: float = 0.0) -> str:
     """
@@ -73,123 +180,93 @@ async def hover(duration: float = 0.0) -> str:
         duration (float): Duration to hover in seconds (optional)
     
     Returns:
-        str: JSON string containing hover command status and aircraft state
+        str: JSON string containing hover command status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.status = "hovering"
-    aircraft.velocity = {"x": 0.0, "y": 0.0, "z": 0.0}
-    aircraft.last_update = datetime.now()
+    aircraft.hover(duration)
     
     print("The aircraft is hovering")
     if duration > 0:
         print(f"Hovering for {duration} seconds")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft hovering{f' for {duration} seconds' if duration > 0 else ''}",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft hovering{f' for {duration} seconds' if duration > 0 else ''}")
 
 @mcp.tool()
 async def move_forward(distance: float = 1.0) -> str:
     """
-    Move the aircraft forward.
+    Move the aircraft forward along its current heading (yaw).
     
     Args:
         distance (float): Distance to move forward in meters
     
     Returns:
-        str: JSON string containing forward movement status and aircraft state
+        str: JSON string containing forward movement status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.position["x"] += distance
-    aircraft.status = "moving_forward"
-    aircraft.last_update = datetime.now()
+    aircraft.move(forward=distance, status="moving_forward")
     
     print(f"The aircraft is moving forward {distance} meters")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft moving forward {distance} meters",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft moving forward {distance} meters")
 
 @mcp.tool()
 async def move_backward(distance: float = 1.0) -> str:
     """
-    Move the aircraft backward.
+    Move the aircraft backward, opposite to its current heading (yaw).
     
     Args:
         distance (float): Distance to move backward in meters
     
     Returns:
-        str: JSON string containing backward movement status and aircraft state
+        str: JSON string containing backward movement status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.position["x"] -= distance
-    aircraft.status = "moving_backward"
-    aircraft.last_update = datetime.now()
+    aircraft.move(forward=-distance, status="moving_backward")
     
     print(f"The aircraft is moving backward {distance} meters")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft moving backward {distance} meters",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft moving backward {distance} meters")
 
 @mcp.tool()
 async def move_left(distance: float = 1.0) -> str:
     """
-    Move the aircraft left.
+    Move the aircraft left, relative to its current heading (yaw).
     
     Args:
         distance (float): Distance to move left in meters
     
     Returns:
-        str: JSON string containing left movement status and aircraft state
+        str: JSON string containing left movement status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.position["y"] -= distance
-    aircraft.status = "moving_left"
-    aircraft.last_update = datetime.now()
+    aircraft.move(right=-distance, status="moving_left")
     
     print(f"The aircraft is moving left {distance} meters")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft moving left {distance} meters",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft moving left {distance} meters")
 
 @mcp.tool()
 async def move_right(distance: float = 1.0) -> str:
     """
-    Move the aircraft right.
+    Move the aircraft right, relative to its current heading (yaw).
     
     Args:
         distance (float): Distance to move right in meters
     
     Returns:
-        str: JSON string containing right movement status and aircraft state
+        str: JSON string containing right movement status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.position["y"] += distance
-    aircraft.status = "moving_right"
-    aircraft.last_update = datetime.now()
+    aircraft.move(right=distance, status="moving_right")
     
     print(f"The aircraft is moving right {distance} meters")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft moving right {distance} meters",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft moving right {distance} meters")
 
 @mcp.tool()
 async def ascend(distance: float = 1.0) -> str:
@@ -200,22 +277,15 @@ async def ascend(distance: float = 1.0) -> str:
         distance (float): Distance to ascend in meters
     
     Returns:
-        str: JSON string containing ascend status and aircraft state
+        str: JSON string containing ascend status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.altitude += distance
-    aircraft.position["z"] += distance
-    aircraft.status = "ascending"
-    aircraft.last_update = datetime.now()
+    aircraft.move(up=distance, status="ascending")
     
     print(f"The aircraft is ascending {distance} meters")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft ascending {distance} meters",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft ascending {distance} meters")
 
 @mcp.tool()
 async def descend(distance: float = 1.0) -> str:
@@ -226,30 +296,19 @@ async def descend(distance: float = 1.0) -> str:
         distance (float): Distance to descend in meters
     
     Returns:
-        str: JSON string containing descend status and aircraft state
+        str: JSON string containing descend status and the changed aircraft state fields
     """
     global aircraft
     
     if aircraft.altitude - distance >= 0:
-        aircraft.altitude -= distance
-        aircraft.position["z"] -= distance
-        aircraft.status = "descending"
-        aircraft.last_update = datetime.now()
+        aircraft.move(up=-distance, status="descending")
         
         print(f"The aircraft is descending {distance} meters")
         
-        return json.dumps({
-            "status": "success",
-            "message": f"Aircraft descending {distance} meters",
-            "aircraft_state": aircraft.to_dict()
-        }, indent=2)
+        return state_response("success", f"Aircraft descending {distance} meters")
     else:
         print("Cannot descend below ground level")
-        return json.dumps({
-            "status": "error",
-            "message": "Cannot descend below ground level",
-            "aircraft_state": aircraft.to_dict()
-        }, indent=2)
+        return state_response("error", "Cannot descend below ground level")
 
 @mcp.tool()
 async def rotate(angle: float = 0.0) -> str:
@@ -260,21 +319,15 @@ async def rotate(angle: float = 0.0) -> str:
         angle (float): Angle to rotate in degrees
     
     Returns:
-        str: JSON string containing rotation status and aircraft state
+        str: JSON string containing rotation status and the changed aircraft state fields
     """
     global aircraft
     
-    aircraft.attitude["yaw"] = (aircraft.attitude["yaw"] + angle) % 360
-    aircraft.status = "rotating"
-    aircraft.last_update = datetime.now()
+    aircraft.rotate(angle, status="rotating")
     
     print(f"The aircraft is rotating {angle} degrees")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft rotating {angle} degrees",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft rotating {angle} degrees")
 
 @mcp.tool()
 async def hover_turn(angle: float = 0.0) -> str:
@@ -285,26 +338,18 @@ async def hover_turn(angle: float = 0.0) -> str:
         angle (float): Angle to turn in degrees (positive for clockwise, negative for counter-clockwise)
     
     Returns:
-        str: JSON string containing hover turn status and aircraft state
+        str: JSON string containing hover turn status and the changed aircraft state fields
     """
     global aircraft
     
-    # Ensure aircraft is hovering
-    aircraft.status = "hover_turning"
-    aircraft.velocity = {"x": 0.0, "y": 0.0, "z": 0.0}  # Maintain position
-    
-    # Apply rotation
-    aircraft.attitude["yaw"] = (aircraft.attitude["yaw"] + angle) % 360
-    aircraft.last_update = datetime.now()
+    # Hold position and apply rotation
+    aircraft.hover()
+    aircraft.rotate(angle, status="hover_turning")
     
     direction = "clockwise" if angle >= 0 else "counter-clockwise"
     print(f"The aircraft is performing a hover turn {abs(angle)} degrees {direction}")
     
-    return json.dumps({
-        "status": "success",
-        "message": f"Aircraft performing hover turn {abs(angle)} degrees {direction}",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    return state_response("success", f"Aircraft performing hover turn {abs(angle)} degrees {direction}")
 
 @mcp.tool()
 async def land() -> str:
@@ -312,92 +357,213 @@ async def land() -> str:
     Begin landing sequence.
     
     Returns:
-        str: JSON string containing landing status and aircraft state
+        str: JSON string containing landing status and the changed aircraft state fields
     """
     global aircraft
     
     if aircraft.altitude > 0:
-        aircraft.altitude = 0
-        aircraft.position["z"] = 0
-        aircraft.status = "landed"
-        aircraft.last_update = datetime.now()
+        aircraft.land()
         
         print("The aircraft has landed")
         
-        return json.dumps({
-            "status": "success",
-            "message": "Aircraft has landed",
-            "aircraft_state": aircraft.to_dict()
-        }, indent=2)
+        return state_response("success", "Aircraft has landed")
     else:
         print("The aircraft is already on the ground")
-        return json.dumps({
-            "status": "info",
-            "message": "Aircraft is already on the ground",
-            "aircraft_state": aircraft.to_dict()
-        }, indent=2)
+        return state_response("info", "Aircraft is already on the ground")
 
-@mcp.tool()
-async def get_aircraft_state() -> str:
+# Primitive commands accepted by execute_plan: command -> (parameter name, default value)
+PLAN_COMMANDS = {
+    "hover": ("duration", 0.0),
+    "move_forward": ("distance", 1.0),
+    "move_backward": ("distance", 1.0),
+    "move_left": ("distance", 1.0),
+    "move_right": ("distance", 1.0),
+    "ascend": ("distance", 1.0),
+    "descend": ("distance", 1.0),
+    "rotate": ("angle", 0.0),
+    "hover_turn": ("angle", 0.0),
+    "land": (None, None),
+}
+
+# Largest accepted magnitude of each plan parameter (seconds / meters / degrees)
+PLAN_LIMITS = {
+    "duration": 600.0,
+    "distance": 5000.0,
+    "angle": 360.0,
+}
+
+# Body-frame unit displacement and wording for the translation commands
+PLAN_MOVES = {
+    "move_forward": ({"forward": 1.0}, "moving forward"),
+    "move_backward": ({"forward": -1.0}, "moving backward"),
+    "move_left": ({"right": -1.0}, "moving left"),
+    "move_right": ({"right": 1.0}, "moving right"),
+    "ascend": ({"up": 1.0}, "ascending"),
+    "descend": ({"up": -1.0}, "descending"),
+}
+
+def apply_plan_step(state: AircraftState, step: Dict[str, Any]) -> str:
     """
-    Get the current state of the aircraft.
+    Apply one plan step to the given aircraft state.
     
     Returns:
-        str: JSON string containing current aircraft state
+        str: The same message the corresponding single-command tool would return
+    
+    Raises:
+        ValueError: If the command is unknown, its parameter is invalid or out of range, or it is unsafe
+        RuntimeError: If the manoeuvre does not complete in the simulator
     """
-    return json.dumps({
-        "status": "success",
-        "aircraft_state": aircraft.to_dict()
-    }, indent=2)
+    command = step.get("command")
+    if command not in PLAN_COMMANDS:
+        raise ValueError(f"Unknown command '{command}', expected one of: {', '.join(PLAN_COMMANDS)}")
+
+    param, default = PLAN_COMMANDS[command]
+    value = None
+    if param is not None:
+        try:
+            value = float(step.get(param, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"Parameter '{param}' of {command} must be a number")
+        # The simulator steps through the whole manoeuvre, so unbounded values would never finish
+        if not math.isfinite(value) or abs(value) > PLAN_LIMITS[param]:
+            raise ValueError(f"Parameter '{param}' of {command} must be within ±{PLAN_LIMITS[param]:g}")
+        if param == "duration" and value < 0:
+            raise ValueError(f"Parameter '{param}' of {command} must not be negative")
+
+    if command == "hover":
+        state.hover(value)
+        return f"Aircraft hovering{f' for {value} seconds' if value > 0 else ''}"
+
+    if command in PLAN_MOVES:
+        if command == "descend" and state.altitude - value < 0:
+            raise ValueError("Cannot descend below ground level")
+        direction, wording = PLAN_MOVES[command]
+        state.move(**{axis: sign * value for axis, sign in direction.items()}, status=wording.replace(" ", "_"))
+        return f"Aircraft {wording} {value} meters"
+
+    if command == "rotate":
+        state.rotate(value, status="rotating")
+        return f"Aircraft rotating {value} degrees"
+
+    if command == "hover_turn":
+        state.hover()
+        state.rotate(value, status="hover_turning")
+        direction = "clockwise" if value >= 0 else "counter-clockwise"
+        return f"Aircraft performing hover turn {abs(value)} degrees {direction}"
+
+    # land
+    if state.altitude <= 0:
+        return "Aircraft is already on the ground"
+    state.land()
+    return "Aircraft has landed"
 
 @mcp.tool()
-async def analyze_flight_situation(image_path: str) -> str:
+async def execute_plan(steps: List[Dict[str, Any]]) -> str:
     """
-    Analyze the flight situation using visual input.
+    Execute an ordered manoeuvre plan of primitive flight commands in one call.
+    
+    The whole plan is first simulated on a copy of the aircraft. If any step is
+    invalid (unknown command, bad or out-of-range parameter, descending below ground
+    level, a manoeuvre that does not complete) nothing is applied and the failing
+    step is reported. Otherwise all steps are applied.
     
     Args:
-        image_path (str): Path to the image showing aircraft and landing area
-        
+        steps (list): Ordered steps, each a dict with "command" and its parameter:
+            - hover: duration (seconds, 0 to 600)
+            - move_forward / move_backward / move_left / move_right: distance (meters, at most 5000)
+            - ascend / descend: distance (meters, at most 5000)
+            - rotate / hover_turn: angle (degrees, positive is clockwise, at most 360)
+            - land: no parameter
+            Example: [{"command": "descend", "distance": 20}, {"command": "move_left", "distance": 3},
+                      {"command": "hover_turn", "angle": 90}, {"command": "land"}]
+    
     Returns:
-        str: Detailed analysis of the flight situation
+        str: JSON string with the overall status, a per-step summary (message and changed
+             state fields) and the changed aircraft state fields after the plan
     """
-    image_path = normalize_path(image_path)
-    base64_image, meta_info = load_image(image_path, (512, 512))
+    global aircraft, simulator
+
+    trial = aircraft.copy()
+    step_reporter = StateReporter()
+    step_reporter.report(trial.to_dict())
+    summary = []
+    for i, step in enumerate(steps):
+        try:
+            if not isinstance(step, dict):
+                raise ValueError("Each step must be an object with a 'command' field")
+            message = apply_plan_step(trial, step)
+        except (ValueError, RuntimeError) as e:
+            print(f"Plan rejected at step {i}: {e}")
+            return state_response("error", f"Plan rejected at step {i}: {e}. No step was executed.",
+                                  extra={"failed_step": i})
+        summary.append({"step": i, "message": message, "state": step_reporter.report(trial.to_dict())})
 
-    client = OpenAI(
-        api_key=os.getenv('QWEN_API_KEY'),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
+    # Plan is valid: commit the simulated result
+    aircraft.simulator = simulator = trial.simulator
+    aircraft.last_update = trial.last_update
+    for item in summary:
+        print(f"Plan step {item['step']}: {item['message']}")
+
+    return state_response("success", f"Plan of {len(summary)} steps executed", extra={"steps": summary})
+
+@mcp.tool(description=f"""
+    Get the current state of the aircraft.
     
-    prompt = """请分析图中飞行器与降落区域的相对位置关系，并详细描述：
+    Always returns the complete state and resets the baseline used by the
+    other flight tools, which only report fields that changed since.
+    
+{STATE_SCHEMA}
+    Returns:
+        str: JSON string containing current aircraft state
+    """)
+async def get_aircraft_state() -> str:
+    return state_response("success", full_state=True)
+
+ANALYSIS_PROMPT = """请分析图中飞行器与降落区域的相对位置关系，并详细描述：
 1. 飞行器与停机坪的相对距离（近、中、远）和方位（正上方、前方、侧方等）
 2. 下降路径上是否存在障碍物（建筑物、树木、电线等）
 3. 停机坪周围的环境状况（障碍物分布、空间开阔程度）
 4. 飞行器当前的离地高度（过高、适中、过低）
 5. 建议的下一步操作（继续下降、调整位置、保持悬停等）
 
-请以结构化的方式输出分析结果。"""
+请以结构化的方式输出分析结果，并在最后单独一行给出结论：
+评估结果: 适合降落 / 谨慎降落 / 不适合降落（三选一）"""
 
-    completion = client.chat.completions.create(
-        model="qwen-vl-max",
-        messages=[{"role": "user", "content": [
-            {"type": "text", "text": prompt},
-            {"type": "image_url", "image_url": {"url": f'data:image/png;base64,{base64_image}'}}
-        ]}]
-    )
-    
-    # Update aircraft safety status based on analysis
-    response = completion.choices[0].message.content
-    
-    # Simple heuristic to update safety status based on keywords in the response
-    if any(word in response.lower() for word in ["危险", "障碍", "unsafe", "danger"]):
-        aircraft.safety_status = "unsafe"
-    elif any(word in response.lower() for word in ["注意", "caution", "warning"]):
-        aircraft.safety_status = "caution"
-    else:
-        aircraft.safety_status = "safe"
+@mcp.tool()
+async def analyze_flight_situation(image_path: str) -> str:
+    """
+    Analyze the flight situation using visual input.
     
-    return response
+    Args:
+        image_path (str): Path to the image showing aircraft and landing area
+        
+    Returns:
+        str: Detailed analysis of the flight situation
+    """
+    image_path = normalize_path(image_path)
+
+    # Consecutive frames while hovering reuse the recent analysis instead of re-querying the VLM.
+    # The key is the marked landing region; frames without a marking are never cached.
+    prompt_key = verdict_cache.prompt_key(ANALYSIS_PROMPT)
+    image_hash = await asyncio.to_thread(region_hash, image_path)
+    verdict = verdict_cache.get(image_hash, prompt_key) if image_hash is not None else None
+    if verdict is None:
+        image = await asyncio.to_thread(prepare_image, image_path, (512, 512))
+        response = await get_vlm_client().chat(
+            model="qwen-vl-max",
+            messages=[{"role": "user", "content": [
+                {"type": "text", "text": ANALYSIS_PROMPT},
+                {"type": "image_url", "image_url": {"url": image.data_url}}
+            ]}]
+        )
+        verdict = parse_safety_verdict(response)
+        # Only a conclusion read from the 评估结果 line is reused; keyword guesses are not
+        if image_hash is not None and verdict.structured:
+            verdict_cache.put(image_hash, prompt_key, verdict)
+
+    # Update aircraft safety status from the structured verdict, never from a keyword guess
+    aircraft.safety_status = verdict.level if verdict.structured else LEVEL_UNKNOWN
+    return verdict.report
 
 @mcp.tool()
 async def read_latest_safety_result() -> str:
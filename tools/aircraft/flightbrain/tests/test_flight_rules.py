@@ -0,0 +1,47 @@
+"""
+Flight Rules Tests
+
+Checks that decide_flight_action only acts on the level of a structured
+safety verdict, and holds position for verdicts guessed from keywords.
+
+License: MIT License
+"""
+
+import os
+import sys
+
+# Add the flightbrain and safety_check directories to the Python path
+FLIGHTBRAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLIGHTBRAIN_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(FLIGHTBRAIN_DIR), "safety_check"))
+
+from flight_rules import decide_flight_action
+from safety_verdict import parse_safety_verdict
+
+
+def test_unstructured_unsuitable_report_does_not_land():
+    verdict = parse_safety_verdict('该区域地面有碎石，不太适合降落。')
+    assert not verdict.structured
+    command, _ = decide_flight_action(verdict)
+    assert command == "hover"
+
+
+def test_unstructured_verdict_hovers_whatever_its_guessed_level():
+    verdict = parse_safety_verdict('Looks safe to land.')
+    assert verdict.level == "safe" and not verdict.structured
+    assert decide_flight_action(verdict) == ("hover", {"duration": 5.0})
+
+
+def test_structured_verdicts_use_level_actions():
+    safe = parse_safety_verdict('**评估结果**：适合降落\n**风险等级**：低')
+    caution = parse_safety_verdict('**评估结果**：谨慎降落\n**风险等级**：中')
+    unsafe = parse_safety_verdict('**评估结果**：不适合降落\n**风险等级**：高')
+    assert decide_flight_action(safe) == ("land", {})
+    assert decide_flight_action(caution) == ("descend", {"distance": 2.0})
+    assert decide_flight_action(unsafe) == ("hover", {"duration": 5.0})
+
+
+def test_text_reports_check_negative_verdicts_first():
+    assert decide_flight_action('该区域地面有碎石，不太适合降落。')[0] == "hover"
+    assert decide_flight_action('该区域不适合降落')[0] == "hover"
+    assert decide_flight_action('该区域适合降落')[0] == "land"
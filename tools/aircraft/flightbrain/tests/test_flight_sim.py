@@ -0,0 +1,148 @@
+"""
+Flight Simulator Tests
+
+Checks the body-frame convention of FlightSimulator (x north, y east, yaw
+clockwise), that run_until_idle is sized from time_to_idle so long
+manoeuvres complete, and that AircraftState reports a manoeuvre that does
+not complete instead of silently stopping short.
+
+License: MIT License
+"""
+
+import json
+import os
+import sys
+import asyncio
+
+import numpy as np
+import pytest
+
+# Add the flightbrain directory and the repository root to the Python path
+FLIGHTBRAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLIGHTBRAIN_DIR)
+sys.path.insert(0, os.path.abspath(os.path.join(FLIGHTBRAIN_DIR, "..", "..", "..")))
+
+from flight_sim import FlightSimulator
+
+
+def fly(simulator, **move):
+    simulator.command_move(0, **move)
+    simulator.run_until_idle()
+    return simulator.position[0]
+
+
+def test_forward_at_yaw_zero_is_north():
+    simulator = FlightSimulator()
+    assert np.allclose(fly(simulator, forward=10.0), [10.0, 0.0, 100.0])
+
+
+def test_right_at_yaw_zero_is_east():
+    simulator = FlightSimulator()
+    assert np.allclose(fly(simulator, right=10.0), [0.0, 10.0, 100.0])
+
+
+def test_positive_yaw_turns_clockwise():
+    simulator = FlightSimulator()
+    simulator.command_rotate(0, 90.0)
+    simulator.run_until_idle()
+    assert simulator.yaw[0] == pytest.approx(90.0)
+    # Facing east after a clockwise quarter turn, so forward is +y and right is -x (south)
+    assert np.allclose(fly(simulator, forward=10.0), [0.0, 10.0, 100.0])
+    assert np.allclose(fly(simulator, right=10.0), [-10.0, 10.0, 100.0])
+
+
+def test_counter_clockwise_yaw_wraps_to_positive_degrees():
+    simulator = FlightSimulator()
+    simulator.command_rotate(0, -90.0)
+    simulator.run_until_idle()
+    assert simulator.yaw[0] == pytest.approx(270.0)
+    assert np.allclose(fly(simulator, forward=10.0), [0.0, -10.0, 100.0])
+
+
+def test_move_queued_during_rotation_uses_final_heading():
+    simulator = FlightSimulator()
+    simulator.command_rotate(0, 90.0)
+    simulator.command_move(0, forward=10.0)
+    simulator.run_until_idle()
+    assert np.allclose(simulator.position[0], [0.0, 10.0, 100.0])
+
+
+def test_time_to_idle_uses_the_slowest_axis():
+    simulator = FlightSimulator(max_speed=5.0, max_climb_rate=2.0, max_yaw_rate=45.0)
+    simulator.command_move(0, forward=30.0, up=-10.0)
+    simulator.command_rotate(0, 90.0)
+    # 30 m at 5 m/s = 6 s, 10 m at 2 m/s = 5 s, 90 degrees at 45 deg/s = 2 s
+    assert simulator.time_to_idle()[0] == pytest.approx(6.0)
+
+
+def test_run_until_idle_completes_long_moves():
+    simulator = FlightSimulator(num_aircraft=2)
+    simulator.command_move(0, forward=4000.0)
+    simulator.command_move(1, up=-100.0)
+    expected = simulator.time_to_idle().max()
+
+    elapsed = simulator.run_until_idle()
+
+    assert simulator.is_idle().all()
+    assert np.allclose(simulator.position, [[4000.0, 0.0, 100.0], [0.0, 0.0, 0.0]])
+    # Simulated time accumulates dt, so allow one step of rounding either way
+    assert expected - simulator.dt <= elapsed <= expected + 2 * simulator.dt
+    assert np.all(simulator.velocity == 0.0)
+
+
+def test_run_until_idle_respects_explicit_max_time():
+    simulator = FlightSimulator()
+    simulator.command_move(0, forward=100.0)
+    elapsed = simulator.run_until_idle(max_time=1.0)
+    assert elapsed == pytest.approx(1.0)
+    assert not simulator.is_idle()[0]
+    assert simulator.position[0, 0] == pytest.approx(5.0)
+
+
+@pytest.fixture
+def flightbrain_mcp():
+    pytest.importorskip("mcp")
+    pytest.importorskip("dotenv")
+    import flightbrain_mcp
+    return flightbrain_mcp
+
+
+def cut_short(simulator, max_time=1.0):
+    """Make run_until_idle stop after max_time, as a stalled simulation would."""
+    run_until_idle = simulator.run_until_idle
+    simulator.run_until_idle = lambda *args, **kwargs: run_until_idle(max_time)
+
+
+def test_incomplete_move_raises(flightbrain_mcp):
+    state = flightbrain_mcp.AircraftState(FlightSimulator())
+    cut_short(state.simulator)
+    with pytest.raises(RuntimeError, match="did not complete"):
+        state.move(forward=100.0)
+
+
+def test_complete_move_does_not_raise(flightbrain_mcp):
+    state = flightbrain_mcp.AircraftState(FlightSimulator())
+    state.move(forward=2000.0, status="moving_forward")
+    assert np.allclose(state.simulator.position[0], [2000.0, 0.0, 100.0])
+
+
+def test_execute_plan_rejects_incomplete_step(flightbrain_mcp, monkeypatch):
+    simulator = FlightSimulator()
+    monkeypatch.setattr(flightbrain_mcp, "simulator", simulator)
+    monkeypatch.setattr(flightbrain_mcp, "aircraft", flightbrain_mcp.AircraftState(simulator))
+    original_copy = flightbrain_mcp.AircraftState.copy
+
+    def stalled_copy(self):
+        clone = original_copy(self)
+        cut_short(clone.simulator)
+        return clone
+
+    monkeypatch.setattr(flightbrain_mcp.AircraftState, "copy", stalled_copy)
+    response = json.loads(asyncio.run(flightbrain_mcp.execute_plan(
+        [{"command": "hover", "duration": 1}, {"command": "move_forward", "distance": 100}])))
+
+    assert response["status"] == "error"
+    assert response["failed_step"] == 1
+    assert "did not complete" in response["message"]
+    # Nothing was applied to the real aircraft
+    assert np.allclose(simulator.position[0], [0.0, 0.0, 100.0])
@@ -0,0 +1,176 @@
+# python landing_pipeline.py --image ./sam/tmp/camera/frame.png --x 512 --y 384 --audit-dir ./tmp/audit
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 三个子模块目录不是package，按照各agent的做法加入Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '../..'))
+sys.path.append(project_root)
+for sub_dir in ("sam", "safety_check", "flightbrain"):
+    sys.path.append(os.path.join(current_dir, sub_dir))
+
+from sam_utils import SAMClient
+from mask_annotation import annotate_mask, ArtifactWriter
+from safety_vlm import assess_landing_safety
+from safety_verdict import crop_around_box
+from landing_guidelines import LANDING_GUIDELINES
+from flight_rules import decide_flight_action
+
+# 一条调用完成 分割 -> 标注 -> 安全评估 -> 飞行决策。
+# 图像在各步骤之间以内存数组传递，结果为结构化对象；只有指定audit_dir时才写磁盘。
+
+DEFAULT_SAM_SERVER_URL = os.getenv("SAM_SERVER_URL", "http://10.30.58.120:5000")
+
+
+class LandingPipelineResult:
+    """一次分割+安全评估+飞行决策的结构化结果"""
+
+    def __init__(self, click, artifacts, verdict, command, params, timings):
+        self.click = click                  # (x, y)
+        self.artifacts = artifacts          # MaskArtifacts（内存中的图像和bbox/质心）
+        self.verdict = verdict              # SafetyVerdict（结构化的安全评估）
+        self.command = command              # 飞行指令，如 "land"
+        self.params = params                # 指令参数，如 {"distance": 2.0}
+        self.timings = timings              # 各步骤耗时（秒）
+
+    def to_dict(self):
+        """可JSON序列化的摘要（不含图像）"""
+        return {
+            "click": list(self.click),
+            "bbox": list(self.artifacts.bbox) if self.artifacts.bbox else None,
+            "centroid": list(self.artifacts.centroid) if self.artifacts.centroid else None,
+            "mask_area": self.artifacts.area,
+            "safety_report": self.verdict.report,
+            "verdict": {
+                "level": self.verdict.level,
+                "risk": self.verdict.risk,
+                "reasons": self.verdict.reasons,
+                "cached": self.verdict.cached,
+            },
+            "decision": {"command": self.command, "params": self.params},
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+        }
+
+
+class LandingPipeline:
+    """从一帧图像和一次点击直接得到降落安全评估和飞行决策"""
+
+    def __init__(self, sam_server_url=DEFAULT_SAM_SERVER_URL, audit_dir=None, use_crop=False,
+                 system_prompt=LANDING_GUIDELINES):
+        """
+        Args:
+            sam_server_url: SAM服务器地址
+            audit_dir: 审计目录，指定时在后台保存标注图像和结果JSON
+            use_crop: 安全评估使用以mask为中心裁剪的图像（否则使用整幅边缘图）
+            system_prompt: 安全评估的系统提示词，默认与Safety_Agent一致
+        """
+        self.client = SAMClient(server_url=sam_server_url)
+        self.audit_dir = audit_dir
+        self.use_crop = use_crop
+        self.system_prompt = system_prompt
+        self.writer = ArtifactWriter(audit_dir) if audit_dir else None
+
+    @staticmethod
+    def decode_frame(frame):
+        """
+        统一输入格式
+
+        Args:
+            frame: RGB图像数组，或已编码的图像字节（PNG/JPEG）
+
+        Returns:
+            (RGB数组, base64编码的图像)；字节输入直接转发给SAM，不重新编码
+        """
+        if isinstance(frame, (bytes, bytearray)):
+            image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("无法解码输入图像")
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), base64.b64encode(frame).decode('utf-8')
+        image = np.asarray(frame)
+        if image.ndim != 3 or image.shape[2] not in (3, 4):
+            raise ValueError(f"需要RGB图像数组，得到的形状为 {image.shape}")
+        return image[:, :, :3], None
+
+    def run(self, frame, click):
+        """
+        Args:
+            frame: RGB图像数组或已编码的图像字节
+            click: 点击坐标 (x, y)
+
+        Returns:
+            LandingPipelineResult
+        """
+        timings = {}
+        x, y = int(click[0]), int(click[1])
+
+        start = time.perf_counter()
+        image, image_base64 = self.decode_frame(frame)
+        if image_base64 is None:
+            image_base64 = self.client.encode_array(image)
+        mask = self.client.segment_base64(image_base64, [[x, y]])
+        timings["segmentation"] = time.perf_counter() - start
+        if mask is None:
+            raise RuntimeError("SAM分割失败")
+
+        start = time.perf_counter()
+        artifacts = annotate_mask(image, mask)
+        timings["annotation"] = time.perf_counter() - start
+        if artifacts is None:
+            raise RuntimeError("mask尺寸与图像不匹配")
+
+        start = time.perf_counter()
+        marked = artifacts.cropped_image if self.use_crop and artifacts.cropped_image is not None else artifacts.boundary_image
+        # 以标记的降落区域（bbox四周）作为缓存键：悬停时相近的帧直接复用上一次的评估，
+        # 换一个降落点则key不同；没有bbox时由assess_landing_safety按红色标记裁剪
+        region = crop_around_box(artifacts.boundary_image, artifacts.bbox) if artifacts.bbox else None
+        verdict = assess_landing_safety(Image.fromarray(marked), self.system_prompt, region=region)
+        timings["safety_check"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        command, params = decide_flight_action(verdict)
+        timings["decision"] = time.perf_counter() - start
+
+        result = LandingPipelineResult((x, y), artifacts, verdict, command, params, timings)
+        if self.writer is not None:
+            self._audit(result)
+        return result
+
+    def _audit(self, result):
+        """后台保存标注图像，并写入结果JSON"""
+        self.writer.submit(result.artifacts)
+        os.makedirs(self.audit_dir, exist_ok=True)
+        with open(os.path.join(self.audit_dir, "latest_safety_result.json"), "w", encoding="utf-8") as f:
+            json.dump(result.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LandingPipeline - 分割、安全评估与飞行决策一体化")
+    parser.add_argument('--image', required=True, help='输入帧的路径')
+    parser.add_argument('--x', type=int, required=True, help='点击位置x')
+    parser.add_argument('--y', type=int, required=True, help='点击位置y')
+    parser.add_argument('--server-url', default=DEFAULT_SAM_SERVER_URL, help='SAM服务器地址')
+    parser.add_argument('--audit-dir', default=None, help='审计目录（可选）')
+    parser.add_argument('--crop', action='store_true', help='安全评估使用裁剪后的图像')
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        frame = f.read()
+
+    pipeline = LandingPipeline(args.server_url, audit_dir=args.audit_dir, use_crop=args.crop)
+    result = pipeline.run(frame, (args.x, args.y))
+    if pipeline.writer is not None:
+        pipeline.writer.join()
+    print(json.dumps(result.to_dict(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
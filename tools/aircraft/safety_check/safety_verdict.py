@@ -0,0 +1,326 @@
+"""
+Structured landing safety verdicts and a perceptual-hash verdict cache.
+
+The safety VLM answers in free text (see landing_guidelines.LANDING_GUIDELINES
+for the report layout). parse_safety_verdict() turns that text into a SafetyVerdict
+with a level, a risk grade and the listed reasons, so downstream code can
+branch on fields instead of matching keywords.
+
+A hovering aircraft sends nearly the same frame every cycle. VerdictCache keys
+verdicts by a difference hash (dHash) of the landing region, so a frame whose
+region is within a few bits of a recent one reuses that verdict instead of
+querying the VLM again. The region is a crop around the marked spot
+(region_hash), never the whole frame: marking a different spot on the same
+scene only moves a thin outline, which a full-frame hash would not notice.
+"""
+
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+LEVEL_SAFE = "safe"
+LEVEL_CAUTION = "caution"
+LEVEL_UNSAFE = "unsafe"
+LEVEL_UNKNOWN = "unknown"
+
+# 报告中的评估结果 -> level。"不适合降落"包含"适合降落"，所以必须先匹配
+_VERDICT_WORDS = [
+    ("不适合降落", LEVEL_UNSAFE),
+    ("谨慎降落", LEVEL_CAUTION),
+    ("适合降落", LEVEL_SAFE),
+]
+_RISK_WORDS = {"低": "low", "中": "medium", "高": "high"}
+_DEFAULT_RISK = {LEVEL_SAFE: "low", LEVEL_CAUTION: "medium", LEVEL_UNSAFE: "high", LEVEL_UNKNOWN: "unknown"}
+
+# 报告各部分的标题，用于截取"核心理由"一节
+_SECTION_TITLES = ["方框内容识别", "评估结果", "风险等级", "核心理由", "潜在风险与建议", "限制声明"]
+
+DEFAULT_MAX_DISTANCE = int(os.getenv("SAFETY_CACHE_MAX_DISTANCE", "6"))  # 64位hash中允许不同的位数
+DEFAULT_TTL = float(os.getenv("SAFETY_CACHE_TTL", "10"))  # 秒
+DEFAULT_CACHE_SIZE = int(os.getenv("SAFETY_CACHE_SIZE", "32"))
+REGION_MARGIN = 0.25  # 标记区域四周额外保留的比例
+
+# 标记降落点的红色边框/边缘（见sam/mask_annotation.py），按接近纯红判断
+_MARK_MIN_RED = 230
+_MARK_MAX_OTHER = 30
+
+
+class SafetyVerdict:
+    """Structured result of one landing safety assessment"""
+
+    def __init__(self, level: str, risk: str, reasons: List[str], report: str, cached: bool = False,
+                 structured: bool = False):
+        self.level = level      # safe / caution / unsafe / unknown
+        self.risk = risk        # low / medium / high / unknown
+        self.reasons = reasons  # 核心理由，每条一项
+        self.report = report    # VLM的原始报告文本
+        self.cached = cached    # 是否来自VerdictCache
+        self.structured = structured  # level是否来自报告的"评估结果"一节（否则是关键词推测的）
+
+    @property
+    def is_safe(self) -> bool:
+        return self.level == LEVEL_SAFE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "risk": self.risk,
+            "reasons": list(self.reasons),
+            "report": self.report,
+            "cached": self.cached,
+            "structured": self.structured,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SafetyVerdict":
+        return cls(
+            level=data.get("level", LEVEL_UNKNOWN),
+            risk=data.get("risk", "unknown"),
+            reasons=list(data.get("reasons", [])),
+            report=data.get("report", ""),
+            cached=data.get("cached", False),
+            structured=data.get("structured", False),
+        )
+
+
+def _strip_markup(text: str) -> str:
+    return text.replace("**", "").strip()
+
+
+def _section(report: str, title: str) -> Optional[str]:
+    """Text of one report section, from its title to the next known title"""
+    start = report.find(title)
+    if start < 0:
+        return None
+    start += len(title)
+    end = len(report)
+    for other in _SECTION_TITLES:
+        if other == title:
+            continue
+        position = report.find(other, start)
+        if position >= 0:
+            end = min(end, position)
+    return report[start:end]
+
+
+def _parse_reasons(section: Optional[str]) -> List[str]:
+    if not section:
+        return []
+    reasons = []
+    for line in section.splitlines():
+        line = _strip_markup(line).lstrip(":：").strip()
+        line = re.sub(r"^([-*•]|\d+[.、)])\s*", "", line).strip()
+        if line:
+            reasons.append(line)
+    return reasons
+
+
+def _infer_level(text: str) -> str:
+    """Level from free text when the report does not follow the output format"""
+    lower = text.lower()
+    if "不适合降落" in text or "not safe" in lower or "unsafe" in lower:
+        return LEVEL_UNSAFE
+    if "谨慎降落" in text or "caution" in lower:
+        return LEVEL_CAUTION
+    if "适合降落" in text or "safe to land" in lower:
+        return LEVEL_SAFE
+    return LEVEL_UNKNOWN
+
+
+def parse_safety_verdict(report: str) -> SafetyVerdict:
+    """
+    Parse a safety report into a SafetyVerdict.
+
+    Reads the "评估结果", "风险等级" and "核心理由" sections of the report format
+    required by LANDING_GUIDELINES, and falls back to keywords anywhere
+    in the text for reports that do not follow it. Such a keyword guess is
+    marked structured=False and must not be acted on without review: free text
+    like "不太适合降落" also contains "适合降落".
+
+    Args:
+        report: Safety analysis text returned by the VLM
+
+    Returns:
+        SafetyVerdict, with level "unknown" if no verdict could be found
+    """
+    level = None
+    result_section = _section(report, "评估结果")
+    if result_section is not None:
+        first_line = result_section.strip().splitlines()[0] if result_section.strip() else ""
+        for word, word_level in _VERDICT_WORDS:
+            if word in first_line:
+                level = word_level
+                break
+    structured = level is not None
+    if level is None:
+        level = _infer_level(report)
+
+    risk = None
+    # 等级必须紧跟在"风险等级"之后（中间只允许标点和markdown），避免匹配到"图中"之类的字
+    match = re.search(r"风险等级[\W_]*(?:为|是)?[\W_]*([低中高])", report)
+    if match:
+        risk = _RISK_WORDS[match.group(1)]
+    if risk is None:
+        risk = _DEFAULT_RISK[level]
+
+    reasons = _parse_reasons(_section(report, "核心理由"))
+    return SafetyVerdict(level, risk, reasons, report, structured=structured)
+
+
+def perceptual_hash(image, hash_size: int = 8) -> int:
+    """
+    Difference hash of an image: hash_size*hash_size bits, robust to small
+    shifts, noise and recompression, so consecutive frames of the same scene
+    differ in only a few bits.
+
+    Args:
+        image: PIL image, image array or image file path
+
+    Returns:
+        The hash as an integer
+    """
+    if isinstance(image, str):
+        with Image.open(image) as opened:
+            return perceptual_hash(opened, hash_size)
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image))
+    small = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def crop_around_box(image, box, margin: float = REGION_MARGIN) -> Image.Image:
+    """
+    Crop of an image around a box, enlarged by margin times the box size on each side.
+
+    Args:
+        image: PIL image or image array
+        box: (min_x, min_y, max_x, max_y) in pixels, inclusive
+
+    Returns:
+        The cropped PIL image
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.asarray(image))
+    min_x, min_y, max_x, max_y = (int(v) for v in box)
+    pad_x = int((max_x - min_x + 1) * margin)
+    pad_y = int((max_y - min_y + 1) * margin)
+    return image.crop((max(0, min_x - pad_x), max(0, min_y - pad_y),
+                       min(image.width, max_x + 1 + pad_x), min(image.height, max_y + 1 + pad_y)))
+
+
+def marked_box(image) -> Optional[tuple]:
+    """
+    Bounding box of the red marking (bbox outline or mask boundary) in an image.
+
+    Returns:
+        (min_x, min_y, max_x, max_y), or None if the image has no red marking
+    """
+    if isinstance(image, str):
+        with Image.open(image) as opened:
+            return marked_box(opened)
+    if isinstance(image, Image.Image):
+        image = image.convert("RGB")
+    pixels = np.asarray(image)
+    if pixels.ndim != 3 or pixels.shape[2] < 3:
+        return None
+    red = ((pixels[..., 0] >= _MARK_MIN_RED) & (pixels[..., 1] <= _MARK_MAX_OTHER)
+           & (pixels[..., 2] <= _MARK_MAX_OTHER))
+    rows = np.flatnonzero(red.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(red.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])
+
+
+def region_hash(image, region=None) -> Optional[int]:
+    """
+    Cache key hash of the landing region of a marked image.
+
+    Args:
+        image: Marked image (PIL image, array or file path)
+        region: Explicit landing region (image or array) to hash instead; when
+                omitted the region is a crop around the red marking
+
+    Returns:
+        The perceptual hash of the region, or None if no region can be found,
+        in which case the verdict must not be cached
+    """
+    if region is not None:
+        return perceptual_hash(region)
+    if isinstance(image, str):
+        with Image.open(image) as opened:
+            return region_hash(opened)
+    box = marked_box(image)
+    if box is None:
+        return None
+    return perceptual_hash(crop_around_box(image, box))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class VerdictCache:
+    """
+    Thread-safe cache of verdicts keyed by the perceptual hash of the landing region.
+
+    A lookup hits when an entry with the same prompt fingerprint is younger than
+    ttl seconds and its hash differs from the query by at most max_distance bits.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = []  # [(hash, prompt_key, timestamp, verdict)]，最新的在最后
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def prompt_key(system_prompt: Optional[str]) -> str:
+        return hashlib.blake2b((system_prompt or "").encode("utf-8"), digest_size=8).hexdigest()
+
+    def get(self, image_hash: int, prompt_key: str) -> Optional[SafetyVerdict]:
+        now = time.monotonic()
+        with self._lock:
+            self._entries = [entry for entry in self._entries if now - entry[2] <= self.ttl]
+            best = None
+            best_distance = self.max_distance + 1
+            for entry_hash, entry_prompt, _, verdict in self._entries:
+                if entry_prompt != prompt_key:
+                    continue
+                distance = hamming_distance(entry_hash, image_hash)
+                if distance < best_distance:
+                    best, best_distance = verdict, distance
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        hit = copy.copy(best)
+        hit.cached = True
+        return hit
+
+    def put(self, image_hash: int, prompt_key: str, verdict: SafetyVerdict) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries.append((image_hash, prompt_key, time.monotonic(), verdict))
+            del self._entries[:-self.max_entries]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内共享的缓存
+verdict_cache = VerdictCache()
@@ -1,15 +1,18 @@
 from typing import List, Dict, Optional, Any
 import os
+import json
+import asyncio
 from mcp.server.fastmcp import FastMCP
-from openai import OpenAI
 from dotenv import load_dotenv
 load_dotenv()
 # Initialize FastMCP server
 mcp = FastMCP("Safety_VLM")
 
 from PIL import Image
-import base64
-import io
+from FractFlow.infra.image_utils import prepare_image
+from FractFlow.infra.vlm_client import get_vlm_client
+from landing_guidelines import LANDING_GUIDELINES
+from safety_verdict import SafetyVerdict, VerdictCache, LEVEL_UNKNOWN, parse_safety_verdict, region_hash, verdict_cache
 
 def normalize_path(path: str) -> str:
     """
@@ -31,29 +34,118 @@ def normalize_path(path: str) -> str:
         
     return expanded_path
 
-def encode_image(image: Image.Image, size: tuple[int, int] = (512, 512)) -> str:
-    image.thumbnail(size)
-    buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
-    base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    return base64_image
+SAFETY_PROMPT = "请分析图中红色bounding box区域的降落安全性。"
+SAFETY_MODEL = "qwen-vl-max"  # 可按需更换模型名称。模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
 
-def load_image(image_path: str, size_limit: tuple[int, int] = (512, 512)) -> tuple[str, dict]:
-    """Load an image from the given path.
+def build_safety_messages(image_url: str, system_prompt: Optional[str] = None) -> list:
+    """Build the chat messages for a landing safety request."""
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user","content": [
+            {"type": "text","text": SAFETY_PROMPT},
+            {"type": "image_url",
+            "image_url": {"url": image_url}}
+            ]})
+    return messages
+
+async def query_safety_vlm(image_url: str, system_prompt: Optional[str] = None) -> str:
+    """Send an already encoded image to the VLM and return its safety analysis.
+    
+    Args:
+        image_url: Image data URL (see FractFlow.infra.image_utils.prepare_image)
+        system_prompt: Optional system prompt with the landing safety guidelines
+        
+    Returns:
+        The model's safety analysis text
+    """
+    # 共享的客户端（默认使用环境变量QWEN_API_KEY），复用连接池且不阻塞事件循环
+    client = get_vlm_client()
+    return await client.chat(
+        model=SAFETY_MODEL,
+        messages=build_safety_messages(image_url, system_prompt)
+    )
+
+def check_landing_safety(image: Image.Image, system_prompt: Optional[str] = None,
+                         size_limit: tuple[int, int] = (512, 512)) -> str:
+    """Analyse the landing safety of an in-memory image (no file round trip).
+    
+    Synchronous entry point for scripts such as the landing pipeline.
     
     Args:
-        image_path: Path to the image file to load
+        image: Marked image (e.g. with the red boundary of the landing spot)
+        system_prompt: Optional system prompt with the landing safety guidelines
         
     Returns:
-        A tuple containing:
-            - Base64 encoded string of the resized image (max 512x512) (this can be put in the image_url field of the user message)
-            - Dictionary with metadata including original width and height
+        The model's safety analysis text
     """
-    meta_info = {}
-    image = Image.open(image_path)
-    meta_info['width'], meta_info['height'] = image.size
-    base64_image = encode_image(image, size_limit)
-    return base64_image, meta_info
+    image_url = prepare_image(image, size_limit).data_url
+    return get_vlm_client().chat_sync(
+        model=SAFETY_MODEL,
+        messages=build_safety_messages(image_url, system_prompt)
+    )
+
+def _lookup_verdict(image, region, system_prompt: Optional[str], cache: Optional[VerdictCache]):
+    """Return (cached verdict or None, cache key or None) for the landing region of a marked image."""
+    if cache is None:
+        return None, None
+    # 只用标记区域作为key；找不到标记区域时不使用缓存
+    image_hash = region_hash(image, region)
+    if image_hash is None:
+        return None, None
+    key = (image_hash, cache.prompt_key(system_prompt))
+    return cache.get(*key), key
+
+def _store_verdict(verdict: SafetyVerdict, key, cache: Optional[VerdictCache]) -> None:
+    # 没有按格式给出结论的回复不缓存，下一帧重新询问
+    if cache is not None and key is not None and verdict.structured and verdict.level != LEVEL_UNKNOWN:
+        cache.put(*key, verdict)
+
+def assess_landing_safety(image: Image.Image, system_prompt: Optional[str] = None, region=None,
+                          size_limit: tuple[int, int] = (512, 512),
+                          cache: Optional[VerdictCache] = verdict_cache) -> SafetyVerdict:
+    """Structured landing safety verdict for an in-memory image, reusing recent verdicts.
+    
+    Args:
+        image: Marked image sent to the VLM
+        system_prompt: Optional system prompt with the landing safety guidelines
+        region: Landing region used as the cache key (e.g. the crop around the
+                marked spot); defaults to a crop around the red marking in image,
+                and nothing is cached if the image has no marking
+        cache: Verdict cache, or None to always query the VLM
+        
+    Returns:
+        SafetyVerdict; verdict.cached is True when no VLM request was made
+    """
+    verdict, key = _lookup_verdict(image, region, system_prompt, cache)
+    if verdict is not None:
+        return verdict
+    verdict = parse_safety_verdict(check_landing_safety(image, system_prompt, size_limit))
+    _store_verdict(verdict, key, cache)
+    return verdict
+
+async def assess_landing_safety_async(image: Image.Image, system_prompt: Optional[str] = None, region=None,
+                                      size_limit: tuple[int, int] = (512, 512),
+                                      cache: Optional[VerdictCache] = verdict_cache) -> SafetyVerdict:
+    """Async variant of assess_landing_safety; hashing and encoding run in a worker thread."""
+    verdict, key = await asyncio.to_thread(_lookup_verdict, image, region, system_prompt, cache)
+    if verdict is not None:
+        return verdict
+    prepared = await asyncio.to_thread(prepare_image, image, size_limit)
+    verdict = parse_safety_verdict(await query_safety_vlm(prepared.data_url, system_prompt))
+    _store_verdict(verdict, key, cache)
+    return verdict
+
+def _open_image(image_path: str) -> Image.Image:
+    with Image.open(image_path) as image:
+        image.load()
+        return image
+
+async def assess_landing_safety_file(image_path: str, system_prompt: Optional[str] = None,
+                                     cache: Optional[VerdictCache] = verdict_cache) -> SafetyVerdict:
+    """Structured landing safety verdict for an image file (see assess_landing_safety)."""
+    image = await asyncio.to_thread(_open_image, normalize_path(image_path))
+    return await assess_landing_safety_async(image, system_prompt, cache=cache)
 
 @mcp.tool()
 async def Safety_VLM(image_path: str) -> str:
@@ -67,26 +159,27 @@ async def Safety_VLM(image_path: str) -> str:
     Returns:
         str: A safety level (Green, Yellow, Red) and its reasoning.
     '''
-    image_path = normalize_path(image_path)
-    base64_image, meta_info = load_image(image_path, (512, 512))
-
-    # --- TBC ---
-    client = OpenAI(
-        # 若没有配置环境变量，请用百炼API Key将下行替换为：api_key="sk-xxx",
-        api_key=os.getenv('QWEN_API_KEY'),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
-    # --- --- ---
-    prompt = "请分析图中红色bounding box区域的降落安全性。"
-    completion = client.chat.completions.create(
-        model="qwen-vl-max",  # 此处以qwen-vl-plus为例，可按需更换模型名称。模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
-        messages=[{"role": "user","content": [
-                {"type": "text","text": prompt},
-                {"type": "image_url",
-                "image_url": {"url": f'data:image/png;base64,{base64_image}'}}
-                ]}]
-    )
-    return completion.choices[0].message.content
+    verdict = await assess_landing_safety_file(image_path)
+    return verdict.report
+
+@mcp.tool()
+async def Safety_Verdict(image_path: str) -> str:
+    '''
+    Structured landing safety verdict for a masked image, judged with the
+    Safety_Agent landing guidelines. Near-identical images (e.g. consecutive
+    frames while hovering) reuse a recent verdict instead of querying the VLM again.
+    
+    Args:
+        image_path (str): Full path to the marked image, preferably cropped around the landing spot.
+
+    Returns:
+        str: JSON with "level" (safe / caution / unsafe / unknown), "risk" (low / medium / high),
+             "reasons" (list), "report" (full VLM text), "cached" (true if reused) and
+             "structured" (false if the level was guessed from free text rather than the
+             report's 评估结果 section; such a level needs review).
+    '''
+    verdict = await assess_landing_safety_file(image_path, LANDING_GUIDELINES)
+    return json.dumps(verdict.to_dict(), ensure_ascii=False)
 
 if __name__ == "__main__":
     # Initialize and run the server
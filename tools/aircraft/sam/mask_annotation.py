@@ -0,0 +1,230 @@
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 对一个mask做一次分析（bbox、质心、边缘），生成所有标注图像并保存在内存中。
+# 磁盘写入交给后台线程，且可以关闭，不阻塞点击到显示的过程。
+
+# 各标注结果对应的文件名（与原来 ./tmp 下的文件保持一致）
+ARTIFACT_FILES = {
+    "overlay": "test_overlay.png",
+    "mask": "test_mask.png",
+    "bbox_image": "test_bbox.png",
+    "boundary_image": "test_boundary.png",
+    "cropped_image": "test_boundary_cropped.png",
+}
+
+
+class MaskArtifacts:
+    """一次点击分割得到的全部结果（内存中的numpy数组）"""
+
+    def __init__(self, mask, overlay, bbox_image, boundary_image, cropped_image, bbox, centroid, area):
+        self.mask = mask                      # H×W，非0为mask区域
+        self.overlay = overlay                # 绿色半透明叠加图
+        self.bbox_image = bbox_image          # 红色边界框
+        self.boundary_image = boundary_image  # 红色边缘轮廓
+        self.cropped_image = cropped_image    # 以mask质心为中心裁剪的边缘轮廓图，可能为None
+        self.bbox = bbox                      # (min_x, min_y, max_x, max_y)，包含边界
+        self.centroid = centroid              # (center_x, center_y)
+        self.area = area                      # mask像素数
+
+    def images(self):
+        """返回 名称 -> 图像数组，用于保存或传给下游"""
+        return {name: getattr(self, name) for name in ARTIFACT_FILES if getattr(self, name) is not None}
+
+
+def analyze_mask(mask):
+    """
+    对mask做一次分析
+
+    Returns:
+        (binary, bbox, centroid, area)，mask为空时bbox和centroid为None
+    """
+    binary = (mask != 0).astype(np.uint8)
+    moments = cv2.moments(binary, binaryImage=True)
+    area = int(moments["m00"])
+    if area == 0:
+        return binary, None, None, 0
+
+    x, y, w, h = cv2.boundingRect(binary)
+    bbox = (x, y, x + w - 1, y + h - 1)
+    centroid = (int(moments["m10"] / moments["m00"]), int(moments["m01"] / moments["m00"]))
+    return binary, bbox, centroid, area
+
+
+def compute_boundary(binary, thickness=2):
+    """
+    计算mask的边缘：mask内、且8邻域中有mask外像素（或超出图像）的像素，再按thickness加粗
+    """
+    # 图像外视为mask外，所以腐蚀时边界填0
+    eroded = cv2.erode(binary, np.ones((3, 3), np.uint8), borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    boundary = binary & (1 - eroded)
+
+    if thickness > 1:
+        # 与逐像素加粗一致：偏移范围为 [-thickness//2, thickness//2]（Python整除）
+        low, high = (-thickness) // 2, thickness // 2
+        size = high - low + 1
+        kernel = np.ones((size, size), np.uint8)
+        boundary = cv2.dilate(boundary, kernel, anchor=(high, high), borderType=cv2.BORDER_CONSTANT, borderValue=0)
+
+    return boundary.astype(bool)
+
+
+def apply_green_overlay(img_array, binary, alpha=0.3):
+    """应用绿色半透明遮罩到图像上（原地修改img_array）"""
+    region = binary.astype(bool)
+    green = np.array([0, 255, 0], dtype=np.float64)
+    img_array[region] = (img_array[region] * (1 - alpha) + green * alpha).astype(np.uint8)
+    return img_array
+
+
+def draw_bounding_box(image, bbox, thickness=10, color=(255, 0, 0)):
+    """在bbox位置绘制边界框"""
+    bbox_img = image.copy()
+    if bbox is None:
+        return bbox_img
+
+    min_x, min_y, max_x, max_y = bbox
+    h, w = bbox_img.shape[:2]
+    t = thickness
+    # 上下两条边
+    bbox_img[min_y:min(min_y + t, h), min_x:max_x + 1] = color
+    bbox_img[max(max_y - t + 1, 0):max_y + 1, min_x:max_x + 1] = color
+    # 左右两条边
+    bbox_img[min_y:max_y + 1, min_x:min(min_x + t, w)] = color
+    bbox_img[min_y:max_y + 1, max(max_x - t + 1, 0):max_x + 1] = color
+    return bbox_img
+
+
+def draw_mask_boundary(image, boundary, color=(255, 0, 0)):
+    """把边缘像素涂成指定颜色"""
+    img_array = image.copy()
+    img_array[boundary] = color
+    return img_array
+
+
+def center_crop(image, center, crop_size=1024):
+    """
+    围绕center进行center crop，图像边界不够时平移裁剪框，仍不足时居中padding
+
+    Returns:
+        裁剪后的图像，center为None时返回None
+    """
+    if center is None:
+        return None
+
+    center_x, center_y = center
+    half_size = crop_size // 2
+    h, w = image.shape[:2]
+
+    # 计算crop区域
+    start_x = max(0, center_x - half_size)
+    end_x = min(w, center_x + half_size)
+    start_y = max(0, center_y - half_size)
+    end_y = min(h, center_y + half_size)
+
+    # 如果图像边界不够，调整中心位置
+    if end_x - start_x < crop_size:
+        if start_x == 0:
+            end_x = min(w, crop_size)
+        else:
+            start_x = max(0, w - crop_size)
+
+    if end_y - start_y < crop_size:
+        if start_y == 0:
+            end_y = min(h, crop_size)
+        else:
+            start_y = max(0, h - crop_size)
+
+    cropped_image = image[start_y:end_y, start_x:end_x]
+
+    # 如果裁剪后的尺寸不足crop_size x crop_size，进行padding
+    if cropped_image.shape[0] < crop_size or cropped_image.shape[1] < crop_size:
+        padded_img = np.zeros((crop_size, crop_size, 3), dtype=np.uint8)
+        pad_y = (crop_size - cropped_image.shape[0]) // 2
+        pad_x = (crop_size - cropped_image.shape[1]) // 2
+        padded_img[pad_y:pad_y + cropped_image.shape[0],
+                   pad_x:pad_x + cropped_image.shape[1]] = cropped_image
+        cropped_image = padded_img
+    else:
+        cropped_image = cropped_image.copy()
+
+    return cropped_image
+
+
+def annotate_mask(image, mask, alpha=0.3, bbox_thickness=10, boundary_thickness=10, crop_size=1024):
+    """
+    一次mask分析生成全部标注结果
+
+    Args:
+        image: RGB图像数组 (H×W×3)
+        mask: 与图像同尺寸的mask数组，非0为mask区域
+
+    Returns:
+        MaskArtifacts，尺寸不匹配时返回None
+    """
+    if mask.shape[:2] != image.shape[:2]:
+        print(f"警告: mask尺寸 {mask.shape[:2]} 与图片尺寸 {image.shape[:2]} 不匹配")
+        return None
+
+    binary, bbox, centroid, area = analyze_mask(mask)
+
+    overlay = apply_green_overlay(image.copy(), binary, alpha)
+    bbox_image = draw_bounding_box(image, bbox, thickness=bbox_thickness)
+    boundary = compute_boundary(binary, thickness=boundary_thickness)
+    boundary_image = draw_mask_boundary(image, boundary)
+    cropped_image = center_crop(boundary_image, centroid, crop_size=crop_size)
+
+    print(f'>>> mask analysis: bbox={bbox}, centroid={centroid}, area={area}')
+
+    return MaskArtifacts(
+        mask=mask,
+        overlay=overlay,
+        bbox_image=bbox_image,
+        boundary_image=boundary_image,
+        cropped_image=cropped_image,
+        bbox=bbox,
+        centroid=centroid,
+        area=area,
+    )
+
+
+class ArtifactWriter:
+    """后台线程把标注结果写到磁盘，调用方不等待PNG编码"""
+
+    def __init__(self, output_dir="./tmp"):
+        self.output_dir = output_dir
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, artifacts: MaskArtifacts):
+        """把一次结果排队写入磁盘"""
+        self._queue.put(artifacts)
+
+    def join(self):
+        """等待已排队的结果全部写完"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            artifacts = self._queue.get()
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                for name, array in artifacts.images().items():
+                    path = os.path.join(self.output_dir, ARTIFACT_FILES[name])
+                    if name == "mask" and array.ndim == 2:
+                        # test_mask.png 一直是三通道图像，读取方依赖这个格式
+                        array = np.stack([array, array, array], axis=2)
+                    # 先写临时文件再替换，读取方不会看到写了一半的PNG
+                    tmp_path = path + ".tmp"
+                    Image.fromarray(array).save(tmp_path, format="PNG")
+                    os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"保存标注结果失败: {str(e)}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+
+# 尝试导入watchdog（inotify/FSEvents等文件系统事件）
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_SUPPORT = True
+except ImportError:
+    WATCHDOG_SUPPORT = False
+
+# 为sam_gradio提供重新加载事件：
+# 1. 同进程的生产者（如sam_utils）直接调用 reload_notifier.publish()
+# 2. 其他进程写入 reload_trigger.txt，由文件系统监听器转换为同一个事件
+
+
+class ReloadNotifier:
+    """进程内的发布/订阅通道，订阅者阻塞等待而不是轮询"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+        self._reason = None
+
+    @property
+    def version(self) -> int:
+        with self._condition:
+            return self._version
+
+    def publish(self, reason: str = "reload") -> int:
+        """发布一次重新加载事件，唤醒所有等待者"""
+        with self._condition:
+            self._version += 1
+            self._reason = reason
+            self._condition.notify_all()
+            return self._version
+
+    def wait(self, last_version: int, timeout: float = None):
+        """
+        阻塞直到出现比last_version更新的事件
+
+        Returns:
+            (version, reason)，超时则reason为None
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != last_version, timeout=timeout)
+            if self._version == last_version:
+                return last_version, None
+            return self._version, self._reason
+
+
+# 全局通知器，生产者和UI共享
+reload_notifier = ReloadNotifier()
+
+
+def consume_trigger_file(trigger_file: str) -> bool:
+    """删除触发文件，返回是否确实存在触发请求"""
+    try:
+        os.remove(trigger_file)
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"删除触发文件失败: {str(e)}")
+        return False
+
+
+if WATCHDOG_SUPPORT:
+    class _TriggerFileHandler(FileSystemEventHandler):
+        def __init__(self, trigger_file: str, notifier: ReloadNotifier):
+            self.trigger_file = os.path.abspath(trigger_file)
+            self.notifier = notifier
+
+        def _handle(self, path):
+            if os.path.abspath(path) == self.trigger_file and consume_trigger_file(self.trigger_file):
+                print("检测到重新加载请求，正在重新加载...")
+                self.notifier.publish("trigger_file")
+
+        def on_created(self, event):
+            self._handle(event.src_path)
+
+        def on_modified(self, event):
+            self._handle(event.src_path)
+
+        def on_moved(self, event):
+            self._handle(event.dest_path)
+
+
+def start_trigger_watcher(trigger_file: str, notifier: ReloadNotifier = reload_notifier, fallback_interval: float = 1.0):
+    """
+    监听外部进程写入的触发文件，并转换为notifier事件
+
+    有watchdog时使用文件系统事件，不占用CPU；否则退化为低频检查触发文件。
+
+    Returns:
+        watchdog的Observer或后台线程
+    """
+    watch_dir = os.path.dirname(os.path.abspath(trigger_file))
+    os.makedirs(watch_dir, exist_ok=True)
+
+    # 启动前已经存在的触发文件也要处理
+    if consume_trigger_file(trigger_file):
+        notifier.publish("trigger_file")
+
+    if WATCHDOG_SUPPORT:
+        observer = Observer()
+        observer.schedule(_TriggerFileHandler(trigger_file, notifier), watch_dir, recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    print("未安装watchdog，退化为定时检查触发文件 (pip install watchdog)")
+
+    def _poll():
+        while True:
+            if consume_trigger_file(trigger_file):
+                print("检测到重新加载请求，正在重新加载...")
+                notifier.publish("trigger_file")
+            time.sleep(fallback_interval)
+
+    thread = threading.Thread(target=_poll, daemon=True)
+    thread.start()
+    return thread
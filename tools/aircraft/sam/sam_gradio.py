@@ -4,33 +4,79 @@ from PIL import Image
 import os
 import glob
 import time
-import threading
 
 from sam_utils import SAM_tool, SAMClient
+from reload_events import reload_notifier, start_trigger_watcher
+from mask_annotation import annotate_mask, ArtifactWriter
 
 # 配置固定的图片路径
 # 请根据实际情况修改路径
 IMAGE_PATH = "./tmp/camera/微信图片_20250622132107.png"
 MASK_DIR = "./tmp/individual_masks"  # mask文件夹路径
 RELOAD_TRIGGER_FILE = "./tmp/reload_trigger.txt"  # 重新加载触发文件
+SAVE_ARTIFACTS = os.getenv("SAM_SAVE_ARTIFACTS", "1") != "0"  # 是否在后台把标注结果保存到./tmp
+ARTIFACT_DIR = "./tmp"  # 标注结果保存目录
+RELOAD_HEARTBEAT = 30  # 等待重新加载事件的心跳间隔（秒），仅用于发现已断开的会话
 
 # 存储最新点击坐标、原始图片和masks
 latest_click_point = None
 original_image = None
-masks = []  # 存储所有mask数据
+packed_masks = []  # 按位压缩的mask: (packbits后的一维数组, 原始形状)，内存为uint8的1/8
+mask_labels = None  # 标签图：像素值为 mask序号+1，0表示没有mask，用于O(1)点击查询
 mask_files = []  # 存储mask文件名
 
-# Gradio组件的全局引用
-image_display_ref = None
-coordinate_info_ref = None
+# 已解码文件的缓存，重新加载时只解码新增或变化的文件
+_mask_cache = {}  # mask路径 -> (文件签名, 压缩mask, 原始形状)
+_image_cache = {"signature": None, "image": None}
+
+# 最近一次点击的标注结果（内存中），以及下游消费者和后台写盘线程
+latest_artifacts = None
+artifact_listeners = []
+artifact_writer = ArtifactWriter(ARTIFACT_DIR) if SAVE_ARTIFACTS else None
+
 client = None
 
+def _file_signature(path):
+    """用修改时间和大小判断文件是否变化"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def unpack_mask(index):
+    """把第index个压缩mask还原为0/1的uint8数组"""
+    packed, shape = packed_masks[index]
+    return np.unpackbits(packed, count=shape[0] * shape[1]).reshape(shape)
+
+def build_mask_labels():
+    """
+    把所有mask合成一张标签图，每次重新加载只构建一次
+    
+    重叠区域归序号较小的mask，与逐个遍历mask时"第一个命中"的结果一致。
+    mask尺寸不一致时按最大尺寸分配，每个mask放在左上角。
+    """
+    if not packed_masks:
+        return None
+    
+    h = max(shape[0] for _, shape in packed_masks)
+    w = max(shape[1] for _, shape in packed_masks)
+    dtype = np.uint16 if len(packed_masks) < np.iinfo(np.uint16).max else np.uint32
+    labels = np.zeros((h, w), dtype=dtype)
+    
+    for i in range(len(packed_masks)):
+        mask = unpack_mask(i)
+        mh, mw = mask.shape
+        region = labels[:mh, :mw]
+        region[(mask != 0) & (region == 0)] = i + 1
+    
+    return labels
+
 def load_masks():
-    """加载所有mask文件"""
-    global masks, mask_files
+    """加载所有mask文件（增量：未变化的文件直接复用缓存）"""
+    global packed_masks, mask_labels, mask_files
     
-    masks = []
-    mask_files = []
+    new_packed_masks = []
+    new_mask_files = []
+    new_cache = {}
+    decoded_count = 0
     
     # 查找所有individual_masks_*.png文件
     mask_pattern = os.path.join(MASK_DIR, "individual_masks_*.png")
@@ -39,217 +85,67 @@ def load_masks():
     
     for mask_path in mask_paths:
         try:
-            # 加载mask图像
-            mask_img = Image.open(mask_path).convert('L')  # 转换为灰度
-            mask_array = np.array(mask_img)
-            
-            # 将mask二值化（假设白色为1，黑色为0）
-            mask_binary = (mask_array > 128).astype(np.uint8)
+            signature = _file_signature(mask_path)
+            cached = _mask_cache.get(mask_path)
+            if cached is not None and cached[0] == signature:
+                _, packed, shape = cached
+            else:
+                # 加载mask图像
+                mask_img = Image.open(mask_path).convert('L')  # 转换为灰度
+                mask_array = np.array(mask_img)
+                
+                # 将mask二值化（假设白色为1，黑色为0）并按位压缩
+                packed = np.packbits(mask_array > 128)
+                shape = mask_array.shape
+                decoded_count += 1
             
-            masks.append(mask_binary)
-            mask_files.append(os.path.basename(mask_path))
+            new_cache[mask_path] = (signature, packed, shape)
+            new_packed_masks.append((packed, shape))
+            new_mask_files.append(os.path.basename(mask_path))
             
         except Exception as e:
             print(f"无法加载mask文件 {mask_path}: {str(e)}")
     
-    return len(masks)
-
-def find_mask_at_position(x, y):
-    """根据点击位置找到对应的mask"""
-    global masks
-    
-    for i, mask in enumerate(masks):
-        h, w = mask.shape
-        if 0 <= x < w and 0 <= y < h:
-            if mask[y, x] == 1:  # 注意：numpy数组是[行,列]即[y,x]
-                return i, mask
+    # 文件集合和内容都没有变化时，沿用已有的标签图
+    unchanged = decoded_count == 0 and new_mask_files == mask_files and mask_labels is not None
     
-    return None, None
-
-def apply_green_overlay(img_array, mask, alpha=0.3):
-    """应用绿色半透明遮罩到图像上"""
-    # 创建绿色遮罩
-    green_overlay = np.zeros_like(img_array)
-    green_overlay[:, :, 1] = 255  # 绿色通道
-    
-    # 将mask扩展到3个通道
-    mask_3d = np.stack([mask, mask, mask], axis=2)
-    
-    # 确保mask和图片尺寸匹配
-    if mask_3d.shape[:2] != img_array.shape[:2]:
-        print(f"警告: mask尺寸 {mask_3d.shape[:2]} 与图片尺寸 {img_array.shape[:2]} 不匹配")
-        return img_array, mask_3d
-    
-    # 应用半透明绿色遮罩
-    print(np.unique(mask_3d))
-    overlay_region = mask_3d != 0
-    img_array[overlay_region] = (
-        img_array[overlay_region] * (1 - alpha) + 
-        green_overlay[overlay_region] * alpha
-    ).astype(np.uint8)
-    print('>>> overlay finished')
-    
-    return img_array, mask_3d
-
-def draw_bounding_box(image, overlay_region, thickness=10, color=[255, 0, 0]):
-    """在mask区域绘制边界框"""
-    bbox_img = image.copy()
-    
-    # 找到mask的边界框
-    mask_coords = np.where(overlay_region[:, :, 0])  # 使用第一个通道即可
-    if len(mask_coords[0]) > 0:  # 确保有mask区域
-        min_y, max_y = np.min(mask_coords[0]), np.max(mask_coords[0])
-        min_x, max_x = np.min(mask_coords[1]), np.max(mask_coords[1])
-        
-        # 绘制边界框
-        # 绘制水平线
-        for t in range(thickness):
-            # 上边
-            if min_y + t < bbox_img.shape[0]:
-                bbox_img[min_y + t, min_x:max_x + 1] = color
-            # 下边
-            if max_y - t >= 0:
-                bbox_img[max_y - t, min_x:max_x + 1] = color
-        
-        # 绘制垂直线
-        for t in range(thickness):
-            # 左边
-            if min_x + t < bbox_img.shape[1]:
-                bbox_img[min_y:max_y + 1, min_x + t] = color
-            # 右边
-            if max_x - t >= 0:
-                bbox_img[min_y:max_y + 1, max_x - t] = color
-        
-        print(f'>>> bounding box: ({min_x}, {min_y}) to ({max_x}, {max_y})')
+    # 已删除的mask文件不再保留
+    _mask_cache.clear()
+    _mask_cache.update(new_cache)
+    packed_masks = new_packed_masks
+    mask_files = new_mask_files
+    if not unchanged:
+        mask_labels = build_mask_labels()
+    print(f'>>> masks loaded: {len(packed_masks)} total, {decoded_count} decoded')
     
-    return bbox_img
+    return len(packed_masks)
 
-def draw_mask_boundary(image, mask, color=[255, 0, 0], thickness=2):
-    """根据mask绘制红色的边缘轮廓"""
-    if mask is None or mask.size == 0:
-        return image
+def find_mask_at_position(x, y):
+    """根据点击位置找到对应的mask（查标签图，O(1)）"""
+    if mask_labels is None:
+        return None, None
     
-    img_array = image.copy()
-    h, w = mask.shape
-    
-    # 创建边缘检测mask
-    boundary_mask = np.zeros_like(mask, dtype=bool)
-    
-    # 检测边缘：如果当前像素是mask区域，但周围有非mask区域，则为边缘
-    for y in range(h):
-        for x in range(w):
-            if mask[y, x] != 0:  # 当前像素在mask内（修改：使用!= 0而不是== 1）
-                # 检查8邻域
-                is_boundary = False
-                for dy in [-1, 0, 1]:
-                    for dx in [-1, 0, 1]:
-                        if dy == 0 and dx == 0:
-                            continue
-                        ny, nx = y + dy, x + dx
-                        # 如果邻域超出边界或者邻域不在mask内，则当前像素是边缘
-                        if (ny < 0 or ny >= h or nx < 0 or nx >= w or 
-                            mask[ny, nx] == 0):  # 这里保持== 0，检查邻域是否为0
-                            is_boundary = True
-                            break
-                    if is_boundary:
-                        break
-                
-                if is_boundary:
-                    boundary_mask[y, x] = True
-    
-    # 根据thickness参数加粗边缘
-    if thickness > 1:
-        thick_boundary = np.zeros_like(boundary_mask)
-        boundary_coords = np.where(boundary_mask)
-        for y, x in zip(boundary_coords[0], boundary_coords[1]):
-            for dy in range(-thickness//2, thickness//2 + 1):
-                for dx in range(-thickness//2, thickness//2 + 1):
-                    ny, nx = y + dy, x + dx
-                    if 0 <= ny < h and 0 <= nx < w:
-                        thick_boundary[ny, nx] = True
-        boundary_mask = thick_boundary
-    
-    # 将边缘应用到图像上
-    boundary_coords = np.where(boundary_mask)
-    if len(boundary_coords[0]) > 0:
-        img_array[boundary_coords[0], boundary_coords[1]] = color
-    
-    print(f'>>> boundary drawn with {len(boundary_coords[0])} pixels')
+    h, w = mask_labels.shape
+    if 0 <= x < w and 0 <= y < h:
+        label = int(mask_labels[y, x])  # 注意：numpy数组是[行,列]即[y,x]
+        if label != 0:
+            index = label - 1
+            return index, unpack_mask(index)
     
-    return img_array
+    return None, None
 
-def center_crop_mask_region(image, mask, crop_size=1024, save_path='./tmp/test_boundary_cropped.png'):
-    """
-    围绕mask非0值的中心进行center crop并保存
-    
-    Args:
-        image: 要裁剪的图像数组
-        mask: mask数组，用于确定中心位置
-        crop_size: 裁剪后的尺寸，默认512x512
-        save_path: 保存路径
-        
-    Returns:
-        cropped_image: 裁剪后的图像，如果没有mask区域则返回None
-    """
-    # 找到mask中非0值的中心
-    mask_coords = np.where(mask != 0)
-    if len(mask_coords[0]) == 0:
-        print('>>> 没有找到mask区域，无法进行center crop')
-        return None
-    
-    # 计算mask中心
-    center_y = int(np.mean(mask_coords[0]))
-    center_x = int(np.mean(mask_coords[1]))
-    
-    half_size = crop_size // 2
-    h, w = image.shape[:2]
-    
-    # 计算crop区域
-    start_x = max(0, center_x - half_size)
-    end_x = min(w, center_x + half_size)
-    start_y = max(0, center_y - half_size)
-    end_y = min(h, center_y + half_size)
-    
-    # 如果图像边界不够，调整中心位置
-    if end_x - start_x < crop_size:
-        if start_x == 0:
-            end_x = min(w, crop_size)
-        else:
-            start_x = max(0, w - crop_size)
-    
-    if end_y - start_y < crop_size:
-        if start_y == 0:
-            end_y = min(h, crop_size)
-        else:
-            start_y = max(0, h - crop_size)
-    
-    # 执行crop
-    cropped_image = image[start_y:end_y, start_x:end_x]
-    
-    # 如果裁剪后的尺寸不足crop_size x crop_size，进行padding
-    if cropped_image.shape[0] < crop_size or cropped_image.shape[1] < crop_size:
-        # 创建crop_size x crop_size的空白图像
-        padded_img = np.zeros((crop_size, crop_size, 3), dtype=np.uint8)
-        # 计算padding位置
-        pad_y = (crop_size - cropped_image.shape[0]) // 2
-        pad_x = (crop_size - cropped_image.shape[1]) // 2
-        padded_img[pad_y:pad_y+cropped_image.shape[0], 
-                  pad_x:pad_x+cropped_image.shape[1]] = cropped_image
-        cropped_image = padded_img
-    
-    # 保存裁剪后的图像
-    Image.fromarray(cropped_image).save(save_path)
-    print(f'>>> boundary cropped and saved: center=({center_x}, {center_y}), crop_region=({start_x}, {start_y}) to ({end_x}, {end_y})')
-    
-    return cropped_image
+def add_artifact_listener(listener):
+    """注册下游消费者，每次点击分割完成后以MaskArtifacts（内存数组）回调"""
+    artifact_listeners.append(listener)
 
 def apply_mask_overlay(image, mask, alpha=0.3):
-    print('>>> apply_mask_overlay: ', mask.shape)
-    """将mask以绿色半透明方式叠加到图像上"""
+    """将mask以绿色半透明方式叠加到图像上，同时一次性生成bbox、边缘和裁剪结果"""
+    global latest_artifacts
     if mask is None:
         return image
+    print('>>> apply_mask_overlay: ', mask.shape)
     
-    img_array = image.copy()
+    img_array = image
     
     # 检查图片通道数并处理
     if len(img_array.shape) == 3:
@@ -261,26 +157,22 @@ def apply_mask_overlay(image, mask, alpha=0.3):
     else:
         return image  # 不是3维数组，返回原图
     
-    # 应用绿色遮罩
-    img_array, mask_3d = apply_green_overlay(img_array, mask, alpha)
-    
-    # 保存overlay结果和mask
-    Image.fromarray(img_array).save('./tmp/test_overlay.png')
-    Image.fromarray(mask_3d).save('./tmp/test_mask.png')
+    artifacts = annotate_mask(img_array, mask, alpha=alpha, bbox_thickness=10,
+                              boundary_thickness=10, crop_size=1024)
+    if artifacts is None:
+        return img_array.copy()
     
-    # 绘制红色边界框并保存
-    overlay_region = mask_3d != 0
-    bbox_img = draw_bounding_box(image, overlay_region, thickness=10, color=[255, 0, 0])
-    Image.fromarray(bbox_img).save('./tmp/test_bbox.png')
-    
-    # 绘制红色边缘轮廓并保存
-    boundary_img = draw_mask_boundary(image, mask, color=[255, 0, 0], thickness=10)
-    Image.fromarray(boundary_img).save('./tmp/test_boundary.png')
-    
-    # 对boundary_img进行center crop并保存
-    center_crop_mask_region(boundary_img, mask, crop_size=1024, save_path='./tmp/test_boundary_cropped.png')
+    # 内存中交给下游，磁盘写入在后台进行（可关闭）
+    latest_artifacts = artifacts
+    for listener in artifact_listeners:
+        try:
+            listener(artifacts)
+        except Exception as e:
+            print(f"下游处理标注结果出错: {str(e)}")
+    if artifact_writer is not None:
+        artifact_writer.submit(artifacts)
     
-    return img_array
+    return artifacts.overlay.copy()
 
 def create_loading_image(original_img, message="正在处理..."):
     """创建带有加载提示的图片"""
@@ -383,18 +275,26 @@ def load_image_from_path():
         # 清除之前的点击记录
         latest_click_point = None
         
-        # 加载并保存原始图片
-        img = Image.open(IMAGE_PATH)
-        
-        # 处理不同格式的图片
-        if img.mode == 'RGBA':
-            # 将RGBA转换为RGB
-            background = Image.new('RGB', img.size, (255, 255, 255))  # 白色背景
-            background.paste(img, mask=img.split()[-1])  # 使用alpha通道作为mask
-            img = background
-        elif img.mode not in ['RGB', 'L']:
-            # 其他格式转换为RGB
-            img = img.convert('RGB')
+        # 图片未变化时复用已解码的结果
+        signature = _file_signature(IMAGE_PATH)
+        if _image_cache["signature"] == signature:
+            img = _image_cache["image"]
+        else:
+            # 加载并保存原始图片
+            img = Image.open(IMAGE_PATH)
+            
+            # 处理不同格式的图片
+            if img.mode == 'RGBA':
+                # 将RGBA转换为RGB
+                background = Image.new('RGB', img.size, (255, 255, 255))  # 白色背景
+                background.paste(img, mask=img.split()[-1])  # 使用alpha通道作为mask
+                img = background
+            elif img.mode not in ['RGB', 'L']:
+                # 其他格式转换为RGB
+                img = img.convert('RGB')
+            
+            _image_cache["signature"] = signature
+            _image_cache["image"] = img
         
         original_image = np.array(img)
         
@@ -431,37 +331,17 @@ def trigger_external_reload():
         print(f"创建触发文件失败: {str(e)}")
         return False
 
-def check_reload_trigger():
-    """检查是否需要重新加载"""
-    if os.path.exists(RELOAD_TRIGGER_FILE):
-        try:
-            # 删除触发文件
-            os.remove(RELOAD_TRIGGER_FILE)
-            print("检测到重新加载请求，正在重新加载...")
-            return True
-        except Exception as e:
-            print(f"删除触发文件失败: {str(e)}")
-    return False
-
-def auto_reload_checker():
-    """自动检查重新加载的后台线程"""
-    global image_display_ref, coordinate_info_ref
-    
+def reload_stream():
+    """订阅重新加载事件，事件到达后立即推送新的图片和mask（无轮询）"""
+    version = reload_notifier.version
     while True:
-        try:
-            if check_reload_trigger():
-                # 重新加载图片和masks
-                new_image, new_info = load_image_from_path()
-                
-                # 更新Gradio组件（需要在主线程中执行）
-                if image_display_ref is not None and coordinate_info_ref is not None:
-                    # 使用Gradio的更新机制
-                    print("重新加载完成")
-                
-            time.sleep(1)  # 每秒检查一次
-        except Exception as e:
-            print(f"自动重新加载检查出错: {str(e)}")
-            time.sleep(5)
+        version, reason = reload_notifier.wait(version, timeout=RELOAD_HEARTBEAT)
+        if reason is None:
+            # 心跳：空更新，使Gradio能回收已断开的会话
+            yield gr.update(), gr.update()
+            continue
+        print(f"收到重新加载事件: {reason}")
+        yield load_image_from_path()
 
 # 预加载图片以获取初始状态
 def get_initial_state():
@@ -505,21 +385,11 @@ with gr.Blocks(title="图片点击坐标标记器") as demo:
                 show_download_button=False
             )
     
-    # 保存组件引用
-    image_display_ref = image_display
-    coordinate_info_ref = coordinate_info
-    
-    # 定时检查重新加载触发器
-    def check_and_reload():
-        if check_reload_trigger():
-            return load_image_from_path()
-        return gr.update(), gr.update()
-    
-    # 每3秒检查一次是否需要重新加载
-    timer = gr.Timer(value=3)
-    timer.tick(
-        fn=check_and_reload,
-        outputs=[image_display, coordinate_info]
+    # 每个会话订阅重新加载事件，由事件驱动推送更新
+    demo.load(
+        fn=reload_stream,
+        outputs=[image_display, coordinate_info],
+        concurrency_limit=None
     )
     
     # 事件绑定
@@ -548,4 +418,6 @@ with gr.Blocks(title="图片点击坐标标记器") as demo:
 
 # 启动应用
 if __name__ == "__main__":
+    # 把外部进程写入的触发文件转换为重新加载事件
+    start_trigger_watcher(RELOAD_TRIGGER_FILE)
     demo.launch(share=False, server_name="127.0.0.1", server_port=7863) 
\ No newline at end of file
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 load_dotenv()
 import replicate
 import requests
+from requests.adapters import HTTPAdapter
 
 from PIL import Image
 import base64
@@ -13,6 +14,10 @@ import io
 import cv2
 import numpy as np
 import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from reload_events import reload_notifier
 
 # from sam_gradio import trigger_external_reload, IMAGE_PATH
 
@@ -51,6 +56,12 @@ class SAMClient:
             encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
         return encoded_string
     
+    def encode_array(self, image):
+        """将RGB图像数组在内存中编码为base64 PNG（不落盘）"""
+        bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        _, buffer = cv2.imencode('.png', bgr, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        return base64.b64encode(buffer).decode('utf-8')
+    
     def segment_image(self, image_path, prompt_points, prompt_labels=None):
         """
         发送图像分割请求
@@ -63,7 +74,21 @@ class SAMClient:
         try:
             # 编码图像
             image_base64 = self.encode_image(image_path)
-            
+        except Exception as e:
+            print(f"读取图像失败: {e}")
+            return None
+        return self.segment_base64(image_base64, prompt_points, prompt_labels)
+    
+    def segment_base64(self, image_base64, prompt_points, prompt_labels=None):
+        """
+        使用已编码的图像（base64字符串）发送分割请求，供内存中的图像直接调用
+        
+        Args:
+            image_base64: base64编码的图像文件内容（PNG/JPEG等）
+            prompt_points: 提示点列表 [[x1, y1], [x2, y2], ...]
+            prompt_labels: 提示点标签列表 [1, 0, 1, ...] (1为前景，0为背景)
+        """
+        try:
             # 准备请求数据
             data = {
                 "image": image_base64,
@@ -147,29 +172,125 @@ def normalize_path(path: str) -> str:
         
     return expanded_path
 
-def clear_cache():
-    os.system("rm -rf ./tmp/individual_masks/*")
-    os.system("rm -rf ./tmp/combined_mask/*")
+# Replicate返回的mask缓存目录（sam_gradio从这里加载）
+COMBINED_MASK_DIR = "./tmp/combined_mask"
+INDIVIDUAL_MASK_DIR = "./tmp/individual_masks"
+ETAG_FILE = "./tmp/mask_etags.json"  # 已下载文件的ETag，内容未变化时跳过写入
+DOWNLOAD_WORKERS = int(os.getenv("SAM_DOWNLOAD_WORKERS", "32"))
+DOWNLOAD_TIMEOUT = float(os.getenv("SAM_DOWNLOAD_TIMEOUT", "30"))
+
+_download_session = None
+
+def get_download_session() -> requests.Session:
+    """进程内共享的下载会话，连接池大小与下载线程数一致，连接可复用"""
+    global _download_session
+    if _download_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _download_session = session
+    return _download_session
 
-def request_result_from_replicate(response: dict) -> Image.Image:
-    clear_cache()
-    def request_url(url: str) -> Any:
-        response = requests.get(url)
-        content = io.BytesIO(response.content) 
-        print(content)
-        return content
+def clear_cache(keep=()):
+    """清空mask缓存目录（在进程内删除，不调用shell），keep中的文件保留"""
+    keep = {os.path.normpath(path) for path in keep}
+    for directory in (INDIVIDUAL_MASK_DIR, COMBINED_MASK_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if os.path.normpath(entry.path) in keep:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+def _load_etags() -> Dict[str, str]:
+    try:
+        with open(ETAG_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    # 下载文件内容
-    combined_mask_content = request_url(response['combined_mask'].url)
-    combined_mask_image = Image.open(combined_mask_content)
-    combined_mask_image.save("./tmp/combined_mask/combined_mask.png")
+def _save_etags(etags: Dict[str, str]):
+    os.makedirs(os.path.dirname(ETAG_FILE), exist_ok=True)
+    tmp_path = ETAG_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(etags, f)
+    os.replace(tmp_path, ETAG_FILE)
+
+def download_file(url: str, path: str, etag: Optional[str] = None):
+    """
+    流式下载一个文件并原样写入磁盘（不经过PIL解码/重新编码）
+    
+    Args:
+        url: 文件地址
+        path: 保存路径
+        etag: 上次下载时的ETag，本地文件存在且ETag未变时跳过写入
+        
+    Returns:
+        (ETag, 是否写入了新内容)
+    """
+    known = etag if etag and os.path.exists(path) else None
+    headers = {"If-None-Match": known} if known else {}
+    with get_download_session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        # 304，或服务器忽略If-None-Match但ETag相同：不读取内容
+        if response.status_code == 304 or (known and response.headers.get("ETag") == known):
+            return known, False
+        response.raise_for_status()
+        # 先写临时文件再替换，sam_gradio不会读到写了一半的mask
+        tmp_path = path + ".part"
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        return response.headers.get("ETag"), True
+
+def download_files(jobs: List[tuple], max_workers: int = DOWNLOAD_WORKERS) -> int:
+    """
+    用有界线程池并发下载 (url, path) 列表，删除不在列表中的旧mask
+    
+    Returns:
+        写入了新内容的文件数
+    """
+    for directory in (INDIVIDUAL_MASK_DIR, COMBINED_MASK_DIR):
+        os.makedirs(directory, exist_ok=True)
+    clear_cache(keep=[path for _, path in jobs])
+    
+    etags = _load_etags()
+    new_etags = {}
+    changed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+        futures = {executor.submit(download_file, url, path, etags.get(path)): path for url, path in jobs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                etag, written = future.result()
+            except Exception as e:
+                print(f"下载失败 {path}: {e}")
+                # 不保留上一次结果的旧文件，避免与本次的mask混在一起
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            if etag:
+                new_etags[path] = etag
+            changed += int(written)
+    _save_etags(new_etags)
+    print(f">>> masks downloaded: {len(jobs)} total, {changed} changed")
+    return changed
 
+def request_result_from_replicate(response: dict) -> int:
+    """并发下载Replicate返回的combined mask和全部individual masks，返回有变化的文件数"""
+    jobs = [(response['combined_mask'].url, os.path.join(COMBINED_MASK_DIR, "combined_mask.png"))]
     for i, mask_replicate in enumerate(response['individual_masks']):
-        individual_masks_content = request_url(mask_replicate.url)
-        individual_masks_image = Image.open(individual_masks_content)
-        individual_masks_image.save(f"./tmp/individual_masks/individual_masks_{i}.png")
+        jobs.append((mask_replicate.url, os.path.join(INDIVIDUAL_MASK_DIR, f"individual_masks_{i}.png")))
+    changed = download_files(jobs)
 
-    # trigger_external_reload()
+    # 通知同进程的sam_gradio重新加载（跨进程请写入reload_trigger.txt）
+    if changed:
+        reload_notifier.publish("replicate_masks")
+    return changed
 
 
 # @mcp.tool()
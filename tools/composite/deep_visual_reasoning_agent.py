@@ -66,8 +66,10 @@ class DeepVisualReasoningAgent(ToolTemplate):
 ## 阶段3：精确检测与自动裁剪
 - **重要**：必须使用detect_and_crop_objects进行检测和裁剪
 - 获取每个检测对象的单独裁剪图像文件
+- 只需定位（不需要裁剪）且涉及多个查询词或多张图像时，使用detect_objects_batch一次完成，不要逐个查询重复调用
 - 解析返回的JSON结果，提取cropped_images路径列表
 - 为后续局部分析准备裁剪素材
+- 也可设置save_crops_to_disk=false只获取每个对象的crop_box，再调用VQA时传入原图路径和crop_box直接分析该区域，省去写裁剪文件
 
 ## 阶段4：逐个裁剪对象深度分析
 - 对每个裁剪图像使用VQA进行专门分析
@@ -9,6 +9,8 @@ from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 from pathlib import Path
 
+from FractFlow.infra.generation_cache import CachedOutput, get_generation_cache, place_file
+
 try:
     from .workflow_manager import WorkflowManager
 except ImportError:
@@ -62,8 +64,23 @@ def get_file_from_comfyui(filename: str, subfolder: str, folder_type: str) -> by
         return response.read()
 
 
-def download_outputs(history: dict, save_directory: str, meta: dict, custom_filename: str = None) -> List[str]:
-    """下载工作流输出文件到指定目录，支持自定义文件名"""
+def output_filename(output_name: str, index: int, count: int, extension: str, custom_filename: str = None) -> str:
+    """输出文件命名：有自定义文件名时使用其主干，否则使用输出节点的语义化名称"""
+    if custom_filename:
+        # 使用用户指定的文件名，保持实际文件的扩展名，以确保兼容性
+        custom_stem = Path(custom_filename).stem
+        return f"{custom_stem}_{index}{extension}" if count > 1 else f"{custom_stem}{extension}"
+    # 使用默认的语义化命名
+    return f"{output_name}_{index}{extension}" if count > 1 else f"{output_name}{extension}"
+
+
+def download_outputs(history: dict, save_directory: str, meta: dict, custom_filename: str = None,
+                     output_records: list = None) -> List[str]:
+    """
+    下载工作流输出文件到指定目录，支持自定义文件名
+
+    output_records 不为 None 时，为每个文件追加 (路径, 命名信息)，供生成缓存保存
+    """
     save_dir = Path(save_directory)
     save_dir.mkdir(parents=True, exist_ok=True)
     
@@ -94,26 +111,21 @@ def download_outputs(history: dict, save_directory: str, meta: dict, custom_file
                     
                     # 智能文件命名逻辑
                     actual_extension = Path(file_info['filename']).suffix
+                    filename = output_filename(output_name, i, len(file_list), actual_extension, custom_filename)
                     
-                    if custom_filename:
-                        # 使用用户指定的文件名
-                        custom_path = Path(custom_filename)
-                        custom_stem = custom_path.stem
-                        
-                        # 保持实际文件的扩展名，以确保兼容性
-                        if len(file_list) > 1:
-                            filename = f"{custom_stem}_{i}{actual_extension}"
-                        else:
-                            filename = f"{custom_stem}{actual_extension}"
-                    else:
-                        # 使用默认的语义化命名
-                        filename = f"{output_name}_{i}{actual_extension}" if len(file_list) > 1 else f"{output_name}{actual_extension}"
-                    
+                    # 先写临时文件再替换，不在原文件上覆盖写入
                     file_path = save_dir / filename
-                    with open(file_path, 'wb') as f:
+                    temp_path = save_dir / f"{filename}.part"
+                    with open(temp_path, 'wb') as f:
                         f.write(file_data)
+                    os.replace(temp_path, file_path)
                     
                     saved_files.append(str(file_path))
+                    if output_records is not None:
+                        output_records.append((str(file_path), {
+                            "output_name": output_name, "index": i, "count": len(file_list),
+                            "extension": actual_extension
+                        }))
                     print(f"Downloaded: {filename} ({output_type})")
                     
                 except Exception as e:
@@ -124,6 +136,17 @@ def download_outputs(history: dict, save_directory: str, meta: dict, custom_file
     return saved_files
 
 
+def restore_outputs(outputs: List[CachedOutput], save_directory: str, custom_filename: str = None) -> List[str]:
+    """把生成缓存中的输出文件按与下载时相同的命名放到保存目录"""
+    saved_files = []
+    for output in outputs:
+        info = output.info
+        filename = output_filename(info["output_name"], info["index"], info["count"], info["extension"],
+                                   custom_filename)
+        saved_files.append(place_file(output.path, os.path.join(save_directory, filename)))
+    return saved_files
+
+
 @mcp.tool()
 async def list_comfyui_workflows() -> str:
     """列出所有可用的ComfyUI工作流及其完整文档"""
@@ -135,14 +158,18 @@ async def list_comfyui_workflows() -> str:
 
 
 @mcp.tool()
-async def execute_comfyui_workflow(workflow_name: str, save_path: str, parameters: dict = None) -> str:
+async def execute_comfyui_workflow(workflow_name: str, save_path: str, parameters: dict = None,
+                                   use_cache: bool = True) -> str:
     """
     执行指定的ComfyUI工作流并保存结果
     
+    工作流与参数（包括输入图像内容）与之前某次执行完全相同时，直接复用缓存的输出文件，不再执行工作流。
+    
     Args:
         workflow_name: 要执行的工作流名称
         save_path: 输出文件保存路径（目录或完整文件路径）
         parameters: 工作流所需的参数字典
+        use_cache: 是否复用相同请求的缓存输出；需要同一提示词的新结果时设为 False 或更换 seed
     """
     try:
         if parameters is None:
@@ -184,20 +211,47 @@ async def execute_comfyui_workflow(workflow_name: str, save_path: str, parameter
             if param_name not in parameters and 'default' in param_info:
                 parameters[param_name] = param_info['default']
         
-        # 填充参数到工作流并执行
+        # 填充参数到工作流
         filled_workflow = workflow_manager.fill_parameters(workflow, meta, **parameters)
-        client_id = str(uuid.uuid4())
-        prompt_id = queue_prompt_to_comfyui(filled_workflow, client_id)
-        history = wait_for_completion(prompt_id, client_id)
         
-        # 下载文件，传递自定义文件名
-        saved_files = download_outputs(history[prompt_id], save_directory, meta, custom_filename)
+        # 填充后的工作流已包含全部参数和输入图像内容，作为生成缓存的键
+        cache = get_generation_cache()
+        cache_key = None
+        cached = False
+        if use_cache and cache.enabled:
+            cache_key = cache.key("comfyui", workflow_name,
+                                  params={"server": server_address, "workflow": filled_workflow})
+            cached_outputs = cache.lookup(cache_key)
+            if cached_outputs:
+                Path(save_directory).mkdir(parents=True, exist_ok=True)
+                saved_files = restore_outputs(cached_outputs, save_directory, custom_filename)
+                cached = True
+        
+        if not cached:
+            # 执行工作流
+            client_id = str(uuid.uuid4())
+            prompt_id = queue_prompt_to_comfyui(filled_workflow, client_id)
+            history = wait_for_completion(prompt_id, client_id)
+            
+            # 下载文件，传递自定义文件名
+            output_records = []
+            saved_files = download_outputs(history[prompt_id], save_directory, meta, custom_filename, output_records)
+            # 只缓存完整下载的结果，部分文件下载失败时不缓存
+            complete = all(
+                sum(1 for _, other in output_records if other["output_name"] == info["output_name"]) == info["count"]
+                for _, info in output_records
+            )
+            if cache_key is not None and complete:
+                cache.store(cache_key, output_records)
         
         if not saved_files:
             return f"Workflow '{workflow_name}' executed successfully but no output files were generated."
         
         # 构建结果报告
-        result = f"Workflow '{workflow_name}' executed successfully!\n"
+        if cached:
+            result = f"Workflow '{workflow_name}' outputs reused from the generation cache (identical earlier run, not executed again).\n"
+        else:
+            result = f"Workflow '{workflow_name}' executed successfully!\n"
         result += f"Generated {len(saved_files)} output file(s):\n"
         for file_path in saved_files:
             result += f"- {file_path}\n"
@@ -37,6 +37,7 @@ class GPTImagenTool(ToolTemplate):
 # 工具选择策略
 - 用户提供参考图像路径时：使用 edit_image_with_gpt
 - 用户只提供文本描述时：使用 create_image_with_gpt
+- 一次需要生成多张图像时：使用 generate_images_batch 并发生成，每个任务包含 prompt 和 save_path（编辑时再加 image_paths）
 
 # 基本工作流程
 1. 确认用户请求类型（生成新图像或编辑现有图像）
@@ -1,18 +1,65 @@
 import base64
-from openai import OpenAI
-from mcp.server.fastmcp import FastMCP
-from typing import List
+import asyncio
+import mimetypes
+import time
+from openai import AsyncOpenAI
+from mcp.server.fastmcp import FastMCP, Context
+from typing import Any, Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 
+from FractFlow.infra.generation_cache import get_generation_cache, place_file
+
 # Load environment variables
 load_dotenv()
 
 # Initialize FastMCP server
 mcp = FastMCP("gpt_image")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+MODEL = "gpt-image-1"
+# Concurrent image requests, and request starts per minute (0 disables the per-minute limit)
+MAX_CONCURRENCY = int(os.getenv('GPT_IMAGE_CONCURRENCY', '4'))
+REQUESTS_PER_MINUTE = float(os.getenv('GPT_IMAGE_RPM', '0'))
+
+class RateLimiter:
+    """Spaces request starts at least 60 / requests_per_minute seconds apart"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+_client: Optional[AsyncOpenAI] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_rate_limiter: Optional[RateLimiter] = None
+
+def get_client() -> Tuple[AsyncOpenAI, asyncio.Semaphore, RateLimiter]:
+    """
+    Get the async OpenAI client shared by all tools, with its concurrency and rate limits.
+
+    The client is tied to the event loop it was created on and is rebuilt if
+    used from a new loop. OPENAI_BASE_URL points it at any compatible images
+    API, e.g. a local stub for tests.
+    """
+    global _client, _client_loop, _semaphore, _rate_limiter
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), base_url=os.getenv('OPENAI_BASE_URL') or None)
+        _client_loop = loop
+        _semaphore = asyncio.Semaphore(max(1, MAX_CONCURRENCY))
+        _rate_limiter = RateLimiter(REQUESTS_PER_MINUTE)
+    return _client, _semaphore, _rate_limiter
 
 def normalize_path(path: str) -> str:
     """
@@ -34,11 +81,82 @@ def normalize_path(path: str) -> str:
         
     return expanded_path
 
+def read_reference_image(path: str) -> Tuple[str, bytes, str]:
+    """Read a reference image as an upload tuple (filename, content, mime type)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return os.path.basename(path), data, mimetypes.guess_type(path)[0] or "image/png"
+
+def write_image(image_base64: str, save_path: str) -> None:
+    """Decode a base64 image and write it atomically, so readers never see a partial file."""
+    image_bytes = base64.b64decode(image_base64)
+    temp_path = f"{save_path}.part"
+    with open(temp_path, "wb") as f:
+        f.write(image_bytes)
+    os.replace(temp_path, save_path)
+
+def cache_key(prompt: str, image_paths: Optional[List[str]]) -> str:
+    """Generation cache key; reference images enter it by content."""
+    params = {"operation": "edit"} if image_paths else {"operation": "generate", "quality": "low"}
+    params["endpoint"] = os.getenv('OPENAI_BASE_URL') or "api.openai.com"
+    return get_generation_cache().key("openai-images", MODEL, prompt, params, image_paths or ())
+
+async def generate_image(prompt: str, save_path: str, image_paths: Optional[List[str]] = None,
+                         use_cache: bool = True) -> Tuple[str, bool]:
+    """
+    Generate one image, or edit reference images when image_paths is given, and save it.
+
+    File reads, base64 decoding and the file write run in worker threads, so the
+    server's event loop keeps serving other requests while images are generated.
+    A request identical to an earlier one (same prompt, operation and reference
+    image contents) is served from the generation cache without calling the API.
+
+    Returns:
+        (normalized save path, whether the image came from the cache)
+    """
+    # Normalize the save path
+    save_path = normalize_path(save_path)
+    image_paths = [normalize_path(path) for path in image_paths] if image_paths else None
+
+    # Ensure the save directory exists
+    save_dir = os.path.dirname(save_path)
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+
+    cache = get_generation_cache()
+    key = None
+    if use_cache and cache.enabled:
+        key = await asyncio.to_thread(cache_key, prompt, image_paths)
+        outputs = await asyncio.to_thread(cache.lookup, key)
+        if outputs:
+            await asyncio.to_thread(place_file, outputs[0].path, save_path)
+            return save_path, True
+
+    images = None
+    if image_paths:
+        images = await asyncio.gather(
+            *[asyncio.to_thread(read_reference_image, path) for path in image_paths]
+        )
+
+    client, semaphore, rate_limiter = get_client()
+    async with semaphore:
+        await rate_limiter.wait()
+        if images:
+            result = await client.images.edit(model=MODEL, image=images, prompt=prompt)
+        else:
+            result = await client.images.generate(model=MODEL, prompt=prompt, quality="low")
+
+    await asyncio.to_thread(write_image, result.data[0].b64_json, save_path)
+    if key is not None:
+        await asyncio.to_thread(cache.store, key, [(save_path, {})])
+    return save_path, False
+
 @mcp.tool()
 async def edit_image_with_gpt(
     save_path: str,
     prompt: str,
-    image_paths: List[str]
+    image_paths: List[str],
+    use_cache: bool = True
 ) -> str:
     """
     Edit and generate images using GPT's image editing capabilities with reference images.
@@ -49,6 +167,8 @@ async def edit_image_with_gpt(
         save_path: Full path where the generated image will be saved (including filename)
         prompt: Text description of how to combine and modify the reference images
         image_paths: List of paths to reference images that will be used as input for editing
+        use_cache: Reuse the image from an identical earlier request (same prompt and reference
+                   images) instead of generating a new one; set False to force a new variation
         
     Returns:
         Image file path as a string where the generated image is saved
@@ -63,49 +183,13 @@ async def edit_image_with_gpt(
         )
         ```
     """
-
-    model = "gpt-image-1"
-    # Normalize the save path
-    save_path = normalize_path(save_path)
-    
-    # Ensure the save directory exists
-    save_dir = os.path.dirname(save_path)
-    if save_dir and not os.path.exists(save_dir):
-        os.makedirs(save_dir, exist_ok=True)
-    
-    # Open all reference images
-    images = []
-    for img_path in image_paths:
-        normalized_path = normalize_path(img_path)
-        with open(normalized_path, "rb") as f:
-            images.append(f)
-    
-    try:
-        # Generate image using GPT
-        result = client.images.edit(
-            model=model,
-            image=images,
-            prompt=prompt,
-        )
-        
-        # Decode and save the generated image
-        image_base64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_base64)
-        
-        with open(save_path, "wb") as f:
-            f.write(image_bytes)
-            
-        return save_path
-        
-    finally:
-        # Close all opened image files
-        for img in images:
-            img.close()
+    return (await generate_image(prompt, save_path, image_paths, use_cache))[0]
 
 @mcp.tool()
 async def create_image_with_gpt(
     save_path: str,
     prompt: str,
+    use_cache: bool = True
 ) -> str:
     """
     Generate a new image from scratch using GPT's image generation capabilities.
@@ -114,6 +198,8 @@ async def create_image_with_gpt(
     Args:
         save_path: Full path where the generated image will be saved (including filename)
         prompt: Detailed text description of the image to generate
+        use_cache: Reuse the image from an identical earlier request instead of generating
+                   a new one; set False to force a new variation
         
     Returns:
         Image file path as a string where the generated image is saved
@@ -127,37 +213,62 @@ async def create_image_with_gpt(
         )
         ```
     """
-    model = "gpt-image-1"
-    # Normalize the save path
-    save_path = normalize_path(save_path)
-    
-    # Ensure the save directory exists
-    save_dir = os.path.dirname(save_path)
-    if save_dir and not os.path.exists(save_dir):
-        os.makedirs(save_dir, exist_ok=True)
-    
     try:
-        # Generate image using GPT
-        result = client.images.generate(
-            model=model,
-            prompt=prompt, 
-            quality="low"
-        )
-        
-        # Decode and save the generated image
-        image_base64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_base64)
-        
-        with open(save_path, "wb") as f:
-            f.write(image_bytes)
-            
-        return save_path
+        return (await generate_image(prompt, save_path, use_cache=use_cache))[0]
     except Exception as e:
         raise Exception(f"Failed to generate image: {str(e)}")
-    finally:
-        # Clean up any resources if needed
-        pass
+
+@mcp.tool()
+async def generate_images_batch(jobs: List[Dict[str, Any]], ctx: Context = None) -> str:
+    """
+    Generate several images concurrently in one call.
+    Use this instead of calling create_image_with_gpt / edit_image_with_gpt once per image,
+    e.g. for all the illustrations of an article. Jobs run in parallel within the
+    server's concurrency and rate limits (GPT_IMAGE_CONCURRENCY, GPT_IMAGE_RPM), and
+    progress is reported as each job finishes.
+
+    Args:
+        jobs: List of jobs, each {"prompt": str, "save_path": str} for a new image, or
+              {"prompt": str, "save_path": str, "image_paths": [str, ...]} to edit reference images;
+              add "use_cache": false to a job to force a new variation instead of reusing a cached one
+
+    Returns:
+        One line per job in input order, "OK <save_path>" (with "(cached)" when reused)
+        or "FAILED <save_path>: <error>",
+        followed by a summary line
+
+    Example:
+        ```python
+        result = await generate_images_batch(jobs=[
+            {"prompt": "A lighthouse at dawn, watercolor", "save_path": "output/images/section1-fig1.png"},
+            {"prompt": "A fishing boat in a storm, watercolor", "save_path": "output/images/section2-fig1.png"}
+        ])
+        ```
+    """
+    total = len(jobs)
+    completed = 0
+
+    async def run_job(job: Dict[str, Any]) -> str:
+        nonlocal completed
+        save_path = job.get("save_path", "")
+        try:
+            if not job.get("prompt") or not save_path:
+                raise ValueError("each job needs a prompt and a save_path")
+            path, cached = await generate_image(job['prompt'], save_path, job.get('image_paths'),
+                                                job.get('use_cache', True))
+            line = f"OK {path} (cached)" if cached else f"OK {path}"
+        except Exception as e:
+            line = f"FAILED {save_path}: {str(e)}"
+        completed += 1
+        if ctx is not None:
+            await ctx.report_progress(completed, total)
+            await ctx.info(f"[{completed}/{total}] {line}")
+        return line
+
+    lines = await asyncio.gather(*[run_job(job) for job in jobs])
+    succeeded = sum(line.startswith("OK ") for line in lines)
+    return "\n".join(lines + [f"{succeeded}/{total} images generated"])
 
 if __name__ == "__main__":
     # Initialize and run the server
-    mcp.run(transport='stdio') 
\ No newline at end of file
+    mcp.run(transport='stdio')
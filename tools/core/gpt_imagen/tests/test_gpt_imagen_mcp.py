@@ -0,0 +1,169 @@
+"""
+GPT Image Tool Server Tests
+
+Runs generate_images_batch against a local fake of the OpenAI images API
+(/v1/images/generations and /v1/images/edits) selected with OPENAI_BASE_URL,
+checking the concurrency limit, per-job failure reporting, the written files
+and the generation cache.
+
+License: MIT License
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("openai")
+pytest.importorskip("mcp")
+
+# Add the tool directory and the repository root to the Python path
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOL_DIR)
+sys.path.insert(0, os.path.abspath(os.path.join(TOOL_DIR, "..", "..", "..")))
+
+import gpt_imagen_mcp
+from FractFlow.infra import generation_cache
+
+REQUEST_SECONDS = 0.2
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeImagesAPI(ThreadingHTTPServer):
+    """Images API stub that records the paths it served and the peak number of requests in flight."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeImagesHandler)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.paths = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeImagesHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.paths.append(self.path)
+        try:
+            time.sleep(REQUEST_SECONDS)
+            if self.path.endswith("/images/generations"):
+                prompt = json.loads(body)["prompt"]
+            else:
+                # multipart/form-data: the prompt is one of the form fields
+                prompt = "edit fail" if b"fail" in body else "edit"
+            if "fail" in prompt:
+                # 400 is not retried by the client, so the failure is reported at once
+                status, payload = 400, {"error": {"message": "rejected prompt", "type": "invalid_request_error"}}
+            else:
+                color = (0, 0, 255) if prompt == "edit" else (255, 0, 0)
+                status, payload = 200, {"created": 0, "data": [{"b64_json": base64.b64encode(png_bytes(color)).decode()}]}
+        finally:
+            with server.lock:
+                server.active -= 1
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def images_api(tmp_path, monkeypatch):
+    server = FakeImagesAPI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(gpt_imagen_mcp, "MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(gpt_imagen_mcp, "REQUESTS_PER_MINUTE", 0)
+    monkeypatch.setattr(gpt_imagen_mcp, "_client", None)
+    monkeypatch.setattr(generation_cache, "_cache",
+                        generation_cache.GenerationCache(directory=str(tmp_path / "cache"), enabled=True))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run_batch(jobs):
+    return asyncio.run(gpt_imagen_mcp.generate_images_batch(jobs))
+
+
+def test_batch_respects_concurrency_limit_and_writes_files(images_api, tmp_path):
+    jobs = [{"prompt": f"picture {i}", "save_path": str(tmp_path / "out" / f"{i}.png")} for i in range(6)]
+    start = time.perf_counter()
+    lines = run_batch(jobs).splitlines()
+    elapsed = time.perf_counter() - start
+
+    assert lines[:-1] == [f"OK {job['save_path']}" for job in jobs]
+    assert lines[-1] == "6/6 images generated"
+    assert images_api.peak == 2
+    # Six requests two at a time take at least three request durations
+    assert elapsed >= 3 * REQUEST_SECONDS
+    for job in jobs:
+        with Image.open(job["save_path"]) as image:
+            assert image.getpixel((0, 0)) == (255, 0, 0)
+    assert not any(name.endswith(".part") for name in os.listdir(tmp_path / "out"))
+
+
+def test_batch_reports_failures_per_job(images_api, tmp_path):
+    reference = tmp_path / "reference.png"
+    reference.write_bytes(png_bytes((0, 255, 0)))
+    jobs = [
+        {"prompt": "picture", "save_path": str(tmp_path / "ok.png")},
+        {"prompt": "please fail", "save_path": str(tmp_path / "failed.png")},
+        {"prompt": "", "save_path": str(tmp_path / "missing_prompt.png")},
+        {"prompt": "edit", "save_path": str(tmp_path / "edited.png"), "image_paths": [str(reference)]},
+    ]
+    lines = run_batch(jobs).splitlines()
+
+    assert lines[0] == f"OK {tmp_path / 'ok.png'}"
+    assert lines[1].startswith(f"FAILED {tmp_path / 'failed.png'}: ") and "rejected prompt" in lines[1]
+    assert lines[2] == f"FAILED {tmp_path / 'missing_prompt.png'}: each job needs a prompt and a save_path"
+    assert lines[3] == f"OK {tmp_path / 'edited.png'}"
+    assert lines[4] == "2/4 images generated"
+    assert not (tmp_path / "failed.png").exists()
+    with Image.open(tmp_path / "edited.png") as image:
+        assert image.getpixel((0, 0)) == (0, 0, 255)
+    assert sorted(images_api.paths) == ["/v1/images/edits", "/v1/images/generations", "/v1/images/generations"]
+
+
+def test_batch_reuses_cached_images(images_api, tmp_path):
+    first = run_batch([{"prompt": "picture", "save_path": str(tmp_path / "first.png")}])
+    assert first.splitlines()[0] == f"OK {tmp_path / 'first.png'}"
+
+    lines = run_batch([
+        {"prompt": "picture", "save_path": str(tmp_path / "second.png")},
+        {"prompt": "picture", "save_path": str(tmp_path / "third.png"), "use_cache": False},
+    ]).splitlines()
+    assert lines[0] == f"OK {tmp_path / 'second.png'} (cached)"
+    assert lines[1] == f"OK {tmp_path / 'third.png'}"
+    assert (tmp_path / "second.png").read_bytes() == (tmp_path / "first.png").read_bytes()
+    assert images_api.paths == ["/v1/images/generations", "/v1/images/generations"]
@@ -48,6 +48,7 @@ class GroundingDINOTool(ToolTemplate):
 - 对于特定描述：使用详细描述（如 "red car, person wearing hat"）
 - 对于颜色或属性：包含修饰词（如 "blue shirt, wooden table"）
 - 批量处理时会自动处理整个目录的图像文件
+- 多张图像或多个查询时使用 detect_objects_batch 一次完成，每张图像只上传一次，不要逐个查询重复调用
 
 # 参数说明
 - box_threshold: 对象检测置信度阈值 (默认: 0.35)
@@ -0,0 +1,445 @@
+"""
+Detection backends for the Grounding DINO tools.
+
+grounding_dino_mcp.py talks to a DetectionBackend instead of calling Replicate
+directly. Backends are created once per server process (get_backend) and keep
+their client or model loaded between calls:
+
+- ReplicateBackend: adirik/grounding-dino on Replicate (default)
+- OnnxBackend: a Grounding DINO ONNX export run locally on CPU with ONNX Runtime
+
+Select the backend with GROUNDING_DINO_BACKEND=replicate|onnx. The ONNX backend
+reads GROUNDING_DINO_ONNX_MODEL (path to the .onnx file) and
+GROUNDING_DINO_TOKENIZER (tokenizer.json path or Hugging Face name, default
+bert-base-uncased), and needs the onnxruntime, tokenizers and numpy packages.
+
+Run this file directly to benchmark a backend offline:
+    python grounding_dino_backends.py --backend onnx --image photo.jpg --query "car, person" --runs 10
+"""
+
+import os
+import re
+import time
+import argparse
+import difflib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+try:
+    import replicate
+    REPLICATE_SUPPORT = True
+except ImportError:
+    REPLICATE_SUPPORT = False
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_SUPPORT = True
+except ImportError:
+    ONNX_SUPPORT = False
+
+REPLICATE_MODEL = "adirik/grounding-dino:efd10a8ddc57ea28773327e881ce95e20cc1d734c589f7dd01d2036921ed78aa"
+DEFAULT_BACKEND = os.getenv('GROUNDING_DINO_BACKEND', 'replicate')
+
+
+class DetectionBackend:
+    """
+    Interface of a Grounding DINO backend.
+
+    detect() returns {"detections": [{"bbox": [x1, y1, x2, y2], "label": str,
+    "confidence": float}, ...], "result_image_url": str or None}, with bbox in
+    pixels of the original image. Calls are blocking; async tools run them in
+    a worker thread.
+    """
+
+    name = "base"
+
+    def load(self) -> None:
+        """Load the model or client ahead of the first request (optional)."""
+
+    def detect(self, image_path: str, query: str, box_threshold: float = 0.35,
+               text_threshold: float = 0.25, show_visualisation: bool = False) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def detect_queries(self, image_path: str, queries: List[str], box_threshold: float = 0.35,
+                       text_threshold: float = 0.25) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Detect several text queries on one image.
+
+        The queries are sent as one combined caption, so the image is uploaded
+        and encoded once, and the detections are assigned back to the query
+        their label came from (see split_by_query). Queries a label cannot tell
+        apart ("car" for "red car" and "blue car") are run again on their own.
+
+        Returns:
+            {query: [detection, ...]} for every query
+        """
+        output = self.detect(image_path, ", ".join(queries), box_threshold, text_threshold, False)
+        grouped, ambiguous = split_by_query(output.get("detections", []), queries)
+        for query in ambiguous:
+            grouped[query] = self.detect(image_path, query, box_threshold, text_threshold, False).get("detections", [])
+        return grouped
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def query_candidates(label: str, queries: List[str]) -> List[str]:
+    """
+    Queries a detection label may belong to.
+
+    Grounding DINO labels are the caption tokens that scored above
+    text_threshold, so a label is usually a query or part of one ("car" for
+    "red car"). Picks the exact match, then the queries containing every word
+    of the label, then the queries sharing the most words, then the most
+    similar spelling. More than one candidate means the label alone cannot
+    tell those queries apart.
+    """
+    label_words = _words(label)
+    for query in queries:
+        if label_words == _words(query):
+            return [query]
+    if label_words:
+        containing = [query for query in queries if set(label_words) <= set(_words(query))]
+        if containing:
+            return containing
+
+    best, best_score = [], 0.0
+    for query in queries:
+        query_words = _words(query)
+        shared = len(set(label_words) & set(query_words))
+        score = shared / len(set(label_words) | set(query_words)) if shared else 0.0
+        if score > best_score:
+            best, best_score = [query], score
+        elif score and score == best_score:
+            best.append(query)
+    if best:
+        return best
+    normalized = " ".join(label_words)
+    return [max(queries, key=lambda query: difflib.SequenceMatcher(None, normalized, " ".join(_words(query))).ratio())]
+
+
+def match_query(label: str, queries: List[str]) -> str:
+    """Best query for a detection label (the first of query_candidates)."""
+    return query_candidates(label, queries)[0]
+
+
+def split_by_query(detections: List[Dict[str, Any]],
+                   queries: List[str]) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+    """
+    Group detections from a combined caption by the query each one matches.
+
+    Returns:
+        (grouped, ambiguous): grouped is {query: [detection, ...]} for every
+        query; ambiguous lists the queries that share a detection whose label
+        matches several of them, whose groups are incomplete and should be
+        detected separately
+    """
+    grouped: Dict[str, List[Dict[str, Any]]] = {query: [] for query in queries}
+    ambiguous: List[str] = []
+    for detection in detections:
+        candidates = query_candidates(detection.get("label", ""), queries)
+        if len(candidates) == 1:
+            grouped[candidates[0]].append(detection)
+        else:
+            ambiguous.extend(query for query in candidates if query not in ambiguous)
+    return grouped, [query for query in queries if query in ambiguous]
+
+
+class ReplicateBackend(DetectionBackend):
+    """adirik/grounding-dino on Replicate, with one client per process."""
+
+    name = "replicate"
+
+    def __init__(self, api_token: Optional[str] = None):
+        if not REPLICATE_SUPPORT:
+            raise RuntimeError("The replicate backend requires the replicate package")
+        self.client = replicate.Client(api_token=api_token or os.getenv('REPLICATE_API_TOKEN'))
+
+    def detect(self, image_path, query, box_threshold=0.35, text_threshold=0.25, show_visualisation=False):
+        with open(image_path, "rb") as image_file:
+            output = self.client.run(
+                REPLICATE_MODEL,
+                input={
+                    "image": image_file,
+                    "query": query,
+                    "box_threshold": box_threshold,
+                    "text_threshold": text_threshold,
+                    "show_visualisation": show_visualisation
+                }
+            )
+        return {
+            "detections": output.get("detections", []),
+            "result_image_url": str(output.get("result_image", "")) if output.get("result_image") else None
+        }
+
+
+# BERT ids of [CLS], [SEP], "." and "?" which delimit phrases in the caption
+_SPECIAL_TOKENS = [101, 102, 1012, 1029]
+_IMAGE_MEAN = (0.485, 0.456, 0.406)
+_IMAGE_STD = (0.229, 0.224, 0.225)
+
+
+class OnnxBackend(DetectionBackend):
+    """
+    Grounding DINO exported to ONNX, run on CPU with ONNX Runtime.
+
+    The session and tokenizer are created on first use and reused for every
+    later request. Pre- and post-processing follow the reference Grounding DINO
+    inference code (resize to 800 short side, sigmoid scores, phrases from the
+    tokens above text_threshold).
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: Optional[str] = None, tokenizer: Optional[str] = None,
+                 max_text_len: int = 256, num_threads: int = 0):
+        if not ONNX_SUPPORT:
+            raise RuntimeError("The onnx backend requires the onnxruntime, tokenizers and numpy packages")
+        self.model_path = model_path or os.getenv('GROUNDING_DINO_ONNX_MODEL')
+        if not self.model_path:
+            raise RuntimeError("Set GROUNDING_DINO_ONNX_MODEL to the Grounding DINO .onnx file")
+        self.tokenizer_name = tokenizer or os.getenv('GROUNDING_DINO_TOKENIZER', 'bert-base-uncased')
+        self.max_text_len = max_text_len
+        self.num_threads = num_threads
+        self.session = None
+        self.tokenizer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.session is not None:
+                return
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.num_threads:
+                options.intra_op_num_threads = self.num_threads
+            self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+            if self.tokenizer_name.endswith(".json"):
+                self.tokenizer = Tokenizer.from_file(self.tokenizer_name)
+            else:
+                self.tokenizer = Tokenizer.from_pretrained(self.tokenizer_name)
+            self.tokenizer.enable_truncation(self.max_text_len)
+
+    @staticmethod
+    def preprocess_image(image: Image.Image, size: int = 800, max_size: int = 1333):
+        """Resize (short side to size, long side at most max_size) and normalize to NCHW float32."""
+        width, height = image.size
+        scale = size / min(width, height)
+        if max(width, height) * scale > max_size:
+            scale = max_size / max(width, height)
+        resized = image.convert("RGB").resize((round(width * scale), round(height * scale)), Image.BILINEAR)
+        pixels = np.asarray(resized, dtype=np.float32) / 255.0
+        pixels = (pixels - np.array(_IMAGE_MEAN, dtype=np.float32)) / np.array(_IMAGE_STD, dtype=np.float32)
+        return pixels.transpose(2, 0, 1)[None]
+
+    @staticmethod
+    def split_phrases(query: str) -> List[str]:
+        """Phrases of a comma separated query, in caption order."""
+        return [phrase.strip() for phrase in query.lower().replace(".", ",").split(",") if phrase.strip()]
+
+    @classmethod
+    def build_caption(cls, query: str) -> str:
+        """Grounding DINO expects phrases separated by " . " and ending with " ."."""
+        return " . ".join(cls.split_phrases(query)) + " ."
+
+    @staticmethod
+    def phrase_index(input_ids):
+        """Index of the caption phrase each token belongs to, counting the "." separators before it."""
+        separators = np.asarray(input_ids) == _SPECIAL_TOKENS[2]
+        return np.cumsum(separators) - separators
+
+    @staticmethod
+    def text_masks(input_ids):
+        """Block-diagonal self-attention mask and position ids so phrases do not attend to each other."""
+        num_tokens = input_ids.shape[1]
+        attention = np.eye(num_tokens, dtype=bool)[None]
+        position_ids = np.zeros((1, num_tokens), dtype=np.int64)
+        previous = 0
+        for col in np.flatnonzero(np.isin(input_ids[0], _SPECIAL_TOKENS)):
+            if col == 0 or col == num_tokens - 1:
+                attention[0, col, col] = True
+            else:
+                attention[0, previous + 1:col + 1, previous + 1:col + 1] = True
+                position_ids[0, previous + 1:col + 1] = np.arange(col - previous)
+            previous = col
+        return attention, position_ids
+
+    def _feeds(self, pixels, encoding) -> Dict[str, Any]:
+        input_ids = np.array([encoding.ids], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask], dtype=np.int64)
+        text_self_attention, position_ids = self.text_masks(input_ids)
+        candidates = {
+            "img": pixels, "image": pixels, "images": pixels, "pixel_values": pixels,
+            "input_ids": input_ids,
+            "attention_mask": attention_mask.astype(bool),
+            "token_type_ids": np.zeros_like(input_ids),
+            "position_ids": position_ids,
+            "text_token_mask": text_self_attention,
+            "text_self_attention_masks": text_self_attention,
+        }
+        feeds = {}
+        for model_input in self.session.get_inputs():
+            if model_input.name not in candidates:
+                raise RuntimeError(f"Unsupported ONNX input '{model_input.name}'")
+            value = candidates[model_input.name]
+            # Exports differ in whether masks are bool or int64
+            if model_input.type == "tensor(int64)" and value.dtype == bool:
+                value = value.astype(np.int64)
+            elif model_input.type == "tensor(bool)" and value.dtype != bool:
+                value = value.astype(bool)
+            feeds[model_input.name] = value
+        return feeds
+
+    def _outputs(self, results) -> tuple:
+        named = {output.name: value for output, value in zip(self.session.get_outputs(), results)}
+        logits = named.get("logits", named.get("pred_logits", results[0]))
+        boxes = named.get("boxes", named.get("pred_boxes", results[1]))
+        return logits[0], boxes[0]
+
+    def _load_pixels(self, image_path: str):
+        with Image.open(image_path) as image:
+            width, height = image.size
+            return self.preprocess_image(image), width, height
+
+    def _detect_pixels(self, pixels, width: int, height: int, query: str,
+                       box_threshold: float, text_threshold: float) -> List[Tuple[int, Dict[str, Any]]]:
+        """Detections sorted by confidence, each with the index of the caption phrase it scored highest on."""
+        encoding = self.tokenizer.encode(self.build_caption(query))
+
+        logits, boxes = self._outputs(self.session.run(None, self._feeds(pixels, encoding)))
+        scores = 1.0 / (1.0 + np.exp(-logits[:, :len(encoding.ids)]))
+        is_text = ~np.isin(encoding.ids, _SPECIAL_TOKENS)
+        phrases = self.phrase_index(encoding.ids)
+
+        detections = []
+        for query_scores, box in zip(scores, boxes):
+            confidence = float(query_scores.max())
+            if confidence <= box_threshold:
+                continue
+            token_ids = [encoding.ids[i] for i in np.flatnonzero(query_scores > text_threshold)
+                         if encoding.ids[i] not in _SPECIAL_TOKENS]
+            cx, cy, w, h = (float(v) for v in box)
+            phrase = int(phrases[np.argmax(np.where(is_text, query_scores, -1.0))])
+            detections.append((phrase, {
+                "bbox": [round((cx - w / 2) * width), round((cy - h / 2) * height),
+                         round((cx + w / 2) * width), round((cy + h / 2) * height)],
+                "label": self.tokenizer.decode(token_ids).strip() or "object",
+                "confidence": confidence
+            }))
+        detections.sort(key=lambda item: item[1]["confidence"], reverse=True)
+        return detections
+
+    def _caption_groups(self, queries: List[str]) -> List[List[str]]:
+        """Split queries into groups whose combined caption fits in max_text_len tokens."""
+        groups, current = [], []
+        for query in queries:
+            candidate = current + [query]
+            if current and len(self.tokenizer.encode(self.build_caption(", ".join(candidate))).ids) > self.max_text_len:
+                groups.append(current)
+                candidate = [query]
+            current = candidate
+        if current:
+            groups.append(current)
+        return groups
+
+    def detect(self, image_path, query, box_threshold=0.35, text_threshold=0.25, show_visualisation=False):
+        self.load()
+        pixels, width, height = self._load_pixels(image_path)
+        detections = self._detect_pixels(pixels, width, height, query, box_threshold, text_threshold)
+        return {"detections": [detection for _, detection in detections], "result_image_url": None}
+
+    def detect_queries(self, image_path, queries, box_threshold=0.35, text_threshold=0.25):
+        # The image is decoded and preprocessed once; one session run per caption
+        # group, which is a single run unless the queries overflow max_text_len.
+        # Detections go to the query owning the caption phrase they scored on,
+        # so queries sharing words ("red car", "blue car") are kept apart.
+        self.load()
+        pixels, width, height = self._load_pixels(image_path)
+        grouped: Dict[str, List[Dict[str, Any]]] = {query: [] for query in queries}
+        for group in self._caption_groups(queries):
+            owners = [query for query in group for _ in self.split_phrases(query)] or group
+            detections = self._detect_pixels(pixels, width, height, ", ".join(group), box_threshold, text_threshold)
+            for phrase, detection in detections:
+                grouped[owners[min(phrase, len(owners) - 1)]].append(detection)
+        return grouped
+
+
+BACKENDS = {
+    ReplicateBackend.name: ReplicateBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+_backends: Dict[str, DetectionBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None) -> DetectionBackend:
+    """
+    Get the process-wide instance of a backend, creating it on first use.
+
+    Args:
+        name: Backend name ("replicate" or "onnx"), defaults to GROUNDING_DINO_BACKEND
+
+    Returns:
+        DetectionBackend kept alive for the lifetime of the process
+    """
+    name = (name or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown Grounding DINO backend '{name}', choose from: {', '.join(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+def draw_detections(image_path: str, detections: List[Dict[str, Any]], save_path: str) -> str:
+    """Draw detection boxes and labels on the image, for backends without a hosted visualisation."""
+    with Image.open(image_path) as image:
+        annotated = image.convert("RGB")
+    draw = ImageDraw.Draw(annotated)
+    line_width = max(2, round(min(annotated.size) / 300))
+    for detection in detections:
+        x1, y1, x2, y2 = detection["bbox"]
+        draw.rectangle([x1, y1, x2, y2], outline=(255, 0, 0), width=line_width)
+        draw.text((x1 + line_width, y1 + line_width),
+                  f"{detection['label']} {detection['confidence']:.2f}", fill=(255, 0, 0))
+    annotated.save(save_path)
+    return save_path
+
+
+def benchmark(backend_name: str, image_path: str, query: str, runs: int = 5) -> Dict[str, float]:
+    """Time backend loading and repeated detections on one image."""
+    start = time.perf_counter()
+    backend = get_backend(backend_name)
+    backend.load()
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    detections = []
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        detections = backend.detect(image_path, query)["detections"]
+        latencies.append(time.perf_counter() - start)
+    first = latencies[0]
+    latencies.sort()
+    return {
+        "load_seconds": round(load_time, 3),
+        "first_seconds": round(first, 3),
+        "median_seconds": round(latencies[len(latencies) // 2], 3),
+        "detections": len(detections),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a Grounding DINO backend")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, choices=list(BACKENDS))
+    parser.add_argument('--image', required=True)
+    parser.add_argument('--query', required=True)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    print(benchmark(args.backend, args.image, args.query, args.runs))
@@ -3,18 +3,26 @@ import asyncio
 from typing import Any, Optional, List
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
-import replicate
 import httpx
 from urllib.parse import urlparse
 import json
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
+from grounding_dino_backends import get_backend, draw_detections
+
 # Load environment variables
 load_dotenv()
 
 # Initialize FastMCP server
 mcp = FastMCP("grounding_dino")
 
+# Images detected at the same time by detect_objects_batch
+BATCH_CONCURRENCY = int(os.getenv('GROUNDING_DINO_BATCH_CONCURRENCY', '4'))
+# Threads encoding crops in detect_and_crop_objects, and the zlib level of PNG crops
+CROP_WORKERS = int(os.getenv('GROUNDING_DINO_CROP_WORKERS', str(min(8, os.cpu_count() or 1))))
+PNG_COMPRESS_LEVEL = int(os.getenv('GROUNDING_DINO_PNG_COMPRESS_LEVEL', '1'))
+
 def normalize_path(path: str) -> str:
     """
     Normalize a file path by expanding ~ to user's home directory
@@ -62,9 +70,10 @@ async def detect_objects_with_grounding_dino(
     """
     Detect objects in an image using Grounding DINO model with text queries.
     
-    This tool uses the adirik/grounding-dino model on Replicate to detect and locate
-    objects in images based on natural language descriptions. It can detect arbitrary
-    objects described in text format.
+    This tool uses the adirik/grounding-dino model (on Replicate, or a local ONNX
+    model when GROUNDING_DINO_BACKEND=onnx) to detect and locate objects in images
+    based on natural language descriptions. It can detect arbitrary objects
+    described in text format.
     
     Args:
         image_path (str): Path to the input image file
@@ -96,40 +105,27 @@ async def detect_objects_with_grounding_dino(
         # Ensure save directory exists
         os.makedirs(save_directory, exist_ok=True)
         
-        # Initialize Replicate client
-        client = replicate.Client(api_token=os.getenv('REPLICATE_API_TOKEN'))
-        
-        # Run the Grounding DINO model
-        output = client.run(
-            "adirik/grounding-dino:efd10a8ddc57ea28773327e881ce95e20cc1d734c589f7dd01d2036921ed78aa",
-            input={
-                "image": open(image_path, "rb"),
-                "query": query,
-                "box_threshold": box_threshold,
-                "text_threshold": text_threshold,
-                "show_visualisation": show_visualisation
-            }
+        # Run the detection backend (kept loaded for the server's lifetime) off the event loop
+        output = await asyncio.to_thread(
+            get_backend().detect, image_path, query, box_threshold, text_threshold, show_visualisation
         )
         
-        # Prepare serializable results
-        serializable_output = {
-            "detections": output.get("detections", []),
-            "result_image_url": str(output.get("result_image", "")) if output.get("result_image") else None
-        }
-        
         # Save detection results to JSON file
         results_file = os.path.join(save_directory, "detection_results.json")
         with open(results_file, 'w', encoding='utf-8') as f:
-            json.dump(serializable_output, f, indent=2, ensure_ascii=False)
+            json.dump(output, f, indent=2, ensure_ascii=False)
         
-        # Download annotated image if visualization is enabled
+        # Download the annotated image if the backend produced one, otherwise draw it locally
+        detections = output.get("detections", [])
         annotated_image_path = None
-        if show_visualisation and output.get("result_image"):
+        if show_visualisation:
             annotated_image_path = os.path.join(save_directory, "annotated_image.png")
-            await download_file(str(output["result_image"]), annotated_image_path)
+            if output.get("result_image_url"):
+                await download_file(output["result_image_url"], annotated_image_path)
+            else:
+                await asyncio.to_thread(draw_detections, image_path, detections, annotated_image_path)
         
         # Format detection results
-        detections = output.get("detections", [])
         result_text = f"Object Detection Results for query: '{query}'\n"
         result_text += f"Total objects detected: {len(detections)}\n\n"
         
@@ -157,6 +153,127 @@ async def detect_objects_with_grounding_dino(
     except Exception as e:
         return f"Error during object detection: {str(e)}"
 
+@mcp.tool()
+async def detect_objects_batch(
+    image_paths: List[str],
+    queries: List[str],
+    box_threshold: float = 0.35,
+    text_threshold: float = 0.25,
+    save_directory: str = ""
+) -> str:
+    """
+    Detect several text queries on several images in one call.
+
+    Every query is detected on every image. All queries for an image are sent
+    to the model together, so each image is uploaded and encoded only once,
+    and the images are processed in parallel. Use this instead of calling
+    detect_objects_with_grounding_dino once per query or per image.
+
+    Args:
+        image_paths (List[str]): Paths of the input images
+        queries (List[str]): Text descriptions of objects to detect, one object per entry (e.g., ["person", "red car"])
+        box_threshold (float): Confidence level for object detection (default: 0.35)
+        text_threshold (float): Confidence level for text matching (default: 0.25)
+        save_directory (str): Directory where the JSON results will be saved (optional)
+
+    Returns:
+        str: Table of detections per image and query, and the results file path
+    """
+    try:
+        queries = list(dict.fromkeys(query.strip() for query in queries if query.strip()))
+        if not queries:
+            return "Error: No queries given"
+        image_paths = [normalize_path(path) for path in image_paths]
+        if not image_paths:
+            return "Error: No images given"
+
+        if not save_directory.strip():
+            save_directory = os.path.join(os.path.dirname(image_paths[0]), "GROUNDING_DINO_BATCH_RESULTS")
+        else:
+            save_directory = normalize_path(save_directory)
+        os.makedirs(save_directory, exist_ok=True)
+
+        backend = get_backend()
+        semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+        async def detect_image(path: str) -> dict:
+            if not os.path.exists(path):
+                return {"image": path, "error": "Image file not found"}
+            async with semaphore:
+                try:
+                    grouped = await asyncio.to_thread(
+                        backend.detect_queries, path, queries, box_threshold, text_threshold
+                    )
+                except Exception as e:
+                    return {"image": path, "error": str(e)}
+            return {"image": path, "results": grouped}
+
+        results = await asyncio.gather(*(detect_image(path) for path in image_paths))
+
+        results_file = os.path.join(save_directory, "batch_detection_results.json")
+        with open(results_file, 'w', encoding='utf-8') as f:
+            json.dump({"queries": queries, "images": results}, f, ensure_ascii=False)
+
+        # One row per detection; queries with no detections get an empty row
+        total = 0
+        rows = []
+        for result in results:
+            image_name = os.path.basename(result["image"])
+            if "error" in result:
+                rows.append(f"| {image_name} | - | error: {result['error']} | - | - |")
+                continue
+            for query in queries:
+                detections = result["results"].get(query, [])
+                total += len(detections)
+                if not detections:
+                    rows.append(f"| {image_name} | {query} | (none) | - | - |")
+                for detection in detections:
+                    x1, y1, x2, y2 = detection.get("bbox", [0, 0, 0, 0])
+                    rows.append(f"| {image_name} | {query} | {detection.get('label', 'unknown')} | "
+                                f"{detection.get('confidence', 0.0):.3f} | [{x1}, {y1}, {x2}, {y2}] |")
+
+        result_text = f"Batch detection: {len(image_paths)} images x {len(queries)} queries, {total} objects detected\n\n"
+        result_text += "| Image | Query | Label | Confidence | Bounding Box [x1, y1, x2, y2] |\n"
+        result_text += "|---|---|---|---|---|\n"
+        result_text += "\n".join(rows)
+        result_text += f"\n\nDetection results: {results_file}"
+        return result_text
+
+    except Exception as e:
+        return f"Error during batch object detection: {str(e)}"
+
+_CROP_EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+def save_crop(image: Image.Image, box: tuple, save_path: str, crop_format: str, quality: int) -> None:
+    """Crop one region of a loaded image and encode it to disk."""
+    cropped_image = image.crop(box)
+    if crop_format == "png":
+        cropped_image.save(save_path, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+        return
+    if crop_format == "jpeg" and cropped_image.mode not in ("RGB", "L"):
+        cropped_image = cropped_image.convert("RGB")
+    cropped_image.save(save_path, format=crop_format.upper(), quality=quality)
+
+def save_crops(image_path: str, jobs: List[tuple], crop_format: str, quality: int) -> None:
+    """
+    Decode the image once and encode all crops in a thread pool.
+
+    Pillow releases the GIL while encoding, so crops are written in parallel.
+
+    Args:
+        image_path: Original image
+        jobs: (box, save_path) pairs
+        crop_format: "png", "jpeg" or "webp"
+        quality: JPEG/WebP quality
+    """
+    with Image.open(image_path) as image:
+        image.load()
+        with ThreadPoolExecutor(max_workers=max(1, min(CROP_WORKERS, len(jobs)))) as executor:
+            futures = [executor.submit(save_crop, image, box, save_path, crop_format, quality)
+                       for box, save_path in jobs]
+            for future in futures:
+                future.result()
+
 @mcp.tool()
 async def detect_and_crop_objects(
     image_path: str,
@@ -164,7 +281,10 @@ async def detect_and_crop_objects(
     box_threshold: float = 0.35,
     text_threshold: float = 0.25,
     save_directory: str = "",
-    padding: int = 10
+    padding: int = 10,
+    crop_format: str = "png",
+    crop_quality: int = 90,
+    save_crops_to_disk: bool = True
 ) -> str:
     """
     Detect objects in an image and crop them out as separate images.
@@ -179,11 +299,23 @@ async def detect_and_crop_objects(
         text_threshold (float): Confidence level for text matching (default: 0.25)
         save_directory (str): Directory where cropped images will be saved (optional)
         padding (int): Extra pixels to add around each crop (default: 10)
+        crop_format (str): "png" (lossless, default), "jpeg" or "webp"; JPEG and WebP are much faster to write
+        crop_quality (int): JPEG/WebP quality from 1 to 100 (default: 90)
+        save_crops_to_disk (bool): If False, no crop files are written and each detection only carries its
+                                   crop_box [x1, y1, x2, y2]; pass image_path and crop_box to the VQA tools
+                                   to analyse the region directly (default: True)
     
     Returns:
         str: JSON string containing detection results and list of cropped image paths
     """
     try:
+        crop_format = crop_format.lower().replace("jpg", "jpeg")
+        if crop_format not in _CROP_EXTENSIONS:
+            return json.dumps({
+                "error": f"Unsupported crop_format '{crop_format}', expected png, jpeg or webp",
+                "cropped_images": []
+            })
+
         # Normalize image path
         image_path = normalize_path(image_path)
         
@@ -205,19 +337,9 @@ async def detect_and_crop_objects(
         # Ensure save directory exists
         os.makedirs(save_directory, exist_ok=True)
         
-        # Initialize Replicate client
-        client = replicate.Client(api_token=os.getenv('REPLICATE_API_TOKEN'))
-        
-        # Run the Grounding DINO model
-        output = client.run(
-            "adirik/grounding-dino:efd10a8ddc57ea28773327e881ce95e20cc1d734c589f7dd01d2036921ed78aa",
-            input={
-                "image": open(image_path, "rb"),
-                "query": query,
-                "box_threshold": box_threshold,
-                "text_threshold": text_threshold,
-                "show_visualisation": False  # We don't need the annotated image for cropping
-            }
+        # Run the detection backend; no annotated image is needed for cropping
+        output = await asyncio.to_thread(
+            get_backend().detect, image_path, query, box_threshold, text_threshold, False
         )
         
         # Get detections
@@ -231,14 +353,14 @@ async def detect_and_crop_objects(
                 "cropped_images": []
             })
         
-        # Open the original image for cropping
-        original_image = Image.open(image_path)
-        image_width, image_height = original_image.size
+        # Only the header is read here; pixels are decoded once in save_crops
+        with Image.open(image_path) as original_image:
+            image_width, image_height = original_image.size
         
-        cropped_image_paths = []
+        crop_jobs = []
         detection_results = []
         
-        # Process each detection
+        # Compute the crop box of each detection
         for i, detection in enumerate(detections, 1):
             bbox = detection.get("bbox", [])
             label = detection.get("label", "unknown")
@@ -255,27 +377,28 @@ async def detect_and_crop_objects(
             x2 = min(image_width, int(x2) + padding)
             y2 = min(image_height, int(y2) + padding)
             
-            # Crop the object
-            cropped_image = original_image.crop((x1, y1, x2, y2))
-            
-            # Generate filename for cropped image
-            safe_label = label.replace(" ", "_").replace("/", "_").replace("\\", "_")
-            crop_filename = f"{safe_label}_{i}_conf{confidence:.2f}.png"
-            crop_path = os.path.join(save_directory, crop_filename)
-            
-            # Save cropped image
-            cropped_image.save(crop_path)
-            cropped_image_paths.append(crop_path)
-            
-            # Add detection info
-            detection_results.append({
+            detection_result = {
                 "index": i,
                 "label": label,
                 "confidence": confidence,
                 "bbox": bbox,
-                "cropped_image_path": crop_path,
+                "crop_box": [x1, y1, x2, y2],
                 "crop_size": [x2 - x1, y2 - y1]
-            })
+            }
+            
+            if save_crops_to_disk:
+                # Generate filename for cropped image
+                safe_label = label.replace(" ", "_").replace("/", "_").replace("\\", "_")
+                crop_filename = f"{safe_label}_{i}_conf{confidence:.2f}.{_CROP_EXTENSIONS[crop_format]}"
+                crop_path = os.path.join(save_directory, crop_filename)
+                crop_jobs.append(((x1, y1, x2, y2), crop_path))
+                detection_result["cropped_image_path"] = crop_path
+            
+            detection_results.append(detection_result)
+        
+        if crop_jobs:
+            await asyncio.to_thread(save_crops, image_path, crop_jobs, crop_format, crop_quality)
+        cropped_image_paths = [crop_path for _, crop_path in crop_jobs]
         
         # Save detection results with cropped paths
         results_file = os.path.join(save_directory, "detection_and_crop_results.json")
@@ -289,18 +412,24 @@ async def detect_and_crop_objects(
         }
         
         with open(results_file, 'w', encoding='utf-8') as f:
-            json.dump(full_results, f, indent=2, ensure_ascii=False)
+            json.dump(full_results, f, ensure_ascii=False, separators=(",", ":"))
+        
+        if save_crops_to_disk:
+            message = f"Successfully detected and cropped {len(detections)} objects"
+        else:
+            message = f"Successfully detected {len(detections)} objects; use original_image with each crop_box"
         
         # Return summary as JSON string
         return json.dumps({
-            "message": f"Successfully detected and cropped {len(detections)} objects",
+            "message": message,
             "query": query,
             "total_detections": len(detections),
+            "original_image": image_path,
             "cropped_images": cropped_image_paths,
             "detections": detection_results,
             "save_directory": save_directory,
             "results_file": results_file
-        }, ensure_ascii=False, indent=2)
+        }, ensure_ascii=False, separators=(",", ":"))
         
     except Exception as e:
         return json.dumps({
@@ -0,0 +1,226 @@
+"""
+Grounding DINO Backend Tests
+
+Runs the ONNX backend end to end on a tiny ONNX graph and a word-level
+tokenizer built on the fly, so no model download is needed. The graph has
+the inputs and outputs of a Grounding DINO export: every query slot scores
+one token id inside one phrase of the caption and returns a fixed box.
+
+License: MIT License
+"""
+
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+tokenizers = pytest.importorskip("tokenizers")
+np = pytest.importorskip("numpy")
+from onnx import TensorProto, helper
+
+# Add the parent directory to the Python path so we can import modules from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grounding_dino_backends as backends
+
+VOCAB = {"[UNK]": 100, "[CLS]": 101, "[SEP]": 102, ".": 1012, "?": 1029,
+         "car": 2000, "person": 2001, "red": 2002, "blue": 2003, "tree": 2004}
+BOXES = [[0.5, 0.5, 0.2, 0.4], [0.25, 0.25, 0.1, 0.1]]
+
+
+def write_tokenizer(path):
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+
+    tokenizer = Tokenizer(models.WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 101), ("[SEP]", 102)])
+    tokenizer.save(str(path))
+    return str(path)
+
+
+def write_model(path, targets):
+    """
+    One query slot per (word, phrase index) target: the logit is +10 on that
+    word inside that phrase and -10 everywhere else.
+    """
+    nodes = [
+        helper.make_node("Equal", ["input_ids", "dot_id"], ["is_dot"]),
+        helper.make_node("Cast", ["is_dot"], ["dots"], to=TensorProto.INT64),
+        helper.make_node("CumSum", ["dots", "axis_1"], ["phrase"]),
+    ]
+    initializers = [
+        helper.make_tensor("dot_id", TensorProto.INT64, [], [1012]),
+        helper.make_tensor("axis_1", TensorProto.INT64, [], [1]),
+        helper.make_tensor("scale", TensorProto.FLOAT, [], [20.0]),
+        helper.make_tensor("offset", TensorProto.FLOAT, [], [10.0]),
+        helper.make_tensor("zero", TensorProto.FLOAT, [], [0.0]),
+        helper.make_tensor("unsqueeze_axes", TensorProto.INT64, [1], [1]),
+        helper.make_tensor("box_values", TensorProto.FLOAT, [1, len(targets), 4],
+                           [v for box in BOXES[:len(targets)] for v in box]),
+    ]
+    slots = []
+    for index, (word, phrase) in enumerate(targets):
+        initializers += [
+            helper.make_tensor(f"word_{index}", TensorProto.INT64, [], [VOCAB[word]]),
+            helper.make_tensor(f"phrase_{index}", TensorProto.INT64, [], [phrase]),
+        ]
+        nodes += [
+            helper.make_node("Equal", ["input_ids", f"word_{index}"], [f"is_word_{index}"]),
+            helper.make_node("Equal", ["phrase", f"phrase_{index}"], [f"in_phrase_{index}"]),
+            helper.make_node("And", [f"is_word_{index}", f"in_phrase_{index}"], [f"hit_{index}"]),
+            helper.make_node("Cast", [f"hit_{index}"], [f"hit_float_{index}"], to=TensorProto.FLOAT),
+            helper.make_node("Mul", [f"hit_float_{index}", "scale"], [f"scaled_{index}"]),
+            helper.make_node("Sub", [f"scaled_{index}", "offset"], [f"slot_{index}"]),
+            helper.make_node("Unsqueeze", [f"slot_{index}", "unsqueeze_axes"], [f"logits_{index}"]),
+        ]
+        slots.append(f"logits_{index}")
+    nodes += [
+        helper.make_node("Concat", slots, ["logits"], axis=1),
+        # Boxes do not depend on the image, but the image input must be consumed
+        helper.make_node("ReduceMean", ["img"], ["img_mean"], keepdims=0),
+        helper.make_node("Mul", ["img_mean", "zero"], ["img_zero"]),
+        helper.make_node("Add", ["box_values", "img_zero"], ["boxes"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny_grounding_dino",
+        [helper.make_tensor_value_info("img", TensorProto.FLOAT, [1, 3, "height", "width"]),
+         helper.make_tensor_value_info("input_ids", TensorProto.INT64, [1, "tokens"])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, [1, len(targets), "tokens"]),
+         helper.make_tensor_value_info("boxes", TensorProto.FLOAT, [1, len(targets), 4])],
+        initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    onnx.save(model, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def onnx_backend(tmp_path, monkeypatch):
+    """Factory for the process-wide ONNX backend on a tiny model with the given targets."""
+    def make(targets):
+        monkeypatch.setenv("GROUNDING_DINO_ONNX_MODEL", write_model(tmp_path / "model.onnx", targets))
+        monkeypatch.setenv("GROUNDING_DINO_TOKENIZER", write_tokenizer(tmp_path / "tokenizer.json"))
+        return backends.get_backend("onnx")
+
+    monkeypatch.setattr(backends, "_backends", {})
+    return make
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "image.png"
+    Image.new("RGB", (400, 200), (90, 120, 60)).save(path)
+    return str(path)
+
+
+def test_get_backend_returns_one_instance(onnx_backend):
+    backend = onnx_backend([("car", 0)])
+    assert isinstance(backend, backends.OnnxBackend)
+    assert backends.get_backend("onnx") is backend
+
+
+def test_get_backend_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        backends.get_backend("nonexistent")
+
+
+def test_detect_loads_model_once(onnx_backend, image_path):
+    backend = onnx_backend([("car", 0)])
+    backend.detect(image_path, "car")
+    session = backend.session
+    backend.detect(image_path, "car")
+    assert backend.session is session
+
+
+def test_preprocess_image_resizes_short_side_and_normalizes():
+    pixels = backends.OnnxBackend.preprocess_image(Image.new("RGB", (400, 200), (255, 255, 255)))
+    # 800 on the short side would make the long side 1600, so the long side is capped at 1333
+    assert pixels.shape == (1, 3, 666, 1333)
+    assert pixels.dtype == np.float32
+    expected = (1.0 - np.array(backends._IMAGE_MEAN)) / np.array(backends._IMAGE_STD)
+    assert np.allclose(pixels[0, :, 0, 0], expected, atol=1e-5)
+
+
+def test_detect_returns_pixel_boxes_and_labels(onnx_backend, image_path):
+    backend = onnx_backend([("car", 0), ("person", 1)])
+    result = backend.detect(image_path, "car, person")
+    assert result["result_image_url"] is None
+    detections = {detection["label"]: detection for detection in result["detections"]}
+    assert set(detections) == {"car", "person"}
+    # Box (cx, cy, w, h) = (0.5, 0.5, 0.2, 0.4) on a 400x200 image
+    assert detections["car"]["bbox"] == [160, 60, 240, 140]
+    assert detections["person"]["bbox"] == [80, 40, 120, 60]
+    assert detections["car"]["confidence"] > 0.99
+
+
+def test_detect_applies_box_threshold(onnx_backend, image_path):
+    backend = onnx_backend([("car", 0), ("person", 1)])
+    # "person" is not in the caption, so its query slot scores nothing
+    detections = backend.detect(image_path, "car")["detections"]
+    assert [detection["label"] for detection in detections] == ["car"]
+
+
+def test_detect_queries_maps_shared_words_by_phrase(onnx_backend, image_path):
+    # Only the "car" token of the second phrase scores, so the detection is
+    # labelled "car" but belongs to "blue car"
+    backend = onnx_backend([("car", 1)])
+    grouped = backend.detect_queries(image_path, ["red car", "blue car"])
+    assert grouped["red car"] == []
+    assert [detection["label"] for detection in grouped["blue car"]] == ["car"]
+
+
+def test_detect_queries_splits_distinct_queries(onnx_backend, image_path):
+    backend = onnx_backend([("car", 0), ("person", 1)])
+    grouped = backend.detect_queries(image_path, ["car", "person", "tree"])
+    assert [detection["label"] for detection in grouped["car"]] == ["car"]
+    assert [detection["label"] for detection in grouped["person"]] == ["person"]
+    assert grouped["tree"] == []
+
+
+class StubBackend(backends.DetectionBackend):
+    """Backend answering from a {caption: [label, ...]} table, recording every caption it is asked."""
+
+    name = "stub"
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.captions = []
+
+    def detect(self, image_path, query, box_threshold=0.35, text_threshold=0.25, show_visualisation=False):
+        self.captions.append(query)
+        return {"detections": [{"bbox": [0, 0, 1, 1], "label": label, "confidence": 0.9}
+                               for label in self.labels.get(query, [])],
+                "result_image_url": None}
+
+
+def test_query_candidates():
+    assert backends.query_candidates("red car", ["red car", "car"]) == ["red car"]
+    assert backends.query_candidates("car", ["red car", "person"]) == ["red car"]
+    assert backends.query_candidates("car", ["red car", "blue car"]) == ["red car", "blue car"]
+    assert backends.match_query("persn", ["car", "person"]) == "person"
+
+
+def test_detect_queries_runs_ambiguous_queries_separately():
+    backend = StubBackend({
+        "red car, blue car, person": ["car", "person"],
+        "red car": ["red car"],
+        "blue car": [],
+    })
+    grouped = backend.detect_queries("image.png", ["red car", "blue car", "person"])
+    assert backend.captions == ["red car, blue car, person", "red car", "blue car"]
+    assert [detection["label"] for detection in grouped["red car"]] == ["red car"]
+    assert grouped["blue car"] == []
+    assert [detection["label"] for detection in grouped["person"]] == ["person"]
+
+
+def test_detect_queries_single_run_without_ambiguity():
+    backend = StubBackend({"car, person": ["car", "person", "car"]})
+    grouped = backend.detect_queries("image.png", ["car", "person"])
+    assert backend.captions == ["car, person"]
+    assert len(grouped["car"]) == 2 and len(grouped["person"]) == 1
@@ -2,6 +2,14 @@ import cv2
 import numpy as np
 import urllib.request
 import os
+import time
+import json
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from uuid import uuid4
 from urllib.parse import urlparse
 
@@ -9,6 +17,17 @@ from mcp.server.fastmcp import FastMCP
 
 mcp = FastMCP("laplacian_blending")
 
+# 分块融合：每块的边长（像素，会对齐到 2**levels 的倍数）与总内存预算
+DEFAULT_TILE_SIZE = int(os.getenv('LAPLACIAN_TILE_SIZE', '2048'))
+DEFAULT_MAX_MEMORY_MB = int(os.getenv('LAPLACIAN_MAX_MEMORY_MB', '2048'))
+# 每个块每像素大约占用的字节数：A、B、mask 的高斯/拉普拉斯金字塔及融合金字塔均为 3 通道 float32
+_BYTES_PER_TILE_PIXEL = 128
+
+# 批量融合：工作进程数与每个进程的金字塔缓存上限
+DEFAULT_BATCH_WORKERS = int(os.getenv('LAPLACIAN_BATCH_WORKERS', str(os.cpu_count() or 1)))
+PYRAMID_CACHE_MB = int(os.getenv('LAPLACIAN_PYRAMID_CACHE_MB', '512'))
+_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
 def load_image(path_or_url):
     """从 URL 或本地路径加载图像"""
     if urlparse(path_or_url).scheme in ('http', 'https'):
@@ -26,63 +45,33 @@ def load_image(path_or_url):
         raise ValueError(f"无法读取图像: {path_or_url}")
     return image
 
-@mcp.tool()
-def laplacian_blending(path_A, path_B, path_mask, output_dir="output", levels=6):
-    """Blend two images using Laplacian pyramid blending with a mask.
-    
-    Args:
-        image_a_path: Path/URL to the first input image
-        image_b_path: Path/URL to the second input image
-        mask_path: Path/URL to the mask image (white=use image A, black=use image B)
-        output_dir: Directory to save the blended result (default: "output")
-        pyramid_levels: Number of pyramid levels for blending (default: 6)
-        
-    Returns:
-        str: Path to the saved blended image
-        
-    Raises:
-        ValueError: If any input image is invalid or cannot be loaded
-    """
-    # 加载图像
-    A = load_image(path_A)
-    B = load_image(path_B)
-    M = load_image(path_mask)
+def build_pyramid(img, levels):
+    gp = [img.astype(np.float32)]
+    for _ in range(levels):
+        img = cv2.pyrDown(img)
+        gp.append(img.astype(np.float32))
+    return gp
 
-    # 尺寸对齐
-    min_shape = (min(A.shape[0], B.shape[0]), min(A.shape[1], B.shape[1]))
-    A = cv2.resize(A, (min_shape[1], min_shape[0]))
-    B = cv2.resize(B, (min_shape[1], min_shape[0]))
-    M = cv2.resize(M, (min_shape[1], min_shape[0]))
+def build_laplacian_pyramid(gp):
+    lp = []
+    for i in range(len(gp) - 1):
+        GE = cv2.pyrUp(gp[i + 1], dstsize=(gp[i].shape[1], gp[i].shape[0]))
+        L = cv2.subtract(gp[i], GE)
+        lp.append(L)
+    lp.append(gp[-1])
+    return lp
 
-    # 处理 mask
-    if len(M.shape) == 3:
-        M = cv2.cvtColor(M, cv2.COLOR_BGR2GRAY)
+def laplacian_pyramid(img, levels):
+    """BGR uint8 图像的拉普拉斯金字塔"""
+    return build_laplacian_pyramid(build_pyramid(np.ascontiguousarray(img), levels))
+
+def mask_pyramid(M, levels):
+    """单通道 uint8 mask 的三通道 float 高斯金字塔"""
     M = M.astype(np.float32) / 255.0
-    M = cv2.merge([M, M, M])
-
-    # 构建金字塔
-    def build_pyramid(img, levels):
-        gp = [img.astype(np.float32)]
-        for _ in range(levels):
-            img = cv2.pyrDown(img)
-            gp.append(img.astype(np.float32))
-        return gp
-
-    def build_laplacian_pyramid(gp):
-        lp = []
-        for i in range(len(gp) - 1):
-            GE = cv2.pyrUp(gp[i + 1], dstsize=(gp[i].shape[1], gp[i].shape[0]))
-            L = cv2.subtract(gp[i], GE)
-            lp.append(L)
-        lp.append(gp[-1])
-        return lp
-
-    gpA = build_pyramid(A, levels)
-    gpB = build_pyramid(B, levels)
-    gpM = build_pyramid(M, levels)
-    lpA = build_laplacian_pyramid(gpA)
-    lpB = build_laplacian_pyramid(gpB)
+    return build_pyramid(cv2.merge([M, M, M]), levels)
 
+def collapse_blend(lpA, lpB, gpM, levels):
+    """按 mask 金字塔融合两个拉普拉斯金字塔并重构为 uint8 图像"""
     # 融合
     LS = [gm * la + (1.0 - gm) * lb for la, lb, gm in zip(lpA, lpB, gpM)]
 
@@ -91,16 +80,413 @@ def laplacian_blending(path_A, path_B, path_mask, output_dir="output", levels=6)
     for i in range(levels - 1, -1, -1):
         result = cv2.pyrUp(result, dstsize=(LS[i].shape[1], LS[i].shape[0]))
         result = cv2.add(result, LS[i])
-    result = np.clip(result, 0, 255).astype(np.uint8)
+    return np.clip(result, 0, 255).astype(np.uint8)
+
+def blend_pyramids(A, B, M, levels):
+    """
+    对一整张图（或一个带重叠边距的块）做拉普拉斯金字塔融合。
+
+    A、B 为 BGR uint8 图像，M 为单通道 uint8 mask（白=A，黑=B），返回 uint8 结果。
+    """
+    return collapse_blend(laplacian_pyramid(A, levels), laplacian_pyramid(B, levels), mask_pyramid(M, levels), levels)
+
+def tile_margin(levels):
+    """
+    块的重叠边距：金字塔下采样与重构的感受野不超过 6 * 2**levels 像素，
+    以此为边距时块内核心区域的结果与整图融合逐像素一致。
+    """
+    return 6 * 2 ** levels
+
+def _tile_ranges(length, tile_size, margin):
+    """沿一个方向切块，返回 (核心起点, 核心终点, 扩展起点, 扩展终点)"""
+    return [(start, min(start + tile_size, length), max(0, start - margin), min(length, start + tile_size + margin))
+            for start in range(0, length, tile_size)]
+
+def plan_tiles(shape, levels, tile_size=DEFAULT_TILE_SIZE, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    根据内存预算确定块大小与并行块数。
+
+    块的起点必须是 2**levels 的倍数，这样每块的金字塔采样网格与整图一致。
+
+    Returns:
+        (tile_size, workers)
+    """
+    align = 2 ** levels
+    margin = tile_margin(levels)
+    budget = max_memory_mb * 1024 * 1024
+    tile_size = max(align, int(tile_size) // align * align)
+    height, width = shape[:2]
+    tile_size = min(tile_size, -(-max(height, width) // align) * align)
+
+    def tile_bytes(size):
+        return min(height, size + 2 * margin) * min(width, size + 2 * margin) * _BYTES_PER_TILE_PIXEL
+
+    # 单块超出预算时缩小块，但不小于边距，否则重叠部分的重复计算会远多于有效计算
+    while tile_size > margin and tile_bytes(tile_size) > budget:
+        tile_size = max(margin, tile_size // 2 // align * align)
+    workers = max(1, min(os.cpu_count() or 1, budget // tile_bytes(tile_size)))
+    return tile_size, workers
+
+def blend_tiled(A, B, M, levels, tile_size=DEFAULT_TILE_SIZE, max_memory_mb=DEFAULT_MAX_MEMORY_MB, out=None):
+    """
+    分块并行的拉普拉斯金字塔融合，结果与 blend_pyramids 对整图的结果一致。
+
+    每块连同重叠边距单独建金字塔，只写回核心区域；内存占用只与块大小和并行块数有关，
+    与图像大小无关。OpenCV 运算时释放 GIL，多个块在线程池中并行。
+
+    Args:
+        A, B: BGR uint8 图像（可以是 np.memmap）
+        M: 单通道 uint8 mask，与 A、B 同尺寸
+        levels: 金字塔层数
+        tile_size: 块边长（像素）
+        max_memory_mb: 所有并行块的内存预算
+        out: 结果写入的数组（可以是 np.memmap），默认新建
+
+    Returns:
+        融合后的 uint8 图像
+    """
+    tile_size, workers = plan_tiles(M.shape, levels, tile_size, max_memory_mb)
+    margin = tile_margin(levels)
+    if out is None:
+        out = np.empty(A.shape, dtype=np.uint8)
+
+    tiles = [(rows, cols)
+             for rows in _tile_ranges(M.shape[0], tile_size, margin)
+             for cols in _tile_ranges(M.shape[1], tile_size, margin)]
+
+    def blend_tile(tile):
+        (y0, y1, ey0, ey1), (x0, x1, ex0, ex1) = tile
+        blended = blend_pyramids(A[ey0:ey1, ex0:ex1], B[ey0:ey1, ex0:ex1], M[ey0:ey1, ex0:ex1], levels)
+        out[y0:y1, x0:x1] = blended[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(blend_tile, tiles):
+            pass
+    return out
+
+def _spool(image, directory, name):
+    """把解码后的图像转存为磁盘上的 memmap，释放内存，之后按块读取"""
+    spooled = np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode='w+',
+                                        dtype=image.dtype, shape=image.shape)
+    spooled[:] = image
+    return spooled
+
+def load_inputs(path_A, path_B, path_mask, spool_dir=None, spool_bytes=0):
+    """
+    加载 A、B 与 mask，对齐到相同尺寸，mask 转为单通道。
+
+    指定 spool_dir 时，解码后超过 spool_bytes 的图像立即转存为 memmap，
+    同一时刻内存中最多只有一张解码后的整图。
+    """
+    def spool(image, name):
+        if spool_dir and image.nbytes > spool_bytes:
+            return _spool(image, spool_dir, name)
+        return image
+
+    A = spool(load_image(path_A), "A")
+    B = spool(load_image(path_B), "B")
+
+    # 尺寸对齐
+    min_shape = (min(A.shape[0], B.shape[0]), min(A.shape[1], B.shape[1]))
+    if A.shape[:2] != min_shape:
+        A = spool(cv2.resize(A, (min_shape[1], min_shape[0])), "A_resized")
+    if B.shape[:2] != min_shape:
+        B = spool(cv2.resize(B, (min_shape[1], min_shape[0])), "B_resized")
+
+    # 处理 mask
+    M = load_image(path_mask)
+    if M.shape[:2] != min_shape:
+        M = cv2.resize(M, (min_shape[1], min_shape[0]))
+    M = spool(cv2.cvtColor(M, cv2.COLOR_BGR2GRAY), "M")
+    return A, B, M
+
+@mcp.tool()
+def laplacian_blending(path_A, path_B, path_mask, output_dir="output", levels=6,
+                       tile_size=DEFAULT_TILE_SIZE, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """Blend two images using Laplacian pyramid blending with a mask.
+
+    Large images are blended in overlapping tiles processed in parallel, so
+    memory use stays within max_memory_mb regardless of image size (gigapixel
+    aerial mosaics included). The result is identical to blending the whole
+    image at once.
 
-    # 保存结果
+    Args:
+        image_a_path: Path/URL to the first input image
+        image_b_path: Path/URL to the second input image
+        mask_path: Path/URL to the mask image (white=use image A, black=use image B)
+        output_dir: Directory to save the blended result (default: "output")
+        pyramid_levels: Number of pyramid levels for blending (default: 6)
+        tile_size: Tile edge in pixels (default: 2048, LAPLACIAN_TILE_SIZE)
+        max_memory_mb: Memory budget for the tiles blended in parallel (default: 2048, LAPLACIAN_MAX_MEMORY_MB)
+
+    Returns:
+        str: Path to the saved blended image
+
+    Raises:
+        ValueError: If any input image is invalid or cannot be loaded
+    """
+    levels = int(levels)
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     filename = f"blended_{uuid4().hex[:8]}.png"
     output_path = os.path.join(output_dir, filename)
-    cv2.imwrite(output_path, result)
+
+    # 大图的输入与结果放在输出目录下的临时 memmap 中，整图不常驻内存
+    with tempfile.TemporaryDirectory(dir=output_dir) as spool_dir:
+        A, B, M = load_inputs(path_A, path_B, path_mask, spool_dir, int(max_memory_mb) * 1024 * 1024 // 8)
+        result = None
+        if isinstance(A, np.memmap):
+            result = np.lib.format.open_memmap(os.path.join(spool_dir, "result.npy"), mode='w+',
+                                               dtype=np.uint8, shape=A.shape)
+        result = blend_tiled(A, B, M, levels, int(tile_size), int(max_memory_mb), out=result)
+
+        # 保存结果
+        cv2.imwrite(output_path, result)
+        del A, B, M, result
 
     return output_path
 
+class PyramidCache:
+    """进程内的金字塔缓存，按输入内容哈希作键，LRU 淘汰，按字节数限制大小"""
+
+    def __init__(self, max_mb=PYRAMID_CACHE_MB):
+        self.max_bytes = max_mb * 1024 * 1024
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        pyramid = self._entries.get(key)
+        if pyramid is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return pyramid
+
+    def put(self, key, pyramid):
+        nbytes = sum(level.nbytes for level in pyramid)
+        if nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            return
+        self._entries[key] = pyramid
+        self._size += nbytes
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= sum(level.nbytes for level in evicted)
+
+_pyramid_cache = PyramidCache()
+_content_hashes = {}  # (路径, mtime, 大小) -> 内容哈希
+_image_shapes = {}    # 内容哈希 -> 解码后的尺寸
+
+def read_source(path_or_url):
+    """读取图像的原始字节，返回 (内容哈希, 字节)"""
+    if urlparse(path_or_url).scheme in ('http', 'https'):
+        try:
+            data = urllib.request.urlopen(path_or_url).read()
+        except Exception as e:
+            raise ValueError(f"下载图像失败: {e}")
+    else:
+        if not os.path.exists(path_or_url):
+            raise FileNotFoundError(f"文件不存在: {path_or_url}")
+        with open(path_or_url, 'rb') as f:
+            data = f.read()
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), data
+
+def content_hash(path_or_url):
+    """本地文件的内容哈希按 (路径, mtime, 大小) 记忆，未修改的文件不重复读取"""
+    if urlparse(path_or_url).scheme in ('http', 'https') or not os.path.exists(path_or_url):
+        return None
+    stat = os.stat(path_or_url)
+    key = (path_or_url, stat.st_mtime_ns, stat.st_size)
+    if key not in _content_hashes:
+        _content_hashes[key] = read_source(path_or_url)[0]
+    return _content_hashes[key]
+
+def decode(data, source):
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"无法读取图像: {source}")
+    return image
+
+class _Input:
+    """批量任务中的一张输入图，共享的输入只在第一次用到时读取和解码"""
+
+    def __init__(self, source, shared):
+        self.source = source
+        self.shared = shared
+        self.digest = content_hash(source) if shared else None
+        self.image = None
+
+    def load(self):
+        if self.image is None:
+            digest, data = read_source(self.source)
+            self.image = decode(data, self.source)
+            self.digest = self.digest or digest
+            _image_shapes[self.digest] = self.image.shape[:2]
+        return self.image
+
+    @property
+    def shape(self):
+        if self.digest is not None and self.digest in _image_shapes:
+            return _image_shapes[self.digest]
+        return self.load().shape[:2]
+
+    def pyramid(self, kind, levels, target_shape):
+        """kind 为 "laplacian" 或 "mask"；共享输入的金字塔从缓存取，未命中时建好后放入缓存"""
+        if self.shared and self.digest is None:
+            # URL 只有下载后才知道内容哈希
+            self.load()
+        key = (self.digest, kind, levels, target_shape)
+        if self.shared:
+            pyramid = _pyramid_cache.get(key)
+            if pyramid is not None:
+                return pyramid
+        image = self.load()
+        if image.shape[:2] != target_shape:
+            image = cv2.resize(image, (target_shape[1], target_shape[0]))
+        if kind == "mask":
+            pyramid = mask_pyramid(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), levels)
+        else:
+            pyramid = laplacian_pyramid(image, levels)
+        if self.shared:
+            _pyramid_cache.put(key, pyramid)
+        return pyramid
+
+def blend_item(job):
+    """
+    融合一组 (A, B, mask)，在工作进程中运行。
+
+    Args:
+        job: (序号, [(A, 是否共享), (B, 是否共享), (mask, 是否共享)], levels, 输出路径)
+
+    Returns:
+        dict: 序号、输出路径、耗时与本项的缓存命中数，失败时为错误信息
+    """
+    index, sources, levels, output_path = job
+    start = time.perf_counter()
+    hits = _pyramid_cache.hits
+    try:
+        A, B, M = (_Input(source, shared) for source, shared in sources)
+        shape_A, shape_B = A.shape, B.shape
+        target_shape = (min(shape_A[0], shape_B[0]), min(shape_A[1], shape_B[1]))
+        result = collapse_blend(A.pyramid("laplacian", levels, target_shape),
+                                B.pyramid("laplacian", levels, target_shape),
+                                M.pyramid("mask", levels, target_shape), levels)
+        if not cv2.imwrite(output_path, result):
+            raise ValueError(f"无法写入: {output_path}")
+    except Exception as e:
+        return {"index": index, "error": str(e)}
+    return {
+        "index": index,
+        "output": output_path,
+        "seconds": round(time.perf_counter() - start, 3),
+        "cached_pyramids": _pyramid_cache.hits - hits,
+    }
+
+def _init_worker():
+    # 并行发生在进程之间，避免每个进程再开满 OpenCV 线程
+    cv2.setNumThreads(1)
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_process_pool(workers):
+    """
+    批量融合共用的进程池，在多次调用之间保留，各进程的金字塔缓存也随之保留。
+
+    使用 spawn 启动，避免在 MCP 服务的事件循环线程中 fork。
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+            _pool_workers = workers
+        return _pool
+
+def list_frames(frames_dir):
+    """目录中的图像帧，按文件名排序"""
+    return sorted(os.path.join(frames_dir, name) for name in os.listdir(frames_dir)
+                  if name.lower().endswith(_IMAGE_EXTENSIONS))
+
+@mcp.tool()
+def laplacian_blending_batch(items=None, frames_dir="", path_B="", path_mask="", output_dir="output",
+                             levels=6, workers=0):
+    """Blend many image triples, or a frame sequence, with Laplacian pyramid blending.
+
+    Inputs used by more than one item (a shared background or mask) are read
+    and turned into pyramids once per worker process and reused, keyed by file
+    content, so each frame costs one pyramid build instead of three. Items run
+    in parallel on a process pool and every output is written as soon as it is
+    ready; progress is appended to blend_manifest.jsonl in output_dir.
+
+    Args:
+        items: List of [path_A, path_B, path_mask] triples (paths or URLs)
+        frames_dir: Alternatively, a directory of frames; every frame is blended as A over path_B with path_mask
+        path_B: Background image for frames_dir mode
+        path_mask: Mask for frames_dir mode (white=use the frame, black=use path_B)
+        output_dir: Directory to save the blended results (default: "output")
+        levels: Number of pyramid levels for blending (default: 6)
+        workers: Worker processes (default: LAPLACIAN_BATCH_WORKERS, the number of CPUs)
+
+    Returns:
+        str: Summary with throughput, cache reuse, the manifest path and any failed items
+    """
+    levels = int(levels)
+    if frames_dir:
+        if not path_B or not path_mask:
+            raise ValueError("frames_dir 模式需要同时提供 path_B 与 path_mask")
+        frames = list_frames(frames_dir)
+        triples = [(frame, path_B, path_mask) for frame in frames]
+        # 输出与帧同名，方便按序号重新组成视频
+        names = [os.path.splitext(os.path.basename(frame))[0] + ".png" for frame in frames]
+    else:
+        triples = [tuple(item) for item in (items or [])]
+        if any(len(item) != 3 for item in triples):
+            raise ValueError("items 中每一项必须是 [path_A, path_B, path_mask]")
+        names = [f"blended_{i:05d}.png" for i in range(len(triples))]
+    if not triples:
+        raise ValueError("没有需要融合的图像")
+
+    os.makedirs(output_dir, exist_ok=True)
+    # 被多个任务用到的输入才进入缓存
+    uses = {}
+    for triple in triples:
+        for source in set(triple):
+            uses[source] = uses.get(source, 0) + 1
+    jobs = [(i, [(source, uses[source] > 1) for source in triple], levels, os.path.join(output_dir, name))
+            for i, (triple, name) in enumerate(zip(triples, names))]
+
+    workers = max(1, min(int(workers) or DEFAULT_BATCH_WORKERS, len(jobs)))
+    manifest_path = os.path.join(output_dir, "blend_manifest.jsonl")
+    start = time.perf_counter()
+    results = []
+    with open(manifest_path, 'w', encoding='utf-8') as manifest:
+        if workers == 1:
+            completed = (blend_item(job) for job in jobs)
+        else:
+            pool = get_process_pool(workers)
+            completed = (future.result() for future in as_completed([pool.submit(blend_item, job) for job in jobs]))
+        for result in completed:
+            manifest.write(json.dumps(result, ensure_ascii=False) + "\n")
+            manifest.flush()
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    failed = sorted((r for r in results if "error" in r), key=lambda r: r["index"])
+    cached = sum(r.get("cached_pyramids", 0) for r in results)
+    summary = (f"Blended {len(results) - len(failed)}/{len(jobs)} items in {elapsed:.1f}s "
+               f"({len(jobs) / elapsed:.2f} items/s, {workers} workers, {cached} pyramids reused from cache)\n"
+               f"Outputs: {output_dir}\nManifest: {manifest_path}")
+    for r in failed:
+        summary += f"\nItem {r['index']} failed: {r['error']}"
+    return summary
+
 if __name__ == "__main__":
-    mcp.run(transport='stdio') 
\ No newline at end of file
+    mcp.run(transport='stdio')
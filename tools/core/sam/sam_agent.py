@@ -33,6 +33,7 @@ class SAMTool(ToolTemplate):
 1. 保持默认参数不变，除非用户明确指定修改
 2. 智能处理保存路径：若用户未指定目录，则默认为 {图像路径名}_SAM_MASKS 目录
 - 例如：/path/to/photo.jpg → /path/to/photo_SAM_MASKS/
+3. 默认输出PNG文件（每个对象一个mask）；当用户需要把全部mask保存为单个文件或供程序批量读取时，使用 output_format="npz"
 
 """
     
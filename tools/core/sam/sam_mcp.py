@@ -1,10 +1,18 @@
+import io
 import os
 import asyncio
-from typing import Any
+from typing import Any, List, Optional
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 import replicate
 import httpx
+from PIL import Image
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
 
 # Load environment variables
 load_dotenv()
@@ -32,20 +40,91 @@ def normalize_path(path: str) -> str:
         
     return expanded_path
 
-async def download_file(url: str, save_path: str) -> None:
+SAM2_MODEL = "meta/sam-2:fe97b453a6455861e3bac769b441ca1f1086110da7466dbb65cf1eecfd60dc83"
+DOWNLOAD_CONCURRENCY = int(os.getenv('SAM_DOWNLOAD_CONCURRENCY', '16'))
+
+# One pooled HTTP client for the whole server process (keep-alive across masks and calls)
+_http_client: Optional[httpx.AsyncClient] = None
+_http_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client, recreated if used from a new event loop."""
+    global _http_client, _http_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=DOWNLOAD_CONCURRENCY,
+                                max_keepalive_connections=DOWNLOAD_CONCURRENCY),
+            follow_redirects=True
+        )
+        _http_loop = loop
+    return _http_client
+
+async def download_file(url: str, save_path: str, semaphore: Optional[asyncio.Semaphore] = None) -> None:
     """
-    Download a file from URL to local path.
+    Download a file from URL to local path, streaming it to disk.
     
     Args:
         url: The URL to download from
         save_path: Local path to save the file
+        semaphore: Optional semaphore bounding concurrent downloads
+    """
+    async with semaphore or asyncio.Semaphore(1):
+        async with get_http_client().stream("GET", url) as response:
+            response.raise_for_status()
+            with open(save_path, 'wb') as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+
+async def download_bytes(url: str, semaphore: Optional[asyncio.Semaphore] = None) -> bytes:
+    """
+    Download a file from URL into memory.
+    
+    Args:
+        url: The URL to download from
+        semaphore: Optional semaphore bounding concurrent downloads
     """
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+    async with semaphore or asyncio.Semaphore(1):
+        response = await get_http_client().get(url)
         response.raise_for_status()
-        
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
+        return response.content
+
+def run_sam2(image_path: str, points_per_side: int, pred_iou_thresh: float, stability_score_thresh: float) -> Any:
+    """Run SAM 2 on Replicate (blocking; call it from a worker thread)."""
+    client = replicate.Client(api_token=os.getenv('REPLICATE_API_TOKEN'))
+    with open(image_path, "rb") as image_file:
+        return client.run(
+            SAM2_MODEL,
+            input={
+                "image": image_file,
+                "points_per_side": points_per_side,
+                "pred_iou_thresh": pred_iou_thresh,
+                "stability_score_thresh": stability_score_thresh
+            }
+        )
+
+def save_masks_npz(save_path: str, combined_mask: bytes, individual_masks: List[bytes]) -> tuple:
+    """
+    Decode downloaded mask PNGs and store them in one compressed NPZ file.
+    
+    The file holds "combined_mask" (H x W, uint8) and "masks" (N x H x W, bool),
+    loadable with numpy.load(save_path).
+    
+    Returns:
+        Shape of the "masks" array
+    """
+    def decode(data: bytes, mode: str):
+        with Image.open(io.BytesIO(data)) as image:
+            return np.asarray(image.convert(mode))
+    
+    combined = decode(combined_mask, "L")
+    if individual_masks:
+        masks = np.stack([decode(data, "L") > 127 for data in individual_masks])
+    else:
+        masks = np.zeros((0,) + combined.shape, dtype=bool)
+    np.savez_compressed(save_path, combined_mask=combined, masks=masks)
+    return masks.shape
 
 @mcp.tool()
 async def segment_anything_v2(
@@ -53,7 +132,8 @@ async def segment_anything_v2(
     save_directory: str = "",
     points_per_side: int = 32,
     pred_iou_thresh: float = 0.88,
-    stability_score_thresh: float = 0.95
+    stability_score_thresh: float = 0.95,
+    output_format: str = "png"
 ) -> str:
     """
     Segment objects in an image using SAM 2 (Segment Anything v2) model.
@@ -68,6 +148,9 @@ async def segment_anything_v2(
         points_per_side (int): Number of points per side for mask generation (default: 32)
         pred_iou_thresh (float): Predicted IOU threshold (default: 0.88)
         stability_score_thresh (float): Stability score threshold (default: 0.95)
+        output_format (str): "png" saves combined_mask.png and one mask_{i}.png per object (default);
+                             "npz" saves all masks in a single compressed masks.npz file
+                             ("combined_mask": H x W uint8, "masks": N x H x W bool)
     
     Returns:
         str: Success message with information about saved files
@@ -84,33 +167,39 @@ async def segment_anything_v2(
         else:
             save_directory = normalize_path(save_directory)
         
+        output_format = output_format.lower()
+        if output_format not in ("png", "npz"):
+            return f"Error during segmentation: unsupported output_format '{output_format}' (use 'png' or 'npz')"
+        if output_format == "npz" and not NUMPY_SUPPORT:
+            return "Error during segmentation: output_format 'npz' requires numpy"
+        
         # Ensure save directory exists
         os.makedirs(save_directory, exist_ok=True)
         
-        # Initialize Replicate client
-        client = replicate.Client(api_token=os.getenv('REPLICATE_API_TOKEN'))
-        
-        # Run the SAM 2 model
-        output = client.run(
-            "meta/sam-2:fe97b453a6455861e3bac769b441ca1f1086110da7466dbb65cf1eecfd60dc83",
-            input={
-                "image": open(image_path, "rb"),
-                "points_per_side": points_per_side,
-                "pred_iou_thresh": pred_iou_thresh,
-                "stability_score_thresh": stability_score_thresh
-            }
+        # Run the SAM 2 model in a worker thread so the server stays responsive
+        output = await asyncio.to_thread(
+            run_sam2, image_path, points_per_side, pred_iou_thresh, stability_score_thresh
         )
+        mask_urls = [str(mask_file) for mask_file in output["individual_masks"]]
+        semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
         
-        # Download combined mask
-        combined_mask_path = os.path.join(save_directory, "combined_mask.png")
-        await download_file(str(output["combined_mask"]), combined_mask_path)
+        if output_format == "npz":
+            contents = await asyncio.gather(
+                download_bytes(str(output["combined_mask"]), semaphore),
+                *(download_bytes(url, semaphore) for url in mask_urls)
+            )
+            npz_path = os.path.join(save_directory, "masks.npz")
+            shape = await asyncio.to_thread(save_masks_npz, npz_path, contents[0], list(contents[1:]))
+            return (f"Segmentation completed!\nMasks file: {npz_path}\n"
+                    f"Contains 'combined_mask' and 'masks' ({shape[0]} masks of {shape[1]}x{shape[2]})")
         
-        # Download individual masks
-        individual_mask_paths = []
-        for i, mask_file in enumerate(output["individual_masks"]):
-            mask_path = os.path.join(save_directory, f"mask_{i}.png")
-            await download_file(str(mask_file), mask_path)
-            individual_mask_paths.append(mask_path)
+        # Download combined and individual masks concurrently
+        combined_mask_path = os.path.join(save_directory, "combined_mask.png")
+        individual_mask_paths = [os.path.join(save_directory, f"mask_{i}.png") for i in range(len(mask_urls))]
+        await asyncio.gather(
+            download_file(str(output["combined_mask"]), combined_mask_path, semaphore),
+            *(download_file(url, path, semaphore) for url, path in zip(mask_urls, individual_mask_paths))
+        )
         
         # Return specific file paths
         result = f"Segmentation completed!\nCombined mask: {combined_mask_path}\nIndividual masks ({len(individual_mask_paths)} files):\n"
@@ -1,15 +1,14 @@
 from typing import List, Dict, Optional, Any
 import os
+import asyncio
 from mcp.server.fastmcp import FastMCP
-from openai import OpenAI
 from dotenv import load_dotenv
 load_dotenv()
 # Initialize FastMCP server
 mcp = FastMCP("Visual_Question_Answering")
 
-from PIL import Image
-import base64
-import io
+from FractFlow.infra.image_utils import prepare_image
+from FractFlow.infra.vlm_client import get_vlm_client
 
 def normalize_path(path: str) -> str:
     """
@@ -31,32 +30,8 @@ def normalize_path(path: str) -> str:
         
     return expanded_path
 
-def encode_image(image: Image.Image, size: tuple[int, int] = (512, 512)) -> str:
-    image.thumbnail(size)
-    buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
-    base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    return base64_image
-
-def load_image(image_path: str, size_limit: tuple[int, int] = (512, 512)) -> tuple[str, dict]:
-    """Load an image from the given path.
-    
-    Args:
-        image_path: Path to the image file to load
-        
-    Returns:
-        A tuple containing:
-            - Base64 encoded string of the resized image (max 512x512) (this can be put in the image_url field of the user message)
-            - Dictionary with metadata including original width and height
-    """
-    meta_info = {}
-    image = Image.open(image_path)
-    meta_info['width'], meta_info['height'] = image.size
-    base64_image = encode_image(image, size_limit)
-    return base64_image, meta_info
-
 @mcp.tool()
-async def Visual_Question_Answering(image_path: str, prompt: str) -> str:
+async def Visual_Question_Answering(image_path: str, prompt: str, crop_box: Optional[List[int]] = None) -> str:
     '''
     This tool uses Qwen-VL-Plus model to perform visual question answering or image analysis.
     The image is automatically resized to a maximum of 512x512 pixels before processing.
@@ -68,30 +43,53 @@ async def Visual_Question_Answering(image_path: str, prompt: str) -> str:
                      - A direct question about the image content (e.g., "What objects are in this image?")
                      - A request for detailed description (e.g., "Describe this image in detail")
                      - A specific analytical instruction (e.g., "Count the number of people in this image")
+        crop_box (List[int], optional): [x1, y1, x2, y2] pixel region of the image to analyse instead of
+                     the whole image, e.g. a crop_box returned by detect_and_crop_objects
     
     Returns:
         str: A detailed text response from the VLM model analyzing the image according to the prompt.
              The response format depends on the nature of the prompt.
     '''
     image_path = normalize_path(image_path)
-    base64_image, meta_info = load_image(image_path, (512, 512))
-    client = OpenAI(
-        # 若没有配置环境变量，请用百炼API Key将下行替换为：api_key="sk-xxx",
-        api_key=os.getenv('QWEN_API_KEY'),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
-    completion = client.chat.completions.create(
+    image = await asyncio.to_thread(prepare_image, image_path, (512, 512), region=crop_box)
+    # 共享的客户端（默认使用环境变量QWEN_API_KEY），复用连接池且不阻塞事件循环
+    client = get_vlm_client()
+    return await client.chat(
         model="qwen-vl-max",  # 此处以qwen-vl-plus为例，可按需更换模型名称。模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
         messages=[{"role": "user","content": [
                 {"type": "text","text": prompt},
                 {"type": "image_url",
-                "image_url": {"url": f'data:image/png;base64,{base64_image}'}}
+                "image_url": {"url": image.data_url}}
                 ]}]
     )
-    return completion.choices[0].message.content
+
+async def _load_images(image_paths: List[str], crop_boxes: Optional[List[Optional[List[int]]]] = None) -> List[Any]:
+    """Prepare all images concurrently in worker threads; failures are returned as exceptions in place."""
+    crop_boxes = crop_boxes or [None] * len(image_paths)
+    return await asyncio.gather(
+        *[asyncio.to_thread(prepare_image, normalize_path(path), (512, 512), region=crop_box)
+          for path, crop_box in zip(image_paths, crop_boxes)],
+        return_exceptions=True
+    )
+
+async def _ask(prompt: str, images: List[Any]) -> str:
+    """Send one prompt with the given prepared images to the VLM."""
+    content_items = [{"type": "text", "text": prompt}]
+    for image in images:
+        content_items.append({
+            "type": "image_url",
+            "image_url": {"url": image.data_url}
+        })
+    client = get_vlm_client()
+    return await client.chat(
+        model="qwen-vl-max",
+        messages=[{"role": "user", "content": content_items}]
+    )
 
 @mcp.tool()
-async def Visual_Question_Answering_Multiple_Images(image_paths: List[str], prompt: str) -> str:
+async def Visual_Question_Answering_Multiple_Images(image_paths: List[str], prompt: str,
+                                                    mode: str = "collective", chunk_size: int = 1,
+                                                    crop_boxes: Optional[List[Optional[List[int]]]] = None) -> str:
     '''
     This tool uses Qwen-VL-Plus model to perform visual question answering or image analysis on multiple images.
     All images are automatically resized to a maximum of 512x512 pixels before processing.
@@ -104,43 +102,64 @@ async def Visual_Question_Answering_Multiple_Images(image_paths: List[str], prom
                      - A collective analysis (e.g., "What common elements appear in all these images?")
                      - Individual analysis (e.g., "Describe each image separately")
                      - A specific analytical instruction (e.g., "Count objects across all images")
+        mode (str): How the images are sent to the model:
+                     - "collective" (default): all images in one request, for comparisons and questions
+                       that need every image at once
+                     - "individual": the prompt is asked for each image (or each chunk of images)
+                       separately and concurrently; use this for "describe each image" style prompts
+                       over many images
+        chunk_size (int): Number of images per request in "individual" mode (default 1)
+        crop_boxes (List, optional): One [x1, y1, x2, y2] pixel region (or null for the whole image) per
+                     entry of image_paths. The same path may be listed several times with different boxes,
+                     e.g. the crop_box values returned by detect_and_crop_objects
     
     Returns:
         str: A detailed text response from the VLM model analyzing all images according to the prompt.
-             The response will consider all provided images in the context of the prompt.
+             In "collective" mode the response considers all images together. In "individual" mode
+             the answers are returned in input order, each headed by its image number and path.
     '''
     if not image_paths:
         return "Error: No image paths provided"
+    if mode not in ("collective", "individual"):
+        return f"Error: Unknown mode '{mode}', expected 'collective' or 'individual'"
+    if crop_boxes is not None and len(crop_boxes) != len(image_paths):
+        return "Error: crop_boxes must have one entry per image path"
     
-    # Normalize all paths and load images
-    content_items = [{"type": "text", "text": prompt}]
+    images = await _load_images(image_paths, crop_boxes)
     
-    for i, image_path in enumerate(image_paths):
+    if mode == "collective":
+        for i, (image_path, image) in enumerate(zip(image_paths, images)):
+            if isinstance(image, Exception):
+                return f"Error loading image {i+1} ('{image_path}'): {str(image)}"
         try:
-            normalized_path = normalize_path(image_path)
-            base64_image, meta_info = load_image(normalized_path, (512, 512))
-            
-            # Add image to content with index for reference
-            content_items.append({
-                "type": "image_url",
-                "image_url": {"url": f'data:image/png;base64,{base64_image}'}
-            })
+            return await _ask(prompt, images)
         except Exception as e:
-            return f"Error loading image {i+1} ('{image_path}'): {str(e)}"
+            return f"Error during VLM analysis: {str(e)}"
     
-    client = OpenAI(
-        api_key=os.getenv('QWEN_API_KEY'),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
+    # Individual mode: one request per chunk, run concurrently (the shared client caps concurrency)
+    chunk_size = max(1, int(chunk_size))
+    chunks = [list(range(start, min(start + chunk_size, len(image_paths))))
+              for start in range(0, len(image_paths), chunk_size)]
+    
+    async def answer_chunk(indices: List[int]) -> str:
+        for i in indices:
+            if isinstance(images[i], Exception):
+                return f"Error loading image {i+1} ('{image_paths[i]}'): {str(images[i])}"
+        try:
+            return await _ask(prompt, [images[i] for i in indices])
+        except Exception as e:
+            return f"Error during VLM analysis: {str(e)}"
+    
+    answers = await asyncio.gather(*[answer_chunk(indices) for indices in chunks])
     
-    try:
-        completion = client.chat.completions.create(
-            model="qwen-vl-max",
-            messages=[{"role": "user", "content": content_items}]
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        return f"Error during VLM analysis: {str(e)}"
+    sections = []
+    for indices, answer in zip(chunks, answers):
+        if len(indices) == 1:
+            header = f"Image {indices[0]+1} ({image_paths[indices[0]]})"
+        else:
+            header = f"Images {indices[0]+1}-{indices[-1]+1} ({', '.join(image_paths[i] for i in indices)})"
+        sections.append(f"## {header}\n{answer}")
+    return "\n\n".join(sections)
 
 if __name__ == "__main__":
     # Initialize and run the server
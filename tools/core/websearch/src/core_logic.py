@@ -27,6 +27,10 @@ import sys
 import os
 import json
 import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from datetime import datetime
 
@@ -47,10 +51,149 @@ from search.base import SearchItem, WebSearchEngine
 from search.google_search import GoogleSearchEngine
 from search.baidu_search import BaiduSearchEngine
 from search.duckduckgo_search import DuckDuckGoSearchEngine
+from html_extract import extract_main_text
 
 # Constants
 MAX_CONTENT_LENGTH = 40000  # Maximum content length in characters
 
+# 网页抓取配置（可通过环境变量调整）
+CRAWL_TIMEOUT = float(os.getenv('WEBSEARCH_CRAWL_TIMEOUT', '10'))  # 单个页面的超时（秒）
+BROWSE_DEADLINE = float(os.getenv('WEBSEARCH_BROWSE_DEADLINE', '20'))  # 一次浏览所有页面的总时限（秒）
+BROWSE_RESERVE = int(os.getenv('WEBSEARCH_BROWSE_RESERVE', '2'))  # 除所需页面数外同时请求的备用结果数
+BROWSE_GRACE = float(os.getenv('WEBSEARCH_BROWSE_GRACE', '2'))  # 凑够页面后等待排名更靠前页面的时间（秒）
+MAX_CONNECTIONS = int(os.getenv('WEBSEARCH_MAX_CONNECTIONS', '20'))  # 连接池的总连接数
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('WEBSEARCH_MAX_CONNECTIONS_PER_HOST', '2'))  # 同一主机的并发请求数
+EXTRACT_WORKERS = int(os.getenv('WEBSEARCH_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))  # 正文提取的进程数
+EXTRACT_IN_PROCESS_SIZE = int(os.getenv('WEBSEARCH_EXTRACT_IN_PROCESS_SIZE', '100000'))  # 小于此字符数的HTML在本进程的线程中解析
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36",
+}
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    获取所有抓取共享的httpx连接池客户端
+    
+    客户端绑定到创建它的事件循环，在新的事件循环中使用时会重建，
+    同时重置各主机的并发限制。
+    
+    Returns:
+        httpx.AsyncClient: 共享的异步客户端
+    """
+    global _client, _client_loop, _host_semaphores
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=CRAWL_TIMEOUT,
+            follow_redirects=True,
+            headers=HEADERS,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+        _client_loop = loop
+        _host_semaphores = {}
+    return _client
+
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
+_extract_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """
+    获取正文提取共用的进程池
+    
+    HTML解析是纯CPU计算，放在进程池中执行，既不阻塞事件循环，多个页面也能并行解析。
+    使用spawn启动，避免在事件循环线程中fork。
+    
+    Returns:
+        ProcessPoolExecutor: 进程池
+    """
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(max_workers=max(1, EXTRACT_WORKERS),
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return _extract_pool
+
+
+def warm_up_extract_pool() -> None:
+    """
+    预先启动正文提取进程池的所有工作进程
+    
+    spawn启动的工作进程会重新导入主模块（如server.py），耗时较长；在服务启动时调用，
+    避免第一次浏览网页时才付出这部分开销。进程池不可用时忽略，提取会退回到线程中执行。
+    """
+    try:
+        pool = get_extract_pool()
+        futures = [pool.submit(extract_main_text, "<html></html>") for _ in range(max(1, EXTRACT_WORKERS))]
+        for future in futures:
+            future.result()
+    except (BrokenProcessPool, OSError):
+        pass
+
+
+async def extract_html(html: str, url: str) -> Dict[str, Any]:
+    """
+    在进程池中提取HTML的正文，进程池不可用时退回到线程中执行
+    
+    小于EXTRACT_IN_PROCESS_SIZE的页面解析很快，直接在本进程的线程中执行，
+    省去进程间传输，也不必为此启动进程池。
+    
+    Args:
+        html (str): 网页HTML
+        url (str): 网页URL
+        
+    Returns:
+        Dict[str, Any]: extract_main_text()的返回字典
+    """
+    global _extract_pool
+    if len(html) < EXTRACT_IN_PROCESS_SIZE:
+        return await asyncio.to_thread(extract_main_text, html, url)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_extract_pool(), extract_main_text, html, url)
+    except (BrokenProcessPool, OSError):
+        with _extract_pool_lock:
+            _extract_pool = None
+        return await asyncio.to_thread(extract_main_text, html, url)
+
+
+def is_html_content(content_type: str, text: str) -> bool:
+    """
+    检查内容是否为HTML
+    
+    Args:
+        content_type (str): 内容类型头
+        text (str): 文本内容
+        
+    Returns:
+        bool: 是否为HTML
+    """
+    if content_type and ('html' in content_type.lower() or 'xml' in content_type.lower()):
+        return True
+    return text.lstrip()[:1] == '<'
+
+
+def host_semaphore(url: str) -> asyncio.Semaphore:
+    """
+    获取URL所在主机的并发限制，同一主机最多同时有MAX_CONNECTIONS_PER_HOST个请求
+    
+    Args:
+        url (str): 网页URL
+        
+    Returns:
+        asyncio.Semaphore: 该主机的信号量
+    """
+    host = urlparse(url).netloc.lower()
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(max(1, MAX_CONNECTIONS_PER_HOST))
+    return _host_semaphores[host]
+
 
 def is_pdf_content(content_type, content):
     """
@@ -108,12 +251,13 @@ def extract_text_from_pdf(pdf_content):
         return f"[PDF文件解析错误: {str(e)}]"
 
 
-async def crawl_impl(url: str) -> Dict[str, Any]:
+async def crawl_impl(url: str, extract_text: bool = True) -> Dict[str, Any]:
     """
-    根据URL获取网页内容的简单实现
+    根据URL获取网页内容
     
     Args:
         url (str): 要获取内容的网页URL
+        extract_text (bool): 是否从HTML中提取正文，为False时返回原始HTML
         
     Returns:
         Dict[str, Any]: 包含内容和元数据的字典
@@ -124,35 +268,42 @@ async def crawl_impl(url: str) -> Dict[str, Any]:
         if not parsed_url.scheme or not parsed_url.netloc:
             return {"error": "无效的URL，请提供完整URL，包括http://或https://"}
         
-        # 设置请求头
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36",
-        }
+        # 使用共享的连接池获取网页内容，并限制同一主机的并发请求数
+        client = get_http_client()
+        async with host_semaphore(url):
+            response = await client.get(url)
+        response.raise_for_status()
         
-        # 使用httpx获取网页内容
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            # 检查是否是PDF
-            content_type = response.headers.get('content-type', '')
-            if is_pdf_content(content_type, response.content):
-                # 如果是PDF，提取文本
-                content = extract_text_from_pdf(response.content)
-                return {
-                    "content": content,
-                    "url": url,
-                    "is_pdf": True
-                }
-            
-            # 如果不是PDF，获取HTML内容
-            html_content = response.text
-            
+        # 检查是否是PDF
+        content_type = response.headers.get('content-type', '')
+        if is_pdf_content(content_type, response.content):
+            # 如果是PDF，提取文本
+            content = await asyncio.to_thread(extract_text_from_pdf, response.content)
             return {
-                "content": html_content,
+                "content": content,
                 "url": url,
-                "is_pdf": False
+                "is_pdf": True
             }
+        
+        # 如果不是PDF，获取HTML内容
+        html_content = response.text
+        
+        # 提取正文，去掉脚本、样式和导航等无用内容
+        if extract_text and is_html_content(content_type, html_content):
+            extracted = await extract_html(html_content, str(response.url))
+            return {
+                "content": extracted["content"],
+                "url": url,
+                "is_pdf": False,
+                "extracted": True,
+                "raw_length": extracted["raw_length"]
+            }
+        
+        return {
+            "content": html_content,
+            "url": url,
+            "is_pdf": False
+        }
             
     except Exception as e:
         return {"error": f"获取网页内容时出错: {str(e)}"}
@@ -165,10 +316,12 @@ async def crawl(arguments: dict) -> dict:
     Args:
         arguments (dict): 包含以下字段的字典:
             - url (str): 要爬取的网页URL
-            - max_length (int, optional): 返回内容的最大长度
+            - max_length (int, optional): 返回内容的最大长度（按提取后的正文计算）
+            - extract_text (bool, optional): 是否提取正文，默认为True；为False时返回原始HTML
     
     Returns:
-        dict: 包含网页内容的字典
+        dict: 包含网页内容的字典，提取了正文时还包含原始HTML长度raw_length和
+              正文长度content_length
     """
     # 获取参数
     url = arguments.get("url")
@@ -176,9 +329,10 @@ async def crawl(arguments: dict) -> dict:
         return {"error": "缺少URL参数"}
     
     max_length = arguments.get("max_length", MAX_CONTENT_LENGTH)
+    extract_text = arguments.get("extract_text", True)
     
     # 获取网页内容
-    result = await crawl_impl(url)
+    result = await crawl_impl(url, extract_text)
     
     # 检查是否有错误
     if "error" in result:
@@ -191,47 +345,153 @@ async def crawl(arguments: dict) -> dict:
     
     # 返回结果，包含是否为PDF的信息
     is_pdf = result.get("is_pdf", False)
-    return {
+    output = {
         "content": content,
         "url": url,
         "is_pdf": is_pdf
     }
+    if result.get("extracted"):
+        output.update(extracted=True, raw_length=result["raw_length"], content_length=len(result["content"]))
+    return output
 
 
-# Main search functionality
-def format_search_results(search_engine: str, query: str, items: List[SearchItem]) -> str:
+async def crawl_many(urls: List[str], max_length: int = MAX_CONTENT_LENGTH, min_success: int = 0,
+                     deadline: float = BROWSE_DEADLINE, reserve: int = BROWSE_RESERVE,
+                     grace: float = BROWSE_GRACE) -> List[Optional[Dict[str, Any]]]:
     """
-    Format search results into a readable string
+    并发爬取多个网页，按URL顺序取前min_success个成功页面
+    
+    所有页面共享一个连接池，同一主机的并发请求数受MAX_CONNECTIONS_PER_HOST限制。
+    同时只请求前min_success+reserve个URL，每失败一个就补请求下一个URL。
+    排在前面的页面优先：前面的URL都已完成、能确定结果时立即返回；已凑够页面但还有
+    更靠前的URL未完成时，最多再等待grace秒，然后取已成功页面中最靠前的min_success个。
     
     Args:
-        search_engine (str): The name of the search engine used
-        query (str): The search query
-        items (List[SearchItem]): The search results
-        
+        urls (List[str]): 要爬取的网页URL列表，按优先顺序排列
+        max_length (int): 每个网页内容的最大长度
+        min_success (int): 需要的成功页面数，0表示爬取所有页面
+        deadline (float): 总时限（秒），超时后未完成的请求被取消并记为错误
+        reserve (int): 除min_success外同时请求的备用URL数
+        grace (float): 凑够页面后等待更靠前页面的时间（秒）
+    
     Returns:
-        str: Formatted search results string
+        List[Optional[Dict[str, Any]]]: 与urls一一对应的结果，成功时为crawl()的返回字典，
+                                        失败时为{"error": ...}，未请求、因已凑够页面而被取消
+                                        或未采用时为None；成功页面不会超过min_success个
     """
-    if not items:
-        return f"No results found for '{query}' on {search_engine.capitalize()}"
+    results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    if not urls:
+        return results
+    if min_success <= 0 or min_success > len(urls):
+        min_success = len(urls)
     
-    results = [f"🔍 Search results for '{query}' from {search_engine.capitalize()}:"]
+    def is_success(i: int) -> bool:
+        return results[i] is not None and "error" not in results[i]
     
-    for i, item in enumerate(items, 1):
-        title = item.title or f"Result {i}"
-        url = item.url or "No URL"
-        description = item.description or "No description available"
-        
-        results.append(f"\n📌 {title}")
-        results.append(f"🔗 {url}")
-        results.append(f"📄 {description}")
+    def settled() -> bool:
+        """前面的URL都已完成且其中已有min_success个成功页面，更靠后的页面不会改变结果"""
+        count = 0
+        for i in range(len(urls)):
+            if results[i] is None:
+                return False
+            count += is_success(i)
+            if count >= min_success:
+                return True
+        return False
     
-    return "\n".join(results)
+    tasks: Dict[asyncio.Task, int] = {}
+    next_index = 0
+    
+    def launch() -> asyncio.Task:
+        nonlocal next_index
+        task = asyncio.create_task(crawl({"url": urls[next_index], "max_length": max_length}))
+        tasks[task] = next_index
+        next_index += 1
+        return task
+    
+    loop = asyncio.get_running_loop()
+    end_time = loop.time() + deadline
+    grace_end = None
+    pending = {launch() for _ in range(min(len(urls), min_success + max(0, reserve)))}
+    try:
+        while pending and not settled():
+            wait_until = end_time
+            if sum(is_success(i) for i in range(len(urls))) >= min_success:
+                # 已凑够页面，只为更靠前的页面再等一会儿
+                if grace_end is None:
+                    grace_end = loop.time() + grace
+                wait_until = min(end_time, grace_end)
+            remaining = wait_until - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                results[tasks[task]] = result
+                # 失败的页面不占名额，由下一个URL补上
+                if "error" in result and next_index < len(urls):
+                    pending.add(launch())
+    finally:
+        # 取消剩余的请求
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    # 只采用最靠前的min_success个成功页面
+    successes = [i for i in range(len(urls)) if is_success(i)]
+    for i in successes[min_success:]:
+        results[i] = None
+    
+    # 未凑够页面时，剩余的请求是因超时被取消的
+    if len(successes) < min_success:
+        for task in pending:
+            results[tasks[task]] = {"error": f"超过总时限（{deadline}秒）"}
+    
+    return results
+
+
+# Main search functionality
+SEARCH_ENGINES = {
+    "google": GoogleSearchEngine,
+    "baidu": BaiduSearchEngine,
+    "duckduckgo": DuckDuckGoSearchEngine
+}
 
 
-async def web_search(query: str, search_engine: str = "duckduckgo", num_results: int = 5) -> str:
+def to_search_item(item: Any, index: int) -> Optional[SearchItem]:
+    """
+    Normalize one raw engine result into a SearchItem
+    
+    Args:
+        item (Any): A SearchItem, or a dict with title/url/description keys
+        index (int): 1-based rank of the result, used for a missing title
+        
+    Returns:
+        Optional[SearchItem]: The search item, or None if the result has no URL
+    """
+    if isinstance(item, dict):
+        item = SearchItem(
+            title=item.get("title") or f"Result {index}",
+            url=item.get("url") or "",
+            description=item.get("description") or None
+        )
+    if not isinstance(item, SearchItem) or not item.url:
+        return None
+    return item
+
+
+async def web_search(query: str, search_engine: str = "duckduckgo", num_results: int = 5) -> List[SearchItem]:
     """
     Performs a web search and returns relevant results
     
+    Results without a URL are dropped and duplicate URLs are kept only at their
+    first rank. The search engines are blocking, so the search runs in a worker
+    thread.
+    
     Args:
         query (str): The keywords or phrase to search for
         search_engine (str, optional): The search engine to use
@@ -240,45 +500,42 @@ async def web_search(query: str, search_engine: str = "duckduckgo", num_results:
         num_results (int, optional): Number of results to return, default is 5
         
     Returns:
-        str: Search results including titles, links and descriptions, or an error message if the search fails
-    """
-    try:
-        # Validate parameters
-        if not query:
-            return "Search query cannot be empty"
-            
-        if num_results <= 0:
-            return "Number of results must be greater than 0"
+        List[SearchItem]: Search results in rank order
         
-        if num_results > 20:
-            num_results = 20
-            
-        search_engine = search_engine.lower()
-        
-        # Initialize search engines
-        engines = {
-            "google": GoogleSearchEngine(),
-            "baidu": BaiduSearchEngine(),
-            "duckduckgo": DuckDuckGoSearchEngine()
-        }
-        
-        if search_engine not in engines:
-            return f"Unsupported search engine: {search_engine}. Supported options: {', '.join(engines.keys())}"
-        
-        # Perform search
-        engine = engines[search_engine]
-        search_results = engine.perform_search(query, num_results=num_results)
-        
-        # Format and return results
-        return format_search_results(search_engine, query, search_results)
-            
-    except requests.exceptions.RequestException as e:
-        return f"Search request failed: {str(e)}"
-    except Exception as e:
-        return f"An error occurred while performing the search: {str(e)}"
+    Raises:
+        ValueError: If the query is empty, num_results is not positive or the search engine is unsupported
+        requests.exceptions.RequestException: If the search request fails
+    """
+    # Validate parameters
+    if not query:
+        raise ValueError("Search query cannot be empty")
+    
+    if num_results <= 0:
+        raise ValueError("Number of results must be greater than 0")
+    
+    if num_results > 20:
+        num_results = 20
+    
+    search_engine = search_engine.lower()
+    if search_engine not in SEARCH_ENGINES:
+        raise ValueError(f"Unsupported search engine: {search_engine}. Supported options: {', '.join(SEARCH_ENGINES.keys())}")
+    
+    # Perform search
+    engine = SEARCH_ENGINES[search_engine]()
+    raw_results = await asyncio.to_thread(engine.perform_search, query, num_results=num_results)
+    
+    items = []
+    seen_urls = set()
+    for i, raw_item in enumerate(raw_results, 1):
+        item = to_search_item(raw_item, i)
+        if item is None or item.url in seen_urls:
+            continue
+        seen_urls.add(item.url)
+        items.append(item)
+    return items
 
 
-async def web_search_and_browse(query: str, search_engine: str = "duckduckgo", num_results: int = 5, max_browse: int = 1, max_length: int = MAX_CONTENT_LENGTH) -> str:
+async def web_search_and_browse(query: str, search_engine: str = "duckduckgo", num_results: int = 5, max_browse: int = 1, max_length: int = MAX_CONTENT_LENGTH) -> Dict[str, Any]:
     """
     搜索并自动浏览搜索结果页面
     
@@ -289,57 +546,62 @@ async def web_search_and_browse(query: str, search_engine: str = "duckduckgo", n
         max_browse (int): 最多浏览几个搜索结果
                          设置为0表示浏览所有结果
                          设置为负数表示只搜索不浏览
+                         所有结果并发抓取，先成功的max_browse个页面被采用，
+                         无法访问的结果由其余结果补上
         max_length (int): 每个网页内容的最大长度
     
     Returns:
-        str: 包含搜索结果和网页内容的综合信息
+        Dict[str, Any]: 出错时为{"error": ...}，否则为包含以下字段的字典:
+            - query (str): 搜索关键词
+            - search_engine (str): 使用的搜索引擎
+            - results (List[SearchItem]): 搜索结果
+            - num_browse (int): 需要浏览的页面数，只搜索不浏览时为0
+            - pages (List[dict]): 成功获取的网页，按搜索结果排序，每项为crawl()的返回字典加上
+                                  结果序号rank（从1开始）
+            - errors (List[dict]): 没有凑够页面时无法获取的网页，每项包含rank、url和error
     """
     try:
         # 首先执行搜索
-        search_results = await web_search(query, search_engine, num_results)
+        items = await web_search(query, search_engine, num_results)
+        output = {
+            "query": query,
+            "search_engine": search_engine.lower(),
+            "results": items,
+            "num_browse": 0,
+            "pages": [],
+            "errors": []
+        }
         
         # 如果max_browse为负数，表示只执行搜索不浏览
-        if max_browse < 0:
-            return search_results
-        
-        # 解析搜索结果中的URL
-        urls = []
-        for line in search_results.split('\n'):
-            if line.startswith('🔗 '):
-                url = line[2:].strip()
-                urls.append(url)
+        if max_browse < 0 or not items:
+            return output
         
-        if not urls:
-            return f"搜索结果: {search_results}\n\n无法从搜索结果中提取URL。"
+        urls = [item.url for item in items]
         
-        # 如果max_browse为0，则浏览所有结果
-        if max_browse == 0:
-            max_browse = len(urls)
+        # 需要浏览的页面数，max_browse为0则浏览所有结果
+        num_browse = len(urls) if max_browse == 0 else min(max_browse, len(urls))
+        output["num_browse"] = num_browse
         
-        # 限制浏览的URL数量
-        urls = urls[:max_browse]
+        # 减小单个页面的最大长度，防止总内容过大
+        page_max_length = max(5000, max_length // num_browse)
         
-        # 准备输出
-        output = [f"搜索结果: {search_results}\n\n--- 网页内容（浏览 {len(urls)}/{len(urls)} 结果）---\n"]
+        # 按排名优先取num_browse个成功页面：只多请求少量备用结果，失败的页面由后面的结果补上
+        results = await crawl_many(urls, page_max_length, num_browse)
+        output["pages"] = [
+            {"rank": i + 1, **result}
+            for i, result in enumerate(results) if result is not None and "error" not in result
+        ]
         
-        # 爬取每个URL的内容
-        for i, url in enumerate(urls):
-            try:
-                # 减小单个页面的最大长度，防止总内容过大
-                page_max_length = max(5000, max_length // max(len(urls), 1))
-                
-                result = await crawl({"url": url, "max_length": page_max_length})
-                if "error" in result:
-                    page_content = f"⚠️ 无法获取内容: {result['error']}"
-                else:
-                    is_pdf = result.get("is_pdf", False)
-                    page_content = result["content"]
-                    
-                output.append(f"\n\n[结果 {i+1}] - {'[PDF文件]' if is_pdf else ''} {url}\n{page_content}")
-            except Exception as e:
-                output.append(f"\n\n[结果 {i+1}] - {url}\n⚠️ 处理时出错: {str(e)}")
+        # 没有凑够页面时，记录失败的结果
+        if len(output["pages"]) < num_browse:
+            output["errors"] = [
+                {"rank": i + 1, "url": urls[i], "error": result["error"]}
+                for i, result in enumerate(results) if result is not None and "error" in result
+            ]
         
-        return "\n".join(output)
-            
+        return output
+    
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Search request failed: {str(e)}"}
     except Exception as e:
-        return f"搜索和浏览过程中出错: {str(e)}" 
\ No newline at end of file
+        return {"error": f"搜索和浏览过程中出错: {str(e)}"}
@@ -0,0 +1,237 @@
+"""
+Web Search Tool - HTML Extraction Module
+
+This module turns a fetched HTML page into the readable text of its main content,
+in the spirit of Mozilla's Readability: scripts, styles and page furniture
+(navigation, sidebars, footers, cookie banners, ...) are stripped, the element
+holding the article body is found by scoring paragraphs, and the result is
+rendered as plain text that keeps headings (as "#" lines), list items and links
+(as [text](url)).
+
+The functions here are pure and only depend on BeautifulSoup, so they can run
+in worker processes without importing the search engines.
+
+License: MIT License
+"""
+
+import re
+from typing import Dict, List
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+# 优先使用lxml解析器，速度快得多
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# 直接删除的标签（不含正文的内容）
+REMOVE_TAGS = [
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed",
+    "form", "button", "input", "select", "textarea", "nav", "footer", "aside", "dialog", "link", "meta",
+]
+
+# class/id匹配UNLIKELY且不匹配LIKELY的元素视为页面框架（导航、广告等）
+UNLIKELY_PATTERN = re.compile(
+    r"nav|menu|footer|sidebar|comment|advert|\bads?\b|share|social|cookie|banner|popup|modal|"
+    r"breadcrumb|related|recommend|subscribe|newsletter|promo|sponsor|masthead|toolbar|pagination|skip",
+    re.I,
+)
+LIKELY_PATTERN = re.compile(r"article|content|main|body|post|entry|text|story|blog", re.I)
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "blockquote", "figure", "figcaption",
+    "ul", "ol", "dl", "dt", "dd", "table", "hr", "address", "details", "summary",
+}
+# 参与正文评分的段落类标签
+PARAGRAPH_TAGS = ["p", "pre", "blockquote", "td"]
+
+MIN_PARAGRAPH_LENGTH = 25  # 短于此长度的段落不参与评分
+MIN_CONTENT_LENGTH = 250  # 候选正文短于此长度时退回使用整个body
+
+
+def _is_unlikely(tag: Tag) -> bool:
+    """判断元素是否为导航、广告等页面框架"""
+    if tag.name in ("body", "html", "article", "main"):
+        return False
+    attrs = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "") + " " + (tag.get("role") or "")
+    if not attrs.strip():
+        return False
+    return bool(UNLIKELY_PATTERN.search(attrs)) and not LIKELY_PATTERN.search(attrs)
+
+
+def _strip_boilerplate(soup: BeautifulSoup) -> None:
+    """删除脚本、样式、注释和页面框架元素"""
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in soup.find_all(REMOVE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed:
+            continue
+        # 隐藏元素
+        style = (tag.get("style") or "").replace(" ", "").lower()
+        if tag.has_attr("hidden") or tag.get("aria-hidden") == "true" or "display:none" in style:
+            tag.decompose()
+        elif _is_unlikely(tag):
+            tag.decompose()
+    # 没有标题的header只是站点页眉
+    for tag in soup.find_all("header"):
+        if not tag.find(list(HEADING_TAGS)):
+            tag.decompose()
+
+
+def _link_density(tag: Tag, text_length: int) -> float:
+    """元素文本中链接文字所占的比例"""
+    if not text_length:
+        return 0.0
+    link_length = sum(len(a.get_text(strip=True)) for a in tag.find_all("a"))
+    return min(1.0, link_length / text_length)
+
+
+def find_main_content(soup: BeautifulSoup) -> Tag:
+    """
+    找出页面中正文所在的元素
+
+    每个段落按长度和逗号数给其父元素加分、给祖父元素加一半分，候选元素的得分再乘以
+    (1 - 链接密度)，得分最高者即为正文。找不到足够长的正文时返回整个body。
+
+    Args:
+        soup (BeautifulSoup): 已去除页面框架的文档
+
+    Returns:
+        Tag: 正文元素
+    """
+    body = soup.body or soup
+    scores: Dict[int, float] = {}
+    candidates: Dict[int, Tag] = {}
+
+    for paragraph in body.find_all(PARAGRAPH_TAGS):
+        text = paragraph.get_text(" ", strip=True)
+        if len(text) < MIN_PARAGRAPH_LENGTH:
+            continue
+        score = 1 + text.count(",") + text.count("，") + text.count("。") + min(len(text) / 100, 3)
+        parent = paragraph.parent
+        for weight, ancestor in ((1.0, parent), (0.5, parent.parent if parent else None)):
+            if not isinstance(ancestor, Tag):
+                continue
+            key = id(ancestor)
+            if key not in candidates:
+                candidates[key] = ancestor
+                # 语义标签天然更可能是正文
+                scores[key] = 5.0 if ancestor.name in ("article", "main") else 0.0
+            scores[key] += score * weight
+
+    best, best_score = None, 0.0
+    for key, tag in candidates.items():
+        text_length = len(tag.get_text(" ", strip=True))
+        score = scores[key] * (1 - _link_density(tag, text_length))
+        if score > best_score:
+            best, best_score = tag, score
+
+    if best is None or len(best.get_text(" ", strip=True)) < MIN_CONTENT_LENGTH:
+        return body
+
+    # 正文往往被拆成几个兄弟块，得分接近的兄弟一并纳入：退回到它们的共同父元素
+    parent = best.parent
+    if isinstance(parent, Tag) and parent is not body.parent:
+        siblings = [scores[id(tag)] for tag in parent.find_all(recursive=False) if id(tag) in scores and tag is not best]
+        if any(score >= best_score * 0.5 for score in siblings):
+            best = parent
+    return best
+
+
+def _render(node: Tag, base_url: str, out: List[str], preformatted: List[str]) -> None:
+    """
+    把元素渲染为文本，保留标题、列表、链接、表格和代码块
+
+    代码块的原样文本放入preformatted，out中只留占位符，整理空白后再换回。
+    """
+    for child in node.children:
+        if isinstance(child, NavigableString):
+            text = re.sub(r"\s+", " ", str(child))
+            if text.strip() or (out and not out[-1].endswith((" ", "\n"))):
+                out.append(text)
+            continue
+        if not isinstance(child, Tag):
+            continue
+        name = child.name
+        if name in HEADING_TAGS:
+            text = child.get_text(" ", strip=True)
+            if text:
+                out.append(f"\n\n{'#' * int(name[1])} {text}\n\n")
+        elif name == "a":
+            text = child.get_text(" ", strip=True)
+            href = (child.get("href") or "").strip()
+            if text and href and not href.startswith(("#", "javascript:", "mailto:")):
+                out.append(f"[{text}]({urljoin(base_url, href)})")
+            elif text:
+                out.append(text)
+        elif name == "pre":
+            preformatted.append(child.get_text().strip("\n"))
+            out.append(f"\n\n\x00{len(preformatted) - 1}\x00\n\n")
+        elif name == "br":
+            out.append("\n")
+        elif name == "li":
+            out.append("\n- ")
+            _render(child, base_url, out, preformatted)
+        elif name == "tr":
+            cells = []
+            for cell in child.find_all(["td", "th"], recursive=False):
+                cell_out: List[str] = []
+                _render(cell, base_url, cell_out, preformatted)
+                cells.append(re.sub(r"\s+", " ", "".join(cell_out)).strip())
+            out.append(" | ".join(cells) + "\n")
+        elif name == "img":
+            continue
+        elif name in BLOCK_TAGS:
+            out.append("\n\n")
+            _render(child, base_url, out, preformatted)
+            out.append("\n\n")
+        else:
+            _render(child, base_url, out, preformatted)
+
+
+def _clean_text(text: str) -> str:
+    """整理空白：去掉行首尾空格，合并多余的空行"""
+    lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def extract_main_text(html: str, base_url: str = "") -> Dict[str, object]:
+    """
+    从HTML中提取正文文本
+
+    Args:
+        html (str): 网页HTML
+        base_url (str): 网页URL，用于把相对链接转为绝对链接
+
+    Returns:
+        Dict[str, object]: 包含以下字段的字典:
+            - title (str): 网页标题
+            - content (str): 正文文本，标题为"#"行，链接为[文字](URL)
+            - raw_length (int): 原始HTML的字符数
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    _strip_boilerplate(soup)
+    main = find_main_content(soup)
+
+    out: List[str] = []
+    preformatted: List[str] = []
+    try:
+        _render(main, base_url, out, preformatted)
+        content = _clean_text("".join(out))
+        content = re.sub(r"\x00(\d+)\x00", lambda match: preformatted[int(match.group(1))], content)
+    except RecursionError:
+        # 嵌套过深的页面退回为纯文本
+        content = _clean_text(main.get_text("\n"))
+
+    # 正文中没有一级标题时把网页标题放在开头
+    if title and not content.startswith("# "):
+        content = f"# {title}\n\n{content}"
+    return {"title": title, "content": content, "raw_length": len(html)}
@@ -16,7 +16,9 @@ License: MIT License
 
 from mcp.server.fastmcp import FastMCP
 import sys
+import json
 from pathlib import Path
+from typing import Any, Dict, List
 import os
 
 
@@ -25,14 +27,116 @@ current_dir = Path(__file__).parent
 parent_dir = current_dir.parent
 sys.path.insert(0, str(parent_dir))
 
-from src.core_logic import web_search_and_browse, crawl, MAX_CONTENT_LENGTH
+from src.core_logic import web_search_and_browse, crawl, warm_up_extract_pool, SearchItem, MAX_CONTENT_LENGTH
 
 # Initialize MCP server
 mcp = FastMCP("web_search_browse_tool")
 
+
+def format_search_results(search_engine: str, query: str, items: List[SearchItem]) -> str:
+    """
+    Format search results into a readable string
+    
+    Args:
+        search_engine (str): The name of the search engine used
+        query (str): The search query
+        items (List[SearchItem]): The search results
+        
+    Returns:
+        str: Formatted search results string
+    """
+    if not items:
+        return f"No results found for '{query}' on {search_engine.capitalize()}"
+    
+    results = [f"🔍 Search results for '{query}' from {search_engine.capitalize()}:"]
+    
+    for i, item in enumerate(items, 1):
+        title = item.title or f"Result {i}"
+        url = item.url or "No URL"
+        description = item.description or "No description available"
+        
+        results.append(f"\n📌 {title}")
+        results.append(f"🔗 {url}")
+        results.append(f"📄 {description}")
+    
+    return "\n".join(results)
+
+
+def format_extraction_stats(result: Dict[str, Any]) -> str:
+    """
+    描述正文提取节省的字符数
+    
+    Args:
+        result (Dict[str, Any]): crawl()的返回字典
+        
+    Returns:
+        str: 如"正文提取: 原始HTML 120000字符 → 正文 8000字符（节省 93%）"，未提取正文时为空字符串
+    """
+    raw_length = result.get("raw_length")
+    if not result.get("extracted") or not raw_length:
+        return ""
+    content_length = result.get("content_length", len(result.get("content", "")))
+    saved = max(0, raw_length - content_length) * 100 / raw_length
+    return f"正文提取: 原始HTML {raw_length}字符 → 正文 {content_length}字符（节省 {saved:.0f}%）"
+
+
+def format_browse_result(result: Dict[str, Any]) -> str:
+    """
+    把web_search_and_browse()的结果格式化为文本
+    
+    Args:
+        result (Dict[str, Any]): web_search_and_browse()的返回字典
+        
+    Returns:
+        str: 搜索结果列表，浏览时后面附上各网页的内容
+    """
+    search_results = format_search_results(result["search_engine"], result["query"], result["results"])
+    if not result["num_browse"]:
+        return search_results
+    
+    output = [f"搜索结果: {search_results}\n\n--- 网页内容（浏览 {len(result['pages'])}/{result['num_browse']} 结果）---\n"]
+    for page in result["pages"]:
+        stats = format_extraction_stats(page)
+        stats = f"[{stats}]\n" if stats else ""
+        output.append(f"\n\n[结果 {page['rank']}] - {'[PDF文件]' if page.get('is_pdf') else ''} {page['url']}\n{stats}{page['content']}")
+    for error in result["errors"]:
+        output.append(f"\n\n[结果 {error['rank']}] - {error['url']}\n⚠️ 无法获取内容: {error['error']}")
+    return "\n".join(output)
+
+
+def format_browse_result_json(result: Dict[str, Any]) -> str:
+    """
+    把web_search_and_browse()的结果格式化为紧凑的JSON
+    
+    Args:
+        result (Dict[str, Any]): web_search_and_browse()的返回字典
+        
+    Returns:
+        str: {"query", "engine", "results": [{"title", "url", "description"}],
+              "pages": [{"rank", "url", "content", "pdf"}], "errors": [{"rank", "url", "error"}]}，
+             没有描述的结果省略description，非PDF页面省略pdf，空列表省略
+    """
+    output = {
+        "query": result["query"],
+        "engine": result["search_engine"],
+        "results": [item.model_dump(exclude_none=True) for item in result["results"]]
+    }
+    pages = []
+    for page in result["pages"]:
+        entry = {"rank": page["rank"], "url": page["url"], "content": page["content"]}
+        if page.get("is_pdf"):
+            entry["pdf"] = True
+        pages.append(entry)
+    if pages:
+        output["pages"] = pages
+    if result["errors"]:
+        output["errors"] = result["errors"]
+    return json.dumps(output, ensure_ascii=False, separators=(",", ":"))
+
+
 @mcp.tool()
 async def search_and_browse(query: str, search_engine: str = "duckduckgo", num_results: int = 5, 
-                           max_browse: int = 1, max_length: int = 40000) -> str:
+                           max_browse: int = 1, max_length: int = 40000, output_format: str = "text") -> str:
     """
     搜索并可选择性浏览搜索结果的网页内容
     
@@ -45,8 +149,15 @@ async def search_and_browse(query: str, search_engine: str = "duckduckgo", num_r
                                    默认为1（只浏览第一个结果）
                                    设置为0表示浏览所有搜索结果
                                    设置为-1表示只搜索不浏览（只获取搜索结果列表）
+                                   按搜索排名优先：只同时请求max_browse个结果和少量备用结果，
+                                   打不开的结果由后面的结果补上；凑够页面后最多再等待约2秒，
+                                   让排名更靠前但仍在加载的页面优先
         max_length (int, optional): 每个网页内容的最大长度，默认为50000字符
                                    注意：当浏览多个页面时，每个页面的实际长度会自动减小
+        output_format (str, optional): 输出格式，"text"（默认）为可读文本，
+                                      "json"为紧凑JSON，便于逐条处理搜索结果和网页内容：
+                                      {"query","engine","results":[{"title","url","description"}],
+                                       "pages":[{"rank","url","content"}],"errors":[{"rank","url","error"}]}
         
     Returns:
         str: 包含搜索结果和网页具体内容的综合信息
@@ -66,18 +177,33 @@ async def search_and_browse(query: str, search_engine: str = "duckduckgo", num_r
         
         # 场景5: 搜索并浏览所有结果 - 适合需要全面了解某个主题（请限制结果数量）
         search_and_browse("碳中和概念", num_results=3, max_browse=0)
+        
+        # 场景6: 以JSON返回搜索结果列表，便于后续筛选要浏览的网址
+        search_and_browse("扩散模型综述", max_browse=-1, output_format="json")
     """
-    return await web_search_and_browse(query, search_engine, num_results, max_browse, max_length)
+    result = await web_search_and_browse(query, search_engine, num_results, max_browse, max_length)
+    if "error" in result:
+        if output_format == "json":
+            return json.dumps({"error": result["error"]}, ensure_ascii=False, separators=(",", ":"))
+        return result["error"]
+    if output_format == "json":
+        return format_browse_result_json(result)
+    return format_browse_result(result)
 
 @mcp.tool()
-async def web_crawl(url: str, max_length: int = 40000) -> str:
+async def web_crawl(url: str, max_length: int = 40000, extract_text: bool = True) -> str:
     """
     爬取网页内容
     
+    网页默认只返回提取出的正文（去掉脚本、样式、导航、广告等），标题以"#"开头，
+    链接保留为[文字](URL)的形式。
+    
     Args:
         url (str): 要爬取的网页URL
-        max_length (int, optional): 返回内容的最大长度
+        max_length (int, optional): 返回内容的最大长度（按提取后的正文计算）
                                    默认为50000字符（约50KB）
+        extract_text (bool, optional): 是否提取正文，默认为True
+                                      设置为False时返回原始HTML
         
     Returns:
         str: 包含网址和内容的信息，或错误信息
@@ -85,10 +211,12 @@ async def web_crawl(url: str, max_length: int = 40000) -> str:
     Example:
         web_crawl("https://www.example.com")
         web_crawl("https://www.python.org", max_length=30000)
+        web_crawl("https://www.python.org", extract_text=False)
     """
     arguments = {
         "url": url, 
-        "max_length": max_length
+        "max_length": max_length,
+        "extract_text": extract_text
     }
     
     result = await crawl(arguments)
@@ -101,9 +229,14 @@ async def web_crawl(url: str, max_length: int = 40000) -> str:
     is_pdf = result.get("is_pdf", False)
     if is_pdf:
         return f"网址: {result['url']}\n[PDF文件]\n\n内容:\n{result['content']}"
+    stats = format_extraction_stats(result)
+    if stats:
+        return f"网址: {result['url']}\n{stats}\n\n内容:\n{result['content']}"
     else:
         return f"网址: {result['url']}\n\n内容:\n{result['content']}"
 
 # If this module is run directly, start the MCP server
 if __name__ == "__main__":
+    # 先启动正文提取的工作进程，第一次浏览网页时不必再等待
+    warm_up_extract_pool()
     mcp.run(transport="stdio") 
\ No newline at end of file
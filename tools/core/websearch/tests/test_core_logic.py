@@ -0,0 +1,229 @@
+"""
+Web Search Tool - Core Logic Tests
+
+Tests crawl and crawl_many against local HTTP servers serving slow, failing
+and fast pages: max_length applies to the extracted text, top-ranked pages
+are preferred within the grace window, only a small reserve of extra URLs is
+requested, a page never counts past the quota, each host gets at most
+MAX_CONNECTIONS_PER_HOST concurrent requests, and the overall deadline
+cancels what is still running.
+
+License: MIT License
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("bs4")
+
+# Add the parent directory to the Python path so we can import the src package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import core_logic
+
+SLOW_SECONDS = 1.5
+LATE_SECONDS = 0.3
+
+# An article of about 1200 characters inside 20000 characters of scripts and navigation
+ARTICLE_TEXT = "Helipads are marked with a large H inside a circle. " * 24
+ARTICLE_HTML = (
+    "<html><head><title>Helipads</title><script>" + "var x = 1;" * 1500 + "</script></head><body>"
+    "<nav>" + "<a href='/'>Home</a>" * 200 + "</nav>"
+    f"<article><p>{ARTICLE_TEXT}</p></article></body></html>"
+)
+
+
+class PageServer(ThreadingHTTPServer):
+    """
+    Serves /slow... after SLOW_SECONDS, /late... after LATE_SECONDS, /error... as
+    HTTP 500 and any other path at once, recording the requested paths and the
+    peak number of requests in flight.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.paths = []
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.paths.append(self.path)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(SLOW_SECONDS)
+            elif self.path.startswith("/late"):
+                time.sleep(LATE_SECONDS)
+            else:
+                time.sleep(server.delay)
+        finally:
+            with server.lock:
+                server.active -= 1
+        if self.path.startswith("/error"):
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/article"):
+            body = ARTICLE_HTML.encode()
+        else:
+            body = f"<html><head><title>{self.path}</title></head><body><p>Page {self.path}</p></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def start_server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1,localhost")
+    servers = []
+
+    def start(delay: float = 0.0) -> PageServer:
+        server = PageServer(delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def succeeded(results):
+    return [i for i, result in enumerate(results) if result is not None and "error" not in result]
+
+
+def test_crawl_many_prefers_top_ranked_page_within_grace(start_server):
+    server = start_server()
+    urls = [server.url("/late"), server.url("/a"), server.url("/b")]
+    results = asyncio.run(core_logic.crawl_many(urls, 1000, min_success=1, grace=1.0))
+
+    # /a finishes first, but /late ranks higher and succeeds within the grace window
+    assert succeeded(results) == [0]
+    assert results[1] is None and results[2] is None
+
+
+def test_crawl_many_stops_waiting_after_grace(start_server):
+    server = start_server()
+    urls = [server.url("/slow"), server.url("/error"), server.url("/a"), server.url("/b"), server.url("/c")]
+    start = time.perf_counter()
+    results = asyncio.run(core_logic.crawl_many(urls, 1000, min_success=2, grace=0.3))
+    elapsed = time.perf_counter() - start
+
+    assert succeeded(results) == [2, 3]
+    assert results[0] is None  # the slow page was cancelled after the grace window
+    assert "error" in results[1]  # the failed page was replaced by a later one
+    assert elapsed < SLOW_SECONDS
+
+
+def test_crawl_many_returns_at_once_when_top_ranked_pages_succeed(start_server):
+    server = start_server()
+    urls = [server.url("/a"), server.url("/slow")]
+    start = time.perf_counter()
+    results = asyncio.run(core_logic.crawl_many(urls, 1000, min_success=1, grace=SLOW_SECONDS))
+    elapsed = time.perf_counter() - start
+
+    assert succeeded(results) == [0]
+    assert elapsed < SLOW_SECONDS
+
+
+def test_crawl_many_requests_only_a_reserve_of_extra_urls(start_server):
+    server = start_server()
+    urls = [server.url("/error")] + [server.url(f"/{i}") for i in range(7)]
+    results = asyncio.run(core_logic.crawl_many(urls, 1000, min_success=1, reserve=2))
+
+    assert succeeded(results) == [1]
+    # One needed page plus two reserve, and one more to replace the failed page
+    assert len(server.paths) <= 4
+    assert results[4:] == [None] * 4
+
+
+def test_crawl_many_never_exceeds_quota_in_one_batch(monkeypatch):
+    # Every page finishes in the same event loop step, so asyncio.wait reports them in one batch
+    async def instant_crawl(arguments):
+        return {"content": arguments["url"], "url": arguments["url"], "is_pdf": False}
+
+    monkeypatch.setattr(core_logic, "crawl", instant_crawl)
+    urls = [f"http://example.com/{i}" for i in range(5)]
+    results = asyncio.run(core_logic.crawl_many(urls, 1000, min_success=2))
+
+    assert succeeded(results) == [0, 1]
+    assert results[2:] == [None, None, None]
+
+
+def test_crawl_many_limits_requests_per_host(start_server, monkeypatch):
+    monkeypatch.setattr(core_logic, "MAX_CONNECTIONS_PER_HOST", 2)
+    busy = start_server(delay=0.3)
+    other = start_server(delay=0.3)
+    urls = [busy.url(f"/{i}") for i in range(6)] + [other.url("/0"), other.url("/1")]
+    start = time.perf_counter()
+    results = asyncio.run(core_logic.crawl_many(urls, 1000))
+    elapsed = time.perf_counter() - start
+
+    assert len(succeeded(results)) == len(urls)
+    assert busy.peak == 2
+    assert other.peak == 2
+    # Six requests two at a time take at least three request durations
+    assert elapsed >= 0.9
+
+
+def test_crawl_many_deadline_cancels_running_requests(start_server):
+    server = start_server()
+    urls = [server.url("/fast"), server.url("/slow1"), server.url("/slow2")]
+    start = time.perf_counter()
+    results = asyncio.run(core_logic.crawl_many(urls, 1000, deadline=0.5))
+    elapsed = time.perf_counter() - start
+
+    assert succeeded(results) == [0]
+    assert results[1] == results[2] == {"error": "超过总时限（0.5秒）"}
+    assert elapsed < SLOW_SECONDS
+
+
+def test_crawl_applies_max_length_to_extracted_text(start_server):
+    server = start_server()
+    result = asyncio.run(core_logic.crawl({"url": server.url("/article"), "max_length": 2000}))
+
+    # The raw page is ten times max_length, but its article fits
+    assert result["raw_length"] == len(ARTICLE_HTML) > 2000
+    assert result["content_length"] < 2000
+    assert ARTICLE_TEXT.strip() in result["content"]
+    assert "内容被截断" not in result["content"]
+
+    truncated = asyncio.run(core_logic.crawl({"url": server.url("/article"), "max_length": 100}))
+    assert truncated["content"].startswith("# Helipads")
+    assert f"[内容被截断，总共{result['content_length']}字符]" in truncated["content"]
+
+
+def test_small_pages_are_extracted_without_the_process_pool(monkeypatch):
+    def no_pool():
+        raise AssertionError("the process pool must not be started for a small page")
+
+    monkeypatch.setattr(core_logic, "get_extract_pool", no_pool)
+    extracted = asyncio.run(core_logic.extract_html("<html><body><p>Small page</p></body></html>", ""))
+    assert extracted["content"] == "Small page"
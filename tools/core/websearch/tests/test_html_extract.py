@@ -0,0 +1,81 @@
+"""
+Web Search Tool - HTML Extraction Tests
+
+Tests extract_main_text on a page with the usual furniture around the
+article: navigation, sidebar, footer, cookie banner and scripts must go,
+while headings, lists, links and preformatted code must be kept.
+
+License: MIT License
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("bs4")
+
+# Add the src directory to the Python path so we can import html_extract
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from html_extract import extract_main_text
+
+PARAGRAPH = ("Grounding models detect objects from free text, which makes them useful for "
+             "landing site selection, inspection, and many other tasks in the field. ")
+
+PAGE = f"""<!DOCTYPE html>
+<html>
+<head><title>Landing Site Notes</title><style>body {{ color: red; }}</style></head>
+<body>
+  <nav><a href="/">Home</a> <a href="/blog">Blog</a> NAVIGATION-MENU</nav>
+  <div class="cookie-banner">COOKIE-BANNER We use cookies.</div>
+  <div id="sidebar"><p>SIDEBAR-TEXT {PARAGRAPH}</p></div>
+  <article>
+    <h1>Landing Site Notes</h1>
+    <p>{PARAGRAPH}</p>
+    <h2>Checklist</h2>
+    <ul><li>Helipad marking</li><li>Clear approach</li></ul>
+    <p>{PARAGRAPH} See <a href="/docs/helipads">the helipad guide</a>.</p>
+    <pre>def land():
+    descend(2.0)</pre>
+    <p>{PARAGRAPH}</p>
+  </article>
+  <footer>FOOTER-TEXT Copyright</footer>
+  <script>var tracking = "SCRIPT-TEXT";</script>
+</body>
+</html>"""
+
+
+@pytest.fixture
+def extracted():
+    return extract_main_text(PAGE, "https://example.com/posts/notes")
+
+
+def test_removes_page_furniture(extracted):
+    content = extracted["content"]
+    for marker in ("NAVIGATION-MENU", "COOKIE-BANNER", "SIDEBAR-TEXT", "FOOTER-TEXT", "SCRIPT-TEXT", "color: red"):
+        assert marker not in content
+
+
+def test_keeps_headings_lists_and_links(extracted):
+    content = extracted["content"]
+    assert extracted["title"] == "Landing Site Notes"
+    assert content.startswith("# Landing Site Notes")
+    assert "## Checklist" in content
+    assert "- Helipad marking" in content
+    assert "- Clear approach" in content
+    assert "[the helipad guide](https://example.com/docs/helipads)" in content
+
+
+def test_keeps_preformatted_text(extracted):
+    assert "def land():\n    descend(2.0)" in extracted["content"]
+
+
+def test_reports_raw_length(extracted):
+    assert extracted["raw_length"] == len(PAGE)
+    assert len(extracted["content"]) < len(PAGE)
+
+
+def test_short_page_falls_back_to_body():
+    result = extract_main_text("<html><head><title>Short</title></head><body><p>Just one line.</p></body></html>")
+    assert result["content"] == "# Short\n\nJust one line."